@@ -0,0 +1,331 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from dbpedia.compute_parts import (
+    BINARY_SEARCH_TYPE,
+    JUMP_SEARCH_TYPE,
+    compute_parts,
+    seek_first_global_subject,
+)
+from dbpedia.graph_elements import NamespacePrefixer, make_graph_elements, transform_part
+from dbpedia.ntriples import NTriplesTokenizer
+from dbpedia.preloader import cast_int, parse_arguments
+from dbpedia.synthetic import add_generator_arguments, write_synthetic_triples
+from dbpedia.utils import base_path
+
+QNAME_SAMPLE_SIZE = 200000  # URIs
+
+arg_parser = argparse.ArgumentParser(
+    description='Time the stages of the preloader on (synthetic) NTriples '
+                'and save the results as JSON.',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+
+
+class UriSink:
+    # collects the URIs of triples, in the order the graph sink sees them
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.uris = []
+
+    def triple(self, subj, pred, obj):
+        if len(self.uris) < self.limit:
+            self.uris.extend([subj, pred])
+            if not hasattr(obj, 'language'):
+                self.uris.append(obj)
+
+
+def run_benchmarks(args, work_dir):
+    if args.input_path is None:
+        args.input_path = os.path.join(work_dir, 'synthetic.nt')
+        print(f'Generating {args.size} bytes of synthetic NTriples ...')
+        with open(args.input_path, 'wb') as out_file:
+            write_synthetic_triples(out_file, args)
+
+    results = []
+    for name, benchmark in BENCHMARKS:
+        if args.only and name not in args.only:
+            continue
+        print(f'{name} ...')
+        result = benchmark(args, work_dir)
+        result['name'] = name
+        print(f'{name}: {result["best"]:.4f} s')
+        results.append(result)
+
+    return {
+        'meta': run_metadata(args),
+        'results': results,
+    }
+
+
+def preloader_args(args, output_dir, **kwargs):
+    os.makedirs(output_dir, exist_ok=True)
+    return parse_arguments(
+        [],
+        input_path=args.input_path,
+        output_dir=output_dir,
+        target_size=args.target_size,
+        workers=args.workers,
+        global_id_marker=args.global_id_marker,
+        **kwargs
+    )
+
+
+def time_repeatedly(args, function, setup=None):
+    seconds = []
+    for _ in range(args.repeat):
+        # the stages print progress, which is not what is measured here
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            function()
+            seconds.append(time.perf_counter() - start)
+
+    return {
+        'seconds': seconds,
+        'best': min(seconds),
+        'median': statistics.median(seconds),
+    }
+
+
+def add_rates(result, byte_count=None, item_count=None):
+    if byte_count is not None:
+        result['bytes'] = byte_count
+        result['mb_per_s'] = byte_count / result['best'] / 1e6
+    if item_count is not None:
+        result['items'] = item_count
+        result['items_per_s'] = item_count / result['best']
+    return result
+
+
+def bench_seek_first_global_subject(search_type):
+    def benchmark(args, work_dir):
+        run_args = preloader_args(args, work_dir, search_type=search_type)
+
+        def seek():
+            with open(args.input_path, 'rb') as in_file:
+                file_end = in_file.seek(0, os.SEEK_END)
+                seek_first_global_subject(run_args, in_file, file_end)
+
+        return time_repeatedly(args, seek)
+    return benchmark
+
+
+def bench_compute_parts(args, work_dir):
+    # without a subject index, so parts are found by searching the input
+    run_args = preloader_args(
+        args,
+        work_dir,
+        subject_index=os.path.join(work_dir, 'no-subject-index'),
+    )
+    return add_rates(
+        time_repeatedly(args, lambda: list(compute_parts(run_args))),
+        byte_count=os.path.getsize(args.input_path),
+    )
+
+
+def first_part(args, work_dir):
+    run_args = preloader_args(
+        args,
+        work_dir,
+        subject_index=os.path.join(work_dir, 'no-subject-index'),
+    )
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        _, left, right = next(compute_parts(run_args))
+    return run_args, left, right
+
+
+def bench_transform_part(args, work_dir):
+    run_args, left, right = first_part(args, work_dir)
+    part_name = os.path.join(work_dir, 'transform-part')
+    triple_counts = []
+
+    def remove_output():
+        for kind in ('vertices', 'edges'):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(f'{part_name}_{kind}.jsonl')
+
+    def transform():
+        _, _, _, predicate_count, *_ = transform_part(
+            args.input_path,
+            args.global_id_marker,
+            part_name,
+            left,
+            right,
+            buffer_size=run_args.write_buffer_size,
+        )
+        triple_counts.append(sum(predicate_count.values()))
+
+    result = time_repeatedly(args, transform, setup=remove_output)
+    return add_rates(result, byte_count=right - left, item_count=triple_counts[0])
+
+
+def bench_qname(args, work_dir):
+    _, left, right = first_part(args, work_dir)
+    sink = UriSink(QNAME_SAMPLE_SIZE)
+    with open(args.input_path, 'rb') as in_file:
+        in_file.seek(left)
+        NTriplesTokenizer(sink).parse_range(in_file.read(right - left), 0, right - left)
+
+    # the saved namespaces, so that runs don't depend on the DBpedia endpoint
+    with open(base_path('default-namespaces.json')) as ns_file:
+        namespaces = json.load(ns_file)
+    prefixers = []
+
+    def qname_all():
+        qname = prefixers[-1].qname
+        for uri in sink.uris:
+            qname(uri)
+
+    # a fresh prefixer for every run, so the cache starts out empty
+    result = time_repeatedly(
+        args,
+        qname_all,
+        setup=lambda: prefixers.append(NamespacePrefixer(namespaces)),
+    )
+    return add_rates(result, item_count=len(sink.uris))
+
+
+def bench_make_graph_elements(parallel):
+    def benchmark(args, work_dir):
+        run_number = iter(range(args.repeat))
+
+        def run():
+            output_dir = os.path.join(
+                work_dir,
+                f'{"parallel" if parallel else "serial"}-{next(run_number)}',
+            )
+            make_graph_elements(preloader_args(args, output_dir, parallel=parallel))
+
+        return add_rates(
+            time_repeatedly(args, run),
+            byte_count=os.path.getsize(args.input_path),
+        )
+    return benchmark
+
+
+BENCHMARKS = [
+    ('seek_first_global_subject/binary', bench_seek_first_global_subject(BINARY_SEARCH_TYPE)),
+    ('seek_first_global_subject/jump', bench_seek_first_global_subject(JUMP_SEARCH_TYPE)),
+    ('compute_parts', bench_compute_parts),
+    ('transform_part', bench_transform_part),
+    ('qname', bench_qname),
+    ('make_graph_elements/serial', bench_make_graph_elements(parallel=False)),
+    ('make_graph_elements/parallel', bench_make_graph_elements(parallel=True)),
+]
+BENCHMARK_NAMES = [name for name, _ in BENCHMARKS]
+
+
+def run_metadata(args):
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=base_path(''),
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'input_size': os.path.getsize(args.input_path),
+        'args': {
+            name: value
+            for name, value in vars(args).items()
+            if name not in ('output', 'baseline')
+        },
+    }
+
+
+def compare_to_baseline(report, baseline_path):
+    with open(baseline_path) as baseline_file:
+        baseline = {result['name']: result for result in json.load(baseline_file)['results']}
+
+    print(f'\nCompared to {baseline_path} (best times):')
+    for result in report['results']:
+        if result['name'] in baseline:
+            speedup = baseline[result['name']]['best'] / result['best']
+            print(f'{result["name"]:<36} {result["best"]:>10.4f} s  {speedup:>6.2f}x')
+
+
+arg_parser.add_argument(
+    '--input-path',
+    type=os.path.abspath,
+    default=os.environ.get('INPUT_PATH'),
+    help='the sorted NTriples file to benchmark with '
+         '(default: a synthetic file that is generated first)'
+)
+arg_parser.add_argument(
+    '--output',
+    type=os.path.abspath,
+    default=os.environ.get('BENCHMARK_OUTPUT', argparse.SUPPRESS),
+    help='the JSON file to save the results in '
+         '(default: benchmark_{hex}.json in the dbpedia directory)'
+)
+arg_parser.add_argument(
+    '--baseline',
+    help='the JSON results of an earlier run to compare with'
+)
+arg_parser.add_argument(
+    '--only',
+    nargs='+',
+    choices=BENCHMARK_NAMES,
+    help='only run these benchmarks'
+)
+arg_parser.add_argument(
+    '--repeat',
+    type=int,
+    default=os.environ.get('BENCHMARK_REPEAT', 3),
+    help='the number of times each benchmark is run'
+)
+arg_parser.add_argument(
+    '--target-size',
+    type=cast_int,
+    default=os.environ.get('TARGET_SIZE', '10e6'),  # bytes
+    help='the approximate size of parts in bytes'
+)
+arg_parser.add_argument(
+    '--workers',
+    type=int,
+    default=os.environ.get('WORKERS', os.cpu_count()),
+    help='the number of worker processes of the parallel benchmark'
+)
+arg_parser.add_argument(
+    '--global-id-marker',
+    default=os.environ.get('GLOBAL_ID_MARKER', 'id.dbpedia.org/global/'),
+    help='only triples with this marker in the subject will be transformed'
+)
+add_generator_arguments(arg_parser)
+
+
+if __name__ == "__main__":
+    args = arg_parser.parse_args(sys.argv[1:])
+    args.output = getattr(
+        args, 'output', base_path(f'benchmark_{hex(int(time.time()))[2:]}.json')
+    )
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        report = run_benchmarks(args, work_dir)
+
+    with open(args.output, 'w') as output_file:
+        json.dump(report, output_file, indent=4)
+    print(f'\nDone! Benchmark results have been saved to {args.output}')
+
+    if args.baseline:
+        compare_to_baseline(report, args.baseline)
@@ -0,0 +1,329 @@
+import bisect
+import bz2
+import io
+import multiprocessing
+import os
+import sys
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BZIP2_COMPRESSION, GZIP_COMPRESSION, ZSTD_COMPRESSION = 'bzip2', 'gzip', 'zstd'
+MAGIC_NUMBERS = {
+    b'BZh': BZIP2_COMPRESSION,
+    b'\x1f\x8b': GZIP_COMPRESSION,
+    b'\x28\xb5\x2f\xfd': ZSTD_COMPRESSION,
+}
+INDEX_HEADER_PREFIX = b'#block-index'
+READ_SIZE = 2 ** 20  # bytes
+
+# bzip2 blocks and streams are marked by 48-bit magic numbers that can
+# start at any bit, because blocks are not padded to whole bytes
+BZIP2_BLOCK_MAGIC = 0x314159265359
+BZIP2_EOS_MAGIC = 0x177245385090
+BZIP2_MAGIC_MASK = 2 ** 48 - 1
+
+
+class BlockIndex:
+    """Independently decompressible blocks of a compressed input file
+
+    Each block is `start`, `end`, `offset` and `length`: the positions of
+    the block in the compressed file (in bits for bzip2, which doesn't
+    align blocks to bytes, and in bytes for gzip members and zstd frames)
+    and the range of the uncompressed input that it holds.
+    """
+
+    def __init__(self, compression, blocks):
+        self.compression = compression
+        self.blocks = blocks
+        self.offsets = [offset for _, _, offset, _ in blocks]
+
+    @classmethod
+    def open(cls, index_path, input_path):
+        # returns `None` when there is no index or it's out of date
+        try:
+            index_file = open(index_path, 'rb')
+        except FileNotFoundError:
+            return None
+
+        with index_file:
+            header = index_file.readline().rstrip(b'\n').split(b'\t')
+            if header[0] != INDEX_HEADER_PREFIX or header[2:] != input_fingerprint(input_path):
+                print(f'WARN: ignoring {index_path}, it does not match '
+                      f'{input_path}', file=sys.stderr)
+                return None
+
+            return cls(header[1].decode('ascii'), [
+                tuple(int(value) for value in line.split(b'\t'))
+                for line in index_file
+            ])
+
+    def save(self, index_path, input_path):
+        with open(index_path, 'wb') as index_file:
+            index_file.write(b'\t'.join([
+                INDEX_HEADER_PREFIX,
+                self.compression.encode('ascii'),
+                *input_fingerprint(input_path),
+            ]))
+            index_file.write(b'\n')
+            for block in self.blocks:
+                index_file.write(b'%d\t%d\t%d\t%d\n' % block)
+
+    @property
+    def uncompressed_size(self):
+        if not self.blocks:
+            return 0
+        _, _, offset, length = self.blocks[-1]
+        return offset + length
+
+
+class BlockFile(io.RawIOBase):
+    """A read-only, seekable view of the uncompressed input
+
+    Only the block around the current position is decompressed. Reading on
+    within a gzip member or zstd frame continues where the last read
+    stopped, but seeking back into one decompresses it from its start.
+    """
+
+    def __init__(self, input_path, block_index):
+        super().__init__()
+        self.in_file = open(input_path, 'rb')
+        self.block_index = block_index
+        self.position = 0
+        self.window = b''
+        self.window_start = self.window_end = 0
+        self.chunks = None
+        self.chunks_block = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.block_index.uncompressed_size
+        self.position = max(offset, 0)
+        return self.position
+
+    def readinto(self, buffer):
+        if self.position >= self.block_index.uncompressed_size:
+            return 0
+        if not self.window_start <= self.position < self.window_end:
+            self.load_window(self.position)
+
+        window_pos = self.position - self.window_start
+        size = min(len(buffer), self.window_end - self.position)
+        buffer[:size] = self.window[window_pos:window_pos + size]
+        self.position += size
+        return size
+
+    def load_window(self, position):
+        block_number = bisect.bisect_right(self.block_index.offsets, position) - 1
+        if self.chunks_block != block_number or self.window_end > position:
+            start, end, offset, _ = self.block_index.blocks[block_number]
+            self.chunks = iter_block_data(
+                self.in_file,
+                self.block_index.compression,
+                start,
+                end,
+            )
+            self.chunks_block = block_number
+            self.window_start = self.window_end = offset
+
+        while self.window_end <= position:
+            self.window = next(self.chunks)
+            self.window_start = self.window_end
+            self.window_end += len(self.window)
+
+    def close(self):
+        self.in_file.close()
+        super().close()
+
+
+def detect_compression(input_path):
+    with open(input_path, 'rb') as in_file:
+        head = in_file.read(4)
+
+    for magic_number, compression in MAGIC_NUMBERS.items():
+        if head.startswith(magic_number):
+            return compression
+    return None
+
+
+def open_input(input_path, block_index_path=None):
+    # uncompressed input is opened as is, compressed input through its blocks
+    if detect_compression(input_path) is None:
+        return open(input_path, 'rb')
+
+    block_index = ensure_block_index(input_path, block_index_path)
+    return io.BufferedReader(BlockFile(input_path, block_index))
+
+
+def ensure_block_index(input_path, block_index_path=None, parallel=False):
+    block_index_path = block_index_path or default_block_index_path(input_path)
+    block_index = BlockIndex.open(block_index_path, input_path)
+    if block_index is None:
+        block_index = build_block_index(input_path, block_index_path, parallel)
+    return block_index
+
+
+def build_block_index(input_path, index_path, parallel=False):
+    compression = detect_compression(input_path)
+    print(f'Indexing the {compression} blocks of {input_path} ...')
+
+    if compression == BZIP2_COMPRESSION:
+        block_bounds = scan_bzip2_blocks(input_path)
+        block_tasks = [(input_path, compression, *bounds) for bounds in block_bounds]
+        if parallel:
+            with multiprocessing.Pool() as pool:
+                lengths = pool.starmap(measure_block, block_tasks, chunksize=16)
+        else:
+            lengths = [measure_block(*task) for task in block_tasks]
+
+        blocks = []
+        offset = 0
+        for (start, end), length in zip(block_bounds, lengths):
+            blocks.append((start, end, offset, length))
+            offset += length
+    else:
+        blocks = scan_members(input_path, compression)
+        if len(blocks) == 1:
+            print(f'WARN: {input_path} is a single {compression} stream, so parts '
+                  f'are decompressed from its start; compress it in independent '
+                  f'members or frames (e.g. with `bgzip`) to decompress parts '
+                  f'in parallel', file=sys.stderr)
+
+    block_index = BlockIndex(compression, blocks)
+    block_index.save(index_path, input_path)
+    print(f'{len(blocks)} blocks have been indexed in {index_path}')
+    return block_index
+
+
+def scan_bzip2_blocks(input_path):
+    # find every magic number at every bit alignment: the middle five bytes
+    # of a magic number are the same wherever it starts in its first byte
+    patterns = []
+    for magic, is_block in ((BZIP2_BLOCK_MAGIC, True), (BZIP2_EOS_MAGIC, False)):
+        for shift in range(8):
+            window = (magic << (8 - shift)).to_bytes(7, 'big')
+            patterns.append((window[1:6], magic, shift, is_block))
+
+    markers = []
+    with open(input_path, 'rb') as in_file:
+        buffer_start = 0
+        buffer = in_file.read(READ_SIZE)
+        while True:
+            # windows that start in the last six bytes are checked next round
+            for pattern, magic, shift, is_block in patterns:
+                found = buffer.find(pattern, 1)
+                while 0 < found < len(buffer) - 5:
+                    window = int.from_bytes(buffer[found - 1:found + 6], 'big')
+                    if (window >> (8 - shift)) & BZIP2_MAGIC_MASK == magic:
+                        markers.append(((buffer_start + found - 1) * 8 + shift, is_block))
+                    found = buffer.find(pattern, found + 1)
+
+            data = in_file.read(READ_SIZE)
+            if not data:
+                break
+            buffer_start += len(buffer) - 6
+            buffer = buffer[-6:] + data
+
+    # a block ends where the next block or the end of its stream starts
+    markers.sort()
+    return [
+        (start, end)
+        for (start, is_block), (end, _) in zip(markers, markers[1:])
+        if is_block
+    ]
+
+
+def scan_members(input_path, compression):
+    # gzip members and zstd frames are only found by decompressing them
+    blocks = []
+    start = offset = length = 0
+    decompressor = new_decompressor(compression)
+
+    with open(input_path, 'rb') as in_file:
+        cursor = 0
+        data = in_file.read(READ_SIZE)
+        while data:
+            length += len(decompressor.decompress(data))
+            if decompressor.eof:
+                end = cursor + len(data) - len(decompressor.unused_data)
+                blocks.append((start, end, offset, length))
+                data = decompressor.unused_data or in_file.read(READ_SIZE)
+                decompressor = new_decompressor(compression)
+                start = cursor = end
+                offset += length
+                length = 0
+            else:
+                cursor += len(data)
+                data = in_file.read(READ_SIZE)
+
+    if cursor > start:
+        raise EOFError(f'{input_path} ended before the end of its last {compression} stream')
+    return blocks
+
+
+def measure_block(input_path, compression, start, end):
+    with open(input_path, 'rb') as in_file:
+        return sum(len(chunk) for chunk in iter_block_data(in_file, compression, start, end))
+
+
+def iter_block_data(in_file, compression, start, end):
+    if compression == BZIP2_COMPRESSION:
+        in_file.seek(start // 8)
+        block_bytes = in_file.read((end + 7) // 8 - start // 8)
+        yield decompress_bzip2_block(block_bytes, start % 8, end - start)
+        return
+
+    decompressor = new_decompressor(compression)
+    cursor = start
+    while cursor < end:
+        # other blocks may have been read from `in_file` in between
+        in_file.seek(cursor)
+        data = in_file.read(min(READ_SIZE, end - cursor))
+        cursor += len(data)
+        yield decompressor.decompress(data)
+
+
+def decompress_bzip2_block(block_bytes, bit_offset, bit_length):
+    # wrap the block in a stream of its own: the stream CRC of a single
+    # block stream is the CRC of that block
+    block_bits = int.from_bytes(block_bytes, 'big')
+    block_bits >>= len(block_bytes) * 8 - bit_offset - bit_length
+    block_bits &= (1 << bit_length) - 1
+    block_crc = (block_bits >> (bit_length - 80)) & 0xffffffff
+
+    stream_bits = (((block_bits << 48) | BZIP2_EOS_MAGIC) << 32) | block_crc
+    stream_length = bit_length + 80
+    padding = -stream_length % 8
+    stream_bytes = (stream_bits << padding).to_bytes((stream_length + padding) // 8, 'big')
+    return bz2.decompress(b'BZh9' + stream_bytes)
+
+
+def new_decompressor(compression):
+    if compression == GZIP_COMPRESSION:
+        return zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    elif zstandard is None:
+        raise ImportError('Install the `zstandard` package to read zstd input')
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def input_fingerprint(input_path):
+    input_stat = os.stat(input_path)
+    return [b'%d' % input_stat.st_size, b'%d' % input_stat.st_mtime_ns]
+
+
+def default_block_index_path(input_path):
+    return f'{input_path}.blocks'
@@ -2,46 +2,117 @@ import csv
 import os
 import sys
 
+from dbpedia.compressed_input import open_input
+from dbpedia.subject_index import SubjectIndex
+
 BINARY_SEARCH_TYPE, JUMP_SEARCH_TYPE = 'binary', 'jump'
 SEARCH_TYPE_CHOICES = [BINARY_SEARCH_TYPE, JUMP_SEARCH_TYPE]
 
 
 def compute_parts(args):
+    subject_index = SubjectIndex.open(args.subject_index, args.input_path)
+    if subject_index:
+        part_bounds = compute_indexed_part_bounds(args, subject_index)
+    else:
+        part_bounds = compute_part_bounds(args)
+
+    with open(args.parts_file, 'w') as parts_file:
+        tsv_writer = csv.writer(parts_file, delimiter='\t')
+
+        for part_number, (chunk_start, chunk_end) in enumerate(part_bounds, start=1):
+            part_name = os.path.join(args.output_dir, f'part-{part_number:03}')
+            tsv_writer.writerow([part_name, chunk_start, chunk_end])
+            yield part_name, chunk_start, chunk_end
 
-    with open(args.input_path, 'rb') as in_file:
+
+def compute_part_bounds(args):
+
+    with open_input(args.input_path, args.block_index) as in_file:
         file_end = in_file.seek(0, os.SEEK_END)
 
-        # hop to the line with the first global URI subject
+        # hop to the line with the first global URI subject, and find the
+        # line after the last one, so parts only span global subjects
         chunk_end = seek_first_global_subject(args, in_file, file_end)
+        region_end = seek_global_region_end(args, in_file, chunk_end, file_end)
+
+        while chunk_end < region_end:
+            chunk_start = chunk_end
+            if chunk_start + args.target_size >= region_end:
+                chunk_end = region_end
+            else:
+                chunk_end = min(
+                    seek_subject_transition(in_file, chunk_start + args.target_size),
+                    region_end,
+                )
+            yield chunk_start, chunk_end
+
+
+def compute_indexed_part_bounds(args, subject_index):
+    # every indexed offset is the start of a subject: no searching needed
+    print(f'Computing parts from {args.subject_index}')
+    chunk_start = None
+
+    with subject_index:
+        for _, offset in subject_index:
+            if chunk_start is None:
+                chunk_start = offset
+            elif offset - chunk_start >= args.target_size:
+                yield chunk_start, offset
+                chunk_start = offset
+
+    if chunk_start is not None:
+        # the global subjects end somewhere after the last indexed one
+        with open_input(args.input_path, args.block_index) as in_file:
+            file_end = in_file.seek(0, os.SEEK_END)
+            yield chunk_start, seek_global_region_end(args, in_file, chunk_start, file_end)
+
+
+def compute_raw_parts(args):
+    # the parts are not aligned to subjects: workers do that with `align_part`
+    with open_input(args.input_path, args.block_index) as in_file:
+        file_end = in_file.seek(0, os.SEEK_END)
+        first_global_pos = seek_first_global_subject(args, in_file, file_end)
+        region_end = seek_global_region_end(args, in_file, first_global_pos, file_end)
 
-        with open(args.parts_file, 'w') as parts_file:
-            tsv_writer = csv.writer(parts_file, delimiter='\t')
-            part_number = 0
+    part_starts = range(first_global_pos, region_end, args.target_size)
+    for part_number, chunk_start in enumerate(part_starts, start=1):
+        chunk_end = min(chunk_start + args.target_size, region_end)
+        part_name = os.path.join(args.output_dir, f'part-{part_number:03}')
+        # the first part starts and the last part ends on a subject already
+        yield part_name, chunk_start, chunk_end, part_number > 1, chunk_end < region_end
 
-            while chunk_end < file_end:
-                part_number += 1
-                chunk_start = chunk_end
 
-                # seek to the first line break after target
-                in_file.seek(chunk_start + args.target_size)
-                in_file.readline()
+def align_part(file_obj, left, right, align_left=True, align_right=True):
+    # neighbouring parts align their shared offset to the same transition,
+    # so no subject is split between them or transformed twice
+    if align_left:
+        left = seek_subject_transition(file_obj, left)
+    if align_right:
+        right = seek_subject_transition(file_obj, right)
+    return left, max(left, right)
 
-                # find the transition between two subjects
-                final_subject = read_subject_from_line(in_file)
-                bookmark = in_file.tell()
-                while True:
-                    new_subject = read_subject_from_line(in_file)
-                    if new_subject and new_subject == final_subject:
-                        bookmark = in_file.tell()
-                    else:
-                        # seek to the end of the line with a `final_subject`
-                        in_file.seek(bookmark)
-                        chunk_end = bookmark
-                        break
 
-                part_name = os.path.join(args.output_dir, f'part-{part_number:03}')
-                tsv_writer.writerow([part_name, chunk_start, chunk_end])
-                yield part_name, chunk_start, chunk_end
+def write_parts_file(parts_path, parts):
+    with open(parts_path, 'w') as parts_file:
+        tsv_writer = csv.writer(parts_file, delimiter='\t')
+        tsv_writer.writerows(parts)
+
+
+def seek_subject_transition(file_obj, cursor):
+    # seek to the first line break after `cursor`
+    file_obj.seek(cursor)
+    file_obj.readline()
+
+    # find the transition between two subjects
+    final_subject = read_subject_from_line(file_obj)
+    bookmark = file_obj.tell()
+    while True:
+        new_subject = read_subject_from_line(file_obj)
+        if new_subject and new_subject == final_subject:
+            bookmark = file_obj.tell()
+        else:
+            # seek to the end of the line with a `final_subject`
+            return file_obj.seek(bookmark)
 
 
 def read_subject_from_line(file_obj):
@@ -60,8 +131,24 @@ def seek_first_global_subject(args, file_obj, file_end):
     return file_obj.seek(cursor)
 
 
-def binary_search(args, file_obj, id_marker, file_end):
-    left = cursor = 0
+def seek_global_region_end(args, file_obj, region_start, file_end):
+    # global subjects sort together, so the region ends at the first line
+    # after `region_start` without one, or at the end of the file
+    id_marker = args.global_id_marker.encode('utf8')
+
+    print('Looking for the first line after the global URI subjects:')
+    if args.search_type == BINARY_SEARCH_TYPE:
+        cursor = binary_search(args, file_obj, id_marker, file_end, region_start, find_end=True)
+    else:
+        cursor = jump_backpedal_and_step(
+            args, file_obj, id_marker, file_end, region_start, find_end=True
+        )
+
+    return file_obj.seek(cursor)
+
+
+def binary_search(args, file_obj, id_marker, file_end, start=0, find_end=False):
+    left = cursor = start
     right = file_end
     id_subj_str = args.id_marker_prefix + id_marker
 
@@ -73,10 +160,10 @@ def binary_search(args, file_obj, id_marker, file_end):
                 +(right - left) // 2
             )
         except StopIteration:
-            cursor = step_to_marked_line(file_obj, left, id_marker, right)
+            cursor = step_to_marked_line(file_obj, left, id_marker, right, marked=not find_end)
             break
 
-        if subj_str < id_subj_str:
+        if subj_str < id_subj_str or (find_end and subj_str.startswith(id_subj_str)):
             left = cursor
             print('forw', left, right, subj_str)
         else:
@@ -86,26 +173,37 @@ def binary_search(args, file_obj, id_marker, file_end):
     return cursor
 
 
-def jump_backpedal_and_step(args, file_obj, id_marker, file_end):
-    subj_str = b''
-    cursor = previous_jump_pos = 0
+def jump_backpedal_and_step(args, file_obj, id_marker, file_end, start=0, find_end=False):
+    # looking for the first global subject, or for the first subject after them
+    def is_target(subj_str):
+        return (id_marker in subj_str) != find_end
+
+    # the search starts before its target
+    subj_str = id_marker if find_end else b''
+    cursor = previous_jump_pos = start
 
     try:
         # JUMP
-        while id_marker not in subj_str and cursor < file_end:
+        while not is_target(subj_str) and cursor < file_end:
             previous_jump_pos = cursor
             cursor, subj_str = seek_subject_at(file_obj, cursor, +args.jump_size)
             print('jump', cursor, subj_str)
 
         # BACKPEDAL
-        while id_marker in subj_str and cursor > 0:
+        while is_target(subj_str) and cursor > start:
             cursor, subj_str = seek_subject_at(file_obj, cursor, -args.backpedal_size)
             print('backpedal', cursor, subj_str)
     except StopIteration:
         # jump or backpedal size is too small: step from previous jump
         cursor = previous_jump_pos
 
-    if 0 < cursor < file_end:
+    if find_end:
+        # STEP, unless the global subjects run to the end of the file
+        if cursor < file_end:
+            cursor = step_to_marked_line(file_obj, cursor, id_marker, file_end, marked=False)
+        else:
+            cursor = file_end
+    elif 0 < cursor < file_end:
         # STEP
         cursor = step_to_marked_line(file_obj, cursor, id_marker, file_end)
     else:
@@ -132,15 +230,20 @@ def seek_subject_at(file_obj, cursor, delta):
     return new_cursor, subj_str
 
 
-def step_to_marked_line(file_obj, cursor, id_marker, upper_limit):
-    subj_str = b''
+def step_to_marked_line(file_obj, cursor, id_marker, upper_limit, marked=True):
+    # step to the first line from `cursor` whose subject has the marker, or
+    # doesn't have it: past the last line, that is the end of the file
     file_obj.seek(cursor)
-    while id_marker not in subj_str and cursor < upper_limit:
-        cursor = file_obj.tell()
+    while cursor <= upper_limit:
         subj_str = read_subject_from_line(file_obj)
         print('step', cursor, subj_str)
+        if (id_marker in subj_str) == marked:
+            return file_obj.seek(cursor)
+        if not subj_str:
+            break
+        cursor = file_obj.tell()
 
-    if id_marker not in subj_str:
+    if marked:
         print('WARN: did not find first global URI', file=sys.stderr)
         cursor = 0
 
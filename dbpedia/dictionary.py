@@ -0,0 +1,149 @@
+import csv
+import functools
+import os
+import sqlite3
+
+from dbpedia.ledger import ResumeError
+from dbpedia.writers import JSONL_FORMAT, NO_COMPRESSION, rewrite_ids
+
+SUBJECTS_SUFFIX = 'subjects.tsv'
+INSERT_BATCH_SIZE = 2 ** 16  # IDs
+LOOKUP_CACHE_SIZE = 2 ** 16  # IDs
+
+
+class IdDictionary:
+    """Dense integer IDs of URIs, kept in an SQLite file instead of memory
+
+    IDs are handed out in the order in which URIs are added, and every URI
+    is written to `dictionary_file` with its ID as it is added.
+    """
+
+    def __init__(self, path, dictionary_file):
+        self.connection = sqlite3.connect(path)
+        # a scratch file, which is rebuilt rather than recovered after a crash
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute(
+            'CREATE TABLE ids (uri TEXT PRIMARY KEY, id INTEGER NOT NULL) WITHOUT ROWID'
+        )
+        self.cursor = self.connection.cursor()
+        self.dictionary_writer = csv.writer(dictionary_file, delimiter='\t')
+        self.dictionary_writer.writerow(['id', 'uri'])
+        self.size = 0
+        # added, but not inserted yet
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, uri):
+        # for URIs that are known to be new, which are inserted in batches
+        uri_id = self.next_id(uri)
+        self.pending.append((uri, uri_id))
+        if len(self.pending) >= INSERT_BATCH_SIZE:
+            self.flush()
+        return uri_id
+
+    def flush(self):
+        self.connection.executemany('INSERT INTO ids VALUES (?, ?)', self.pending)
+        self.connection.commit()
+        self.pending.clear()
+
+    def id(self, uri):
+        # the ID of any URI, which is added when it is new; only after `flush`
+        row = self.cursor.execute('SELECT id FROM ids WHERE uri = ?', (uri,)).fetchone()
+        if row:
+            return row[0]
+
+        uri_id = self.next_id(uri)
+        self.cursor.execute('INSERT INTO ids VALUES (?, ?)', (uri, uri_id))
+        return uri_id
+
+    def next_id(self, uri):
+        uri_id = self.size
+        self.size += 1
+        self.dictionary_writer.writerow([uri_id, uri])
+        return uri_id
+
+
+def subjects_path(part_name):
+    return f'{part_name}_{SUBJECTS_SUFFIX}'
+
+
+def read_subjects(part_name):
+    with open(subjects_path(part_name), encoding='utf8') as subjects_file:
+        for line in subjects_file:
+            yield line.rstrip('\n')
+
+
+def encode_ids(
+        part_names,
+        dictionary_path,
+        dictionary_db_path,
+        output_format=JSONL_FORMAT,
+        compression=NO_COMPRESSION,
+        compress_level=None,
+):
+    """Replace the part-local subject IDs of all parts with global ones
+
+    Parts number their subjects from 0 and list them in
+    `<part>_subjects.tsv`, so the global IDs of a part's subjects are its
+    local IDs plus the number of subjects in the parts before it. Edges to
+    other subjects are looked up, and the vertices edges point to that
+    aren't subjects get the IDs after those of the subjects.
+    """
+    encoded_parts = [
+        part_name for part_name in part_names
+        if not os.path.exists(subjects_path(part_name))
+    ]
+    if len(encoded_parts) == len(part_names):
+        print(f'All parts have been dictionary encoded already, see {dictionary_path}')
+        return None
+    elif encoded_parts:
+        raise ResumeError(
+            f'{len(encoded_parts)} parts were dictionary encoded by a run that '
+            f'did not finish: {", ".join(encoded_parts)}\n'
+            f'Start over in a new output directory instead.'
+        )
+
+    if os.path.exists(dictionary_db_path):
+        os.remove(dictionary_db_path)
+    with open(dictionary_path, 'w', encoding='utf8', newline='') as dictionary_file, \
+            IdDictionary(dictionary_db_path, dictionary_file) as dictionary:
+        offsets = []
+        for part_name in part_names:
+            offsets.append(dictionary.size)
+            for subject in read_subjects(part_name):
+                dictionary.add(subject)
+        dictionary.flush()
+        subject_count = dictionary.size
+
+        inv_id = functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)(dictionary.id)
+        for part_name, offset in zip(part_names, offsets):
+            # CSV output has the local IDs as strings
+            def global_id(local_id, offset=offset):
+                return offset + int(local_id)
+
+            rewrite_ids(
+                part_name,
+                global_id,
+                global_id,
+                inv_id,
+                output_format,
+                compression,
+                compress_level,
+            )
+            os.remove(subjects_path(part_name))
+        id_count = dictionary.size
+    os.remove(dictionary_db_path)
+
+    return {
+        'subjects': subject_count,
+        'ids': id_count,
+    }
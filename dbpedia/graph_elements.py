@@ -1,9 +1,11 @@
+import functools
 import glob
+import io
 import json
-import multiprocessing
+import mmap
 import os
 import sys
-from collections import Counter, defaultdict, UserDict
+from collections import Counter, UserDict
 
 import requests
 from bs4 import BeautifulSoup
@@ -11,8 +13,41 @@ from rdflib import Literal
 from rdflib.plugins.parsers.ntriples import NTriplesParser
 from requests import RequestException
 
-from dbpedia.compute_parts import compute_parts
+from dbpedia import ntriples
+from dbpedia.compressed_input import (
+    detect_compression,
+    ensure_block_index,
+    open_input,
+)
+from dbpedia.compute_parts import (
+    align_part,
+    compute_parts,
+    compute_raw_parts,
+    write_parts_file,
+)
+from dbpedia.dictionary import encode_ids, subjects_path
+from dbpedia.ledger import PartLedger
+from dbpedia.metrics import (
+    PARSE_STAGE,
+    READ_STAGE,
+    SERIALIZE_STAGE,
+    TRANSFORM_STAGE,
+    PartMetrics,
+    sampled,
+    summarize_parts,
+    timed_phase,
+)
+from dbpedia.ntriples import (
+    FAST_PARSER_TYPE,
+    RDFLIB_PARSER_TYPE,
+    NTriplesTokenizer,
+)
+from dbpedia.progress import ProgressReporter
+from dbpedia.same_as import cluster_same_as, links_path
+from dbpedia.scheduler import PartScheduler
+from dbpedia.statistics import StatisticsCollector, merge_statistics, statistics_path
 from dbpedia.utils import base_path
+from dbpedia.writers import JSONL_FORMAT, NO_COMPRESSION, WRITER_TYPES
 
 OWL_SAME_AS = 'http://www.w3.org/2002/07/owl#sameAs'
 MULTIVALUED_URI_PROPS = {
@@ -20,6 +55,9 @@ MULTIVALUED_URI_PROPS = {
     'http://www.w3.org/1999/02/22-rdf-syntax-ns#type',
     'http://dbpedia.org/ontology/wikiPageExternalLink',
 }
+QNAME_CACHE_SIZE = 2 ** 16
+# values that all writers write as they are; MessagePack has a type for bytes
+NATIVE_TYPES = {str, int, float, bool, bytes}
 
 
 def transform_part(
@@ -29,123 +67,400 @@ def transform_part(
         left,
         right,
         prefixer=None,
+        parser_type=FAST_PARSER_TYPE,
+        buffer_size=io.DEFAULT_BUFFER_SIZE,
+        align_left=False,
+        align_right=False,
+        output_format=JSONL_FORMAT,
+        block_index_path=None,
+        output_compression=NO_COMPRESSION,
+        compress_level=None,
+        profile_path=None,
+        same_as_links=False,
+        dictionary_encode=False,
+        predicate_statistics=False,
+        on_progress=None,
 ):
-    print(f'starting {part_name}: {left} -- {right}')
-    with open(input_path, 'rb') as in_file:
-        in_file.seek(left)
-        part_bytes = in_file.read(right - left)
-        part_str = part_bytes.decode('utf8')  # wasteful
-        with PropertyGraphSink(global_id_marker, part_name, prefixer) as sink:
-            ntp = NTriplesParser(sink=sink)
-            ntp.parsestring(part_str)
+    # `on_progress` is called with the bytes read and triples parsed so far
+    metrics = PartMetrics()
+    compression = detect_compression(input_path)
+    with open_input(input_path, block_index_path) as in_file:
+        if align_left or align_right:
+            left, right = align_part(in_file, left, right, align_left, align_right)
+
+        print(f'starting {part_name}: {left} -- {right}')
+        sink = PropertyGraphSink(
+            global_id_marker,
+            part_name,
+            prefixer,
+            buffer_size,
+            output_format,
+            output_compression,
+            compress_level,
+            same_as_links,
+            dictionary_encode,
+            predicate_statistics,
+        )
+        stage_functions = {
+            TRANSFORM_STAGE: sink.triple.__func__,
+            SERIALIZE_STAGE: sink.flush_buffers.__func__,
+        }
+        with sink, sampled(metrics, stage_functions, profile_path):
+            # lines of other subjects are dropped before they are parsed
+            subject_marker = global_id_marker.encode('utf8')
+            if parser_type == RDFLIB_PARSER_TYPE:
+                ntp = NTriplesParser(sink=sink)
+
+                def parse_lines(buffer, start, end):
+                    chunk = ntriples.select_subject_lines(buffer[start:end], subject_marker)
+                    ntp.parsestring(chunk.decode('utf8'))
+            else:
+                tokenizer = NTriplesTokenizer(sink=sink, subject_marker=subject_marker)
+
+                def parse_lines(buffer, start, end):
+                    tokenizer.parse_range(buffer, start, end)
+
+            # only whole lines are parsed, a few MB at a time, so memory use
+            # doesn't grow with part size; uncompressed input is mapped and
+            # parsed in place, and compressed input only decompresses the
+            # blocks of this part
+            if compression is None and parser_type == FAST_PARSER_TYPE:
+                line_ranges = iter_mapped_line_ranges(in_file, left, right)
+            else:
+                line_ranges = (
+                    (chunk, 0, len(chunk))
+                    for chunk in ntriples.iter_line_chunks(in_file, left, right)
+                )
+            bytes_in = 0
+            while True:
+                metrics.switch(READ_STAGE)
+                line_range = next(line_ranges, None)
+                if line_range is None:
+                    break
+                metrics.switch(PARSE_STAGE)
+                buffer, start, end = line_range
+                bytes_in += end - start
+                parse_lines(buffer, start, end)
+                if on_progress:
+                    on_progress(bytes_in, sum(sink.predicate_count.values()))
+
+            # what is left is flushing and closing the output files
+            metrics.switch(SERIALIZE_STAGE)
+    metrics.stop()
 
     triple_count = sum(sink.predicate_count.values())
     print(f'finished {part_name}: {triple_count} triples')
-    return part_name, dict(sink.predicate_count)
+    return (
+        part_name,
+        left,
+        right,
+        dict(sink.predicate_count),
+        sink.byte_counts,
+        metrics.report(
+            bytes_in,
+            sink.byte_counts,
+            triple_count,
+            sink.vertex_count,
+            sink.edge_count,
+        ),
+    )
+
+
+def iter_mapped_line_ranges(in_file, left, right):
+    # pages of the mapped file are read on demand and can be dropped again,
+    # and lines are parsed in place rather than copied into chunks
+    if left >= right or os.fstat(in_file.fileno()).st_size == 0:
+        return
+    with mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ) as in_map:
+        if hasattr(in_map, 'madvise'):
+            in_map.madvise(mmap.MADV_SEQUENTIAL)
+        for start, end in ntriples.iter_line_ranges(in_map, left, right):
+            # a byte of every page is touched, so that the pages are read
+            # here, where reading is timed, and not while parsing
+            in_map[start:end:mmap.PAGESIZE]
+            yield in_map, start, end
 
 
 def make_graph_elements(args):
     print(f'Reading from {args.input_path} ...')
+    phases = {}
 
     prefixer = None
     if args.shorten_uris:
         prefixer = NamespacePrefixer()
 
-    if args.parallel:
-        pool = multiprocessing.Pool()
-        tasks = []
-
-        for part_path, left, right in compute_parts(args):
-            tasks.append(pool.apply_async(
-                transform_part, (
-                    args.input_path,
-                    args.global_id_marker,
-                    part_path,
-                    left,
-                    right,
-                    prefixer,
-                )
-            ))
+    input_size = os.path.getsize(args.input_path)
+    if detect_compression(args.input_path):
+        with timed_phase(phases, 'block_index'):
+            block_index = ensure_block_index(args.input_path, args.block_index, args.parallel)
+        input_size = block_index.uncompressed_size
 
-        results = [
-            task.get(timeout=args.task_timeout)
-            for task in tasks
-        ]
-        pool.close()
+    if args.resume and os.path.exists(args.ledger_file):
+        ledger = PartLedger.resume(args)
+        print(f'Resuming {len(ledger.unfinished_parts())} unfinished parts ...')
     else:
-        results = [
-            transform_part(
-                args.input_path,
-                args.global_id_marker,
-                part_path,
-                left,
-                right,
-                prefixer,
+        with timed_phase(phases, 'partitioning'):
+            part_specs = compute_part_specs(args)
+        ledger = PartLedger.create(args, part_specs)
+    parts = ledger.unfinished_parts()
+
+    # the byte ranges of the last part can reach beyond the end of the input
+    progress = ProgressReporter(
+        sum(min(right, input_size) - left for _, left, right, *_ in parts),
+        args.progress,
+        args.progress_interval,
+    )
+    with timed_phase(phases, 'transform'), progress:
+        if args.parallel:
+            scheduler = PartScheduler(
+                transform_part,
+                functools.partial(make_part_task_args, args, prefixer),
+                args.workers,
+                args.task_timeout,
+                args.max_retries,
+                progress,
             )
-            for part_path, left, right in compute_parts(args)
-        ]
+            scheduler.run(ledger, parts)
+        else:
+            for part in parts:
+                ledger.mark_done(*transform_part(
+                    *make_part_task_args(args, prefixer, part),
+                    on_progress=functools.partial(progress.update, part[0]),
+                ))
+
+    # workers may have aligned or split their parts
+    write_parts_file(args.parts_file, ledger.output_ranges())
+
+    same_as_stats = None
+    if args.cluster_same_as:
+        print('Clustering owl:sameAs links ...')
+        with timed_phase(phases, 'same_as_clustering'):
+            same_as_stats = cluster_same_as(
+                [part_name for part_name, _, _ in ledger.output_ranges()],
+                args.same_as_mapping,
+                os.path.join(args.output_dir, 'same-as-clusters.db'),
+                args.format,
+                args.compress,
+                args.compress_level,
+            )
+        print(f'{same_as_stats["replaced_ids"]} IDs in {same_as_stats["clusters"]} clusters '
+              f'have been replaced, see {args.same_as_mapping}')
+
+    dictionary_stats = None
+    if args.dictionary_encode:
+        print('Replacing IDs by integers ...')
+        with timed_phase(phases, 'dictionary_encoding'):
+            dictionary_stats = encode_ids(
+                [part_name for part_name, _, _ in ledger.output_ranges()],
+                args.dictionary_file,
+                os.path.join(args.output_dir, 'dictionary.db'),
+                args.format,
+                args.compress,
+                args.compress_level,
+            )
+        if dictionary_stats:
+            print(f'{dictionary_stats["ids"]} IDs have been listed in {args.dictionary_file}')
+
+    if args.predicate_statistics:
+        statistics_file = os.path.join(args.output_dir, 'predicate-statistics.json')
+        with timed_phase(phases, 'statistics'):
+            predicate_total = merge_statistics(
+                [part_name for part_name, _, _ in ledger.output_ranges()],
+                statistics_file,
+            )
+        print(f'Statistics of {predicate_total} predicates have been saved to {statistics_file}')
 
     pcounts_path = os.path.join(args.output_dir, 'predicate-counts.json')
     with open(pcounts_path, 'w') as pcounts_file:
-        json.dump(dict(results), pcounts_file, indent=4)
-    print(f'\nDone! Predicate counts have been saved to {pcounts_path}')
+        json.dump(ledger.predicate_counts(), pcounts_file, indent=4)
+    # in a file of their own, which keeps the predicate counts of every part
+    # the only thing in predicate-counts.json
+    with open(os.path.join(args.output_dir, 'byte-counts.json'), 'w') as bcounts_file:
+        json.dump(ledger.byte_counts(), bcounts_file, indent=4)
+
+    report_path = os.path.join(args.output_dir, 'run-report.json')
+    with open(report_path, 'w') as report_file:
+        json.dump(
+            make_run_report(
+                args, phases, ledger.part_metrics(), same_as_stats, dictionary_stats
+            ),
+            report_file,
+            indent=4,
+        )
+    print(f'\nDone! Predicate counts have been saved to {pcounts_path} '
+          f'and a performance report to {report_path}')
+
+
+def make_run_report(args, phases, part_metrics, same_as_stats=None, dictionary_stats=None):
+    return {
+        'input_path': args.input_path,
+        'input_size': os.path.getsize(args.input_path),
+        'parallel': args.parallel,
+        'workers': args.workers if args.parallel else 1,
+        # the search for part boundaries, unless the ledger was resumed
+        'search_type': args.search_type,
+        'subject_index': os.path.exists(args.subject_index),
+        'phases': phases,
+        # also the parts of earlier runs, when the ledger was resumed
+        'parts': summarize_parts(part_metrics),
+        'part_metrics': part_metrics,
+        'same_as': same_as_stats,
+        'dictionary': dictionary_stats,
+    }
+
+
+def compute_part_specs(args):
+    if args.align_in_workers:
+        return list(compute_raw_parts(args))
+    else:
+        return [
+            (part_path, left, right, False, False)
+            for part_path, left, right in compute_parts(args)
+        ]
+
+
+def make_part_task_args(args, prefixer, part):
+    part_path, left, right, align_left, align_right = part
+    return (
+        args.input_path,
+        args.global_id_marker,
+        part_path,
+        left,
+        right,
+        prefixer,
+        args.parser,
+        args.write_buffer_size,
+        align_left,
+        align_right,
+        args.format,
+        args.block_index,
+        args.compress,
+        args.compress_level,
+        f'{part_path}_profile.folded' if args.profile else None,
+        args.cluster_same_as,
+        args.dictionary_encode,
+        args.predicate_statistics,
+    )
 
 
 class PropertyGraphSink:
 
-    def __init__(self, global_id_marker, part_name, prefixer=None):
+    def __init__(
+            self,
+            global_id_marker,
+            part_name,
+            prefixer=None,
+            buffer_size=io.DEFAULT_BUFFER_SIZE,
+            output_format=JSONL_FORMAT,
+            compression=NO_COMPRESSION,
+            compress_level=None,
+            same_as_links=False,
+            dictionary_encode=False,
+            predicate_statistics=False,
+    ):
         self.global_id_marker = global_id_marker
         self.part_name = part_name
         self.prefixer = prefixer
+        self.buffer_size = buffer_size
+        self.writer_type = WRITER_TYPES[output_format]
+        self.compression = compression
+        self.compress_level = compress_level
+        # owl:sameAs links between global IDs are written to a file of
+        # their own to be clustered, instead of as edges
+        self.same_as_links = same_as_links
+        # subjects get part-local integer IDs, listed in a file of their own
+        # so that they can be made global once all parts are done
+        self.dictionary_encode = dictionary_encode
+        # statistics of every predicate, saved to a file of their own to be
+        # merged with those of the other parts
+        self.statistics = StatisticsCollector(self.qname) if predicate_statistics else None
+        self.writer = None
+        self.link_file = self.subject_file = None
+        self.subject_count = 0
+        self.byte_counts = None
         self.predicate_count = Counter()
-        self.vertex_buffer = defaultdict(list)
+        self.vertex_count = 0
+        self.edge_count = 0
+        self.vertex_buffer = {}
+        # (outv, label, inv) tuples
         self.edge_buffer = []
-        self.last_subject = None
+        self.last_subject = self.last_qn_subj = None
 
     def __enter__(self):
         if glob.glob(f'{self.part_name}*'):
             print(f'WARN: files for {self.part_name} already '
                   f'exist and will be appended to', file=sys.stderr)
+
+        self.writer = self.writer_type.open(
+            self.part_name,
+            self.buffer_size,
+            self.compression,
+            self.compress_level,
+        )
+        if self.same_as_links:
+            self.link_file = open(
+                links_path(self.part_name), 'a', encoding='utf8', buffering=self.buffer_size
+            )
+        if self.dictionary_encode:
+            self.subject_file = open(
+                subjects_path(self.part_name), 'a', encoding='utf8', buffering=self.buffer_size
+            )
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if exc_type:
-            print(self.part_name, file=sys.stderr)
-            print(self.vertex_buffer, file=sys.stderr)
-            print(self.edge_buffer, file=sys.stderr)
-        else:
-            self.flush_buffers()
+        try:
+            if exc_type:
+                print(self.part_name, file=sys.stderr)
+                print(self.vertex_buffer, file=sys.stderr)
+                print(self.edge_buffer, file=sys.stderr)
+            else:
+                self.flush_buffers()
+                if self.statistics is not None:
+                    self.statistics.subject(None)
+                    self.statistics.save(statistics_path(self.part_name))
+        finally:
+            self.writer.close()
+            self.byte_counts = self.writer.byte_counts()
+            if self.link_file is not None:
+                self.link_file.close()
+            if self.subject_file is not None:
+                self.subject_file.close()
 
     def triple(self, subj, pred, obj):
         if self.global_id_marker not in subj:
             return
 
-        qn_subj, qn_pred, qn_obj = str(subj), str(pred), str(obj)
-        if self.prefixer:
-            qn_subj = self.prefixer.qname(subj)
-            qn_pred = self.prefixer.qname(pred)
-            qn_obj = self.prefixer.qname(obj)
-
-        self.predicate_count[qn_pred] += 1
         if subj != self.last_subject:
             self.flush_buffers()
             self.last_subject = subj
+            self.last_qn_subj = self.qname(subj)
+            if self.subject_file is not None:
+                self.subject_file.write(f'{self.last_qn_subj}\n')
+                self.last_qn_subj = self.subject_count
+                self.subject_count += 1
+            if self.statistics is not None:
+                self.statistics.subject(subj)
+        qn_subj, qn_pred = self.last_qn_subj, self.qname(pred)
+
+        self.predicate_count[qn_pred] += 1
+        if self.statistics is not None:
+            self.statistics.triple(qn_pred, obj, self.global_id_marker in obj)
+        vertex_buffer = self.vertex_buffer
 
         if self.global_id_marker in obj:
             if subj == obj and str(pred) == OWL_SAME_AS:
                 # ignore "dbg:A owl:sameAs dbg:A"
                 pass
+            elif self.link_file is not None and str(pred) == OWL_SAME_AS:
+                self.link_file.write(f'{qn_subj}\t{self.qname(obj)}\n')
             else:
                 # create an edge
-                self.edge_buffer.append({
-                    'outv': qn_subj,
-                    'label': qn_pred,
-                    'inv': qn_obj
-                })
+                self.edge_buffer.append((qn_subj, qn_pred, self.qname(obj)))
         else:
             # we'll add something to the vertex buffer
-            self.vertex_buffer['id'] = qn_subj
-            if isinstance(obj, Literal):
+            if not vertex_buffer:
+                vertex_buffer['id'] = qn_subj
+            if isinstance(obj, (Literal, ntriples.Literal)):
                 if obj.language:
                     # literals with language tag become vertex props
                     vertex_prop = self.make_vertex_prop(
@@ -153,51 +468,57 @@ class PropertyGraphSink:
                         obj.language
                     )
                     try:
-                        self.vertex_buffer[qn_pred].append(vertex_prop)
+                        vertex_buffer[qn_pred].append(vertex_prop)
+                    except KeyError:
+                        vertex_buffer[qn_pred] = [vertex_prop]
                     except AttributeError:
-                        self.vertex_buffer[qn_pred] = [
-                            self.make_vertex_prop(self.vertex_buffer[qn_pred]),
+                        vertex_buffer[qn_pred] = [
+                            self.make_vertex_prop(vertex_buffer[qn_pred]),
                             vertex_prop
                         ]
-                elif self.vertex_buffer[qn_pred]:
+                elif vertex_buffer.get(qn_pred):
                     # plain literal becomes vertex prop
-                    self.vertex_buffer[qn_pred].append(
-                        self.make_vertex_prop(self.vertex_buffer[qn_pred])
+                    vertex_buffer[qn_pred].append(
+                        self.make_vertex_prop(vertex_buffer[qn_pred])
                     )
                 else:
                     # plain or typed literal
                     if obj.datatype and 'dbpedia.org/datatype' in obj.datatype:
-                        self.vertex_buffer[qn_pred] = obj.n3()
+                        vertex_buffer[qn_pred] = obj.n3()
                     else:
-                        self.vertex_buffer[qn_pred] = obj.toPython()
+                        vertex_buffer[qn_pred] = python_value(obj)
 
             elif str(pred) in MULTIVALUED_URI_PROPS:
                 # append simple multivalued prop
-                self.vertex_buffer[qn_pred].append(qn_obj)
+                try:
+                    vertex_buffer[qn_pred].append(self.qname(obj))
+                except KeyError:
+                    vertex_buffer[qn_pred] = [self.qname(obj)]
             else:
                 # convert external URI to prop
-                self.vertex_buffer[qn_pred] = str(obj)
+                vertex_buffer[qn_pred] = str(obj)
+
+    def qname(self, term):
+        if self.prefixer:
+            return self.prefixer.qname(term)
+        return str(term)
 
     def flush_buffers(self):
         self.flush_vertex()
         self.flush_edges()
 
     def flush_vertex(self):
+        # writers serialize right away, so the buffers can be reused
         if self.vertex_buffer:
-            with open(f'{self.part_name}_vertices.jsonl', 'a', encoding='utf8') as out_file:
-                json.dump(self.vertex_buffer, out_file, default=str)
-                out_file.write('\n')
-
-        self.vertex_buffer = defaultdict(list)
+            self.writer.write_vertex(self.vertex_buffer)
+            self.vertex_count += 1
+            self.vertex_buffer.clear()
 
     def flush_edges(self):
         if self.edge_buffer:
-            with open(f'{self.part_name}_edges.jsonl', 'a', encoding='utf8') as out_file:
-                for edge in self.edge_buffer:
-                    json.dump(edge, out_file, default=str)
-                    out_file.write('\n')
-
-        self.edge_buffer = []
+            self.writer.write_edges(self.edge_buffer)
+            self.edge_count += len(self.edge_buffer)
+            self.edge_buffer.clear()
 
     @staticmethod
     def make_vertex_prop(value, language=None):
@@ -207,9 +528,22 @@ class PropertyGraphSink:
         }
 
 
+def python_value(literal):
+    # dates, decimals and the like become the strings the writers would
+    # make of them anyway, which saves them a fallback per value
+    value = literal.toPython()
+    if type(value) in NATIVE_TYPES:
+        return value
+    return str(value)
+
+
 class NamespacePrefixer(UserDict):
 
-    def __init__(self, mapping=None, **kwargs):
+    def __init__(self, mapping=None, cache_size=QNAME_CACHE_SIZE, **kwargs):
+        # longest namespace ending in '/', beyond which `split_uri` won't look
+        self.max_slash_namespace_length = 0
+        self.cache_size = cache_size
+        self.qname_cache = {}
         super().__init__(mapping, **kwargs)
         self.default_namespaces_url = 'http://dbpedia.org/sparql?nsdecl'
         self.default_namespaces_file = base_path('default-namespaces.json')
@@ -220,16 +554,43 @@ class NamespacePrefixer(UserDict):
         self['http://id.dbpedia.org/global/'] = 'dbg'
         self['http://www.wikidata.org/entity/'] = 'wde'
 
+    def __setitem__(self, namespace, prefix):
+        super().__setitem__(namespace, prefix)
+        if namespace.endswith('/'):
+            self.max_slash_namespace_length = max(
+                self.max_slash_namespace_length,
+                len(namespace)
+            )
+        self.qname_cache = {}
+
+    def __delitem__(self, namespace):
+        super().__delitem__(namespace)
+        self.max_slash_namespace_length = max(
+            (len(ns) for ns in self.data if ns.endswith('/')),
+            default=0
+        )
+        self.qname_cache = {}
+
     def qname(self, uri):
+        try:
+            return self.qname_cache[uri]
+        except KeyError:
+            pass
+
         try:
             namespace, local_name = self.split_uri(uri)
         except ValueError:
-            return uri
-
-        if namespace in self:
-            return f'{self[namespace]}:{local_name}'
+            qname = uri
         else:
-            return uri
+            if namespace in self.data:
+                qname = f'{self.data[namespace]}:{local_name}'
+            else:
+                qname = uri
+
+        if len(self.qname_cache) >= self.cache_size:
+            self.qname_cache.clear()
+        self.qname_cache[uri] = qname
+        return qname
 
     def split_uri(self, uri):
         if '#' in uri:
@@ -237,15 +598,17 @@ class NamespacePrefixer(UserDict):
             return f'{split_uri[0]}#', split_uri[1]
 
         elif '/' in uri:
-            split_uri = uri.split('/')
-            local_parts = []
-            while split_uri:
-                *split_uri, local_part = split_uri
-                local_parts.append(local_part)
-                namespace = '/'.join(split_uri) + '/'
-                if namespace in self:
-                    local_name = '/'.join(reversed(local_parts))
-                    return namespace, local_name
+            # try the namespaces that end at each '/', longest first
+            cursor = uri.rfind('/', 0, self.max_slash_namespace_length)
+            while cursor >= 0:
+                namespace = uri[:cursor + 1]
+                if namespace in self.data:
+                    return namespace, uri[cursor + 1:]
+                cursor = uri.rfind('/', 0, cursor)
+
+            if '/' in self.data:
+                # a lone '/' namespace is also tried when nothing else matches
+                return '/', uri
 
         raise ValueError(f"Can't split '{uri}'")
 
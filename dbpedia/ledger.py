@@ -0,0 +1,178 @@
+import glob
+import json
+import os
+
+PENDING_STATUS, DONE_STATUS = 'pending', 'done'
+
+# the arguments that determine where parts start and end
+PARTITIONING_ARGS = [
+    'target_size',
+    'global_id_marker',
+    'id_marker_prefix',
+    'search_type',
+    'bin_search_limit',
+    'jump_size',
+    'backpedal_size',
+    'align_in_workers',
+]
+# the arguments that determine what the output of parts looks like
+OUTPUT_ARGS = [
+    'shorten_uris',
+    'parser',
+    'format',
+    'compress',
+    'compress_level',
+    'cluster_same_as',
+    'dictionary_encode',
+    'predicate_statistics',
+]
+
+
+class ResumeError(Exception):
+    pass
+
+
+class PartLedger:
+    """Keeps track of the parts of a run, so that it can be resumed"""
+
+    def __init__(self, path, fingerprint, parts):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.parts = parts
+
+    @classmethod
+    def create(cls, args, parts):
+        ledger = cls(args.ledger_file, input_fingerprint(args), [
+            {
+                'name': part_name,
+                'left': left,
+                'right': right,
+                'align_left': align_left,
+                'align_right': align_right,
+                'status': PENDING_STATUS,
+            }
+            for part_name, left, right, align_left, align_right in parts
+        ])
+        ledger.save()
+        return ledger
+
+    @classmethod
+    def resume(cls, args):
+        with open(args.ledger_file) as ledger_file:
+            ledger_data = json.load(ledger_file)
+
+        fingerprint = input_fingerprint(args)
+        if ledger_data['fingerprint'] != fingerprint:
+            raise ResumeError(
+                f'{args.ledger_file} was written for another input file or '
+                f'other partitioning or output arguments:\n'
+                f'{ledger_data["fingerprint"]}\n'
+                f'Start over in a new output directory instead.'
+            )
+
+        ledger = cls(args.ledger_file, fingerprint, ledger_data['parts'])
+        ledger.remove_partial_output()
+        return ledger
+
+    def save(self):
+        # replace the ledger at once, so a crash never leaves half of it
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as ledger_file:
+            json.dump({
+                'fingerprint': self.fingerprint,
+                'parts': self.parts,
+            }, ledger_file, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def unfinished_parts(self):
+        return [
+            (
+                part['name'],
+                part['left'],
+                part['right'],
+                part['align_left'],
+                part['align_right'],
+            )
+            for part in self.parts
+            if part['status'] != DONE_STATUS
+        ]
+
+    def remove_partial_output(self):
+        for part_name, *_ in self.unfinished_parts():
+            remove_part_output(part_name)
+
+    def split_part(self, part_name, halves):
+        # the halves take the place of the part, so parts stay in input order
+        index = next(i for i, part in enumerate(self.parts) if part['name'] == part_name)
+        self.parts[index:index + 1] = [
+            {
+                'name': half_name,
+                'left': left,
+                'right': right,
+                'align_left': align_left,
+                'align_right': align_right,
+                'status': PENDING_STATUS,
+            }
+            for half_name, left, right, align_left, align_right in halves
+        ]
+        self.save()
+
+    def mark_done(self, part_name, left, right, predicate_count, byte_counts, metrics):
+        for part in self.parts:
+            if part['name'] == part_name:
+                part['status'] = DONE_STATUS
+                part['output_range'] = [left, right]
+                part['predicate_count'] = predicate_count
+                part['byte_counts'] = byte_counts
+                part['metrics'] = metrics
+        self.save()
+
+    def output_ranges(self):
+        return [
+            [part['name'], *part['output_range']]
+            for part in self.parts
+            if part['status'] == DONE_STATUS
+        ]
+
+    def predicate_counts(self):
+        return {
+            part['name']: part['predicate_count']
+            for part in self.parts
+            if part['status'] == DONE_STATUS
+        }
+
+    def byte_counts(self):
+        return {
+            part['name']: part['byte_counts']
+            for part in self.parts
+            if part['status'] == DONE_STATUS
+        }
+
+    def part_metrics(self):
+        return {
+            part['name']: part['metrics']
+            for part in self.parts
+            if part['status'] == DONE_STATUS
+        }
+
+
+def remove_part_output(part_name):
+    for path in glob.glob(f'{part_name}_*'):
+        print(f'removing partial output {path}')
+        os.remove(path)
+
+
+def input_fingerprint(args):
+    input_stat = os.stat(args.input_path)
+    fingerprint = {
+        'input_path': args.input_path,
+        'size': input_stat.st_size,
+        'mtime': input_stat.st_mtime,
+    }
+    for arg_name in PARTITIONING_ARGS + OUTPUT_ARGS:
+        value = getattr(args, arg_name)
+        if isinstance(value, bytes):
+            value = value.decode('ascii')
+        fingerprint[arg_name] = value
+
+    return fingerprint
@@ -0,0 +1,227 @@
+import collections
+import contextlib
+import os
+import signal
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+READ_STAGE, PARSE_STAGE, TRANSFORM_STAGE, SERIALIZE_STAGE = (
+    'read', 'parse', 'transform', 'serialize'
+)
+STAGES = [READ_STAGE, PARSE_STAGE, TRANSFORM_STAGE, SERIALIZE_STAGE]
+SAMPLED_STAGES = [PARSE_STAGE, TRANSFORM_STAGE, SERIALIZE_STAGE]
+UNSPLIT_STAGE = 'parse_transform_serialize'
+SAMPLE_INTERVAL = 0.005  # seconds of CPU time
+
+
+class PartMetrics:
+    """Wall and CPU time per stage of a part, and what went in and out
+
+    Reading and the serialization that is left when a part ends are timed
+    as stages that take turns. Parsing, transforming and serializing take
+    turns for every triple, which is too often to read the clocks, so their
+    time is only reported together, unless it is split by sampling which
+    stage is running: see `StageSampler`.
+    """
+
+    def __init__(self):
+        self.wall_times = dict.fromkeys(STAGES, 0.0)
+        self.cpu_times = dict.fromkeys(STAGES, 0.0)
+        self.samples = dict.fromkeys(STAGES, 0)
+        self.stage = READ_STAGE
+        self.wall_mark = self.start_wall = time.perf_counter()
+        self.cpu_mark = self.start_cpu = time.process_time()
+        self.wall_time = self.cpu_time = None
+        self.split = False
+
+    def switch(self, stage):
+        wall_now, cpu_now = time.perf_counter(), time.process_time()
+        self.wall_times[self.stage] += wall_now - self.wall_mark
+        self.cpu_times[self.stage] += cpu_now - self.cpu_mark
+        self.wall_mark, self.cpu_mark = wall_now, cpu_now
+        self.stage = stage
+
+    def stop(self):
+        self.switch(None)
+        self.wall_time = time.perf_counter() - self.start_wall
+        self.cpu_time = time.process_time() - self.start_cpu
+
+        # without samples, e.g. without --profile or for tiny parts, the
+        # stages are not split
+        sample_count = sum(self.samples[stage] for stage in SAMPLED_STAGES)
+        self.split = sample_count > 0
+        if self.split:
+            parse_wall, parse_cpu = self.wall_times[PARSE_STAGE], self.cpu_times[PARSE_STAGE]
+            self.wall_times[PARSE_STAGE] = self.cpu_times[PARSE_STAGE] = 0.0
+            for stage in SAMPLED_STAGES:
+                share = self.samples[stage] / sample_count
+                self.wall_times[stage] += parse_wall * share
+                self.cpu_times[stage] += parse_cpu * share
+
+    def stage_times(self):
+        def times(stage, split=True):
+            return {
+                'wall_time': self.wall_times[stage] if split else None,
+                'cpu_time': self.cpu_times[stage] if split else None,
+            }
+
+        stage_times = {READ_STAGE: times(READ_STAGE)}
+        for stage in SAMPLED_STAGES:
+            stage_times[stage] = times(stage, self.split)
+        stage_times[UNSPLIT_STAGE] = {
+            'wall_time': sum(self.wall_times[stage] for stage in SAMPLED_STAGES),
+            'cpu_time': sum(self.cpu_times[stage] for stage in SAMPLED_STAGES),
+        }
+        return stage_times
+
+    def report(self, bytes_in, byte_counts, triple_count, vertex_count, edge_count):
+        return {
+            'wall_time': self.wall_time,
+            'cpu_time': self.cpu_time,
+            'stages': self.stage_times(),
+            'bytes_in': bytes_in,
+            'bytes_out': sum(counts['compressed'] for counts in byte_counts.values()),
+            'triples': triple_count,
+            'triples_per_second': triple_count / self.wall_time if self.wall_time else None,
+            'vertices': vertex_count,
+            'edges': edge_count,
+            'peak_rss': peak_rss(),
+        }
+
+
+class StageSampler:
+    """A sampling profiler that tells which stage the parser is in
+
+    Every `interval` seconds of CPU time, the Python stack is inspected: the
+    innermost of the `stage_functions` on it is the stage, and the parse
+    stage when there is none. With `record_stacks`, the stacks are counted
+    as well and saved as "folded" stacks, one `outer;inner;... count` line
+    per stack, which flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self, metrics, stage_functions, record_stacks=False, interval=SAMPLE_INTERVAL):
+        self.metrics = metrics
+        self.stage_codes = {
+            function.__code__: stage
+            for stage, function in stage_functions.items()
+        }
+        self.stacks = collections.Counter() if record_stacks else None
+        self.interval = interval
+
+    def start(self):
+        signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    def sample(self, signum, frame):
+        stage = None
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            if stage is None:
+                stage = self.stage_codes.get(code)
+            if self.stacks is not None:
+                names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}'
+                             f':{code.co_firstlineno})')
+            elif stage is not None:
+                break
+            frame = frame.f_back
+
+        if self.metrics.stage == PARSE_STAGE:
+            self.metrics.samples[stage or PARSE_STAGE] += 1
+        if self.stacks is not None:
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def save(self, path):
+        with open(path, 'w') as profile_file:
+            for stack, count in self.stacks.most_common():
+                profile_file.write(f'{stack} {count}\n')
+
+
+@contextlib.contextmanager
+def sampled(metrics, stage_functions, profile_path=None):
+    # only when profiling: the timer signal interrupts the parser hundreds
+    # of times a second
+    if profile_path is None:
+        yield
+        return
+
+    # sampling needs a timer signal, which only the main thread can handle
+    sampler = StageSampler(metrics, stage_functions, record_stacks=True)
+    try:
+        sampler.start()
+    except (AttributeError, ValueError):
+        print(f'WARN: {profile_path} is not written, profiling needs '
+              f'signal.setitimer in the main thread', file=sys.stderr)
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        sampler.stop()
+        sampler.save(profile_path)
+
+
+@contextlib.contextmanager
+def timed_phase(phases, name):
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    yield
+    phases[name] = {
+        'wall_time': time.perf_counter() - start_wall,
+        'cpu_time': time.process_time() - start_cpu,
+    }
+
+
+def peak_rss():
+    # in bytes; the peak of the process, which is a worker of its own per
+    # part when parts are transformed in parallel
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def summarize_parts(part_metrics):
+    summary = {
+        'parts': len(part_metrics),
+        'wall_time': 0.0,
+        'cpu_time': 0.0,
+        'stages': {
+            stage: {'wall_time': 0.0, 'cpu_time': 0.0}
+            for stage in STAGES + [UNSPLIT_STAGE]
+        },
+        'bytes_in': 0,
+        'bytes_out': 0,
+        'triples': 0,
+        'vertices': 0,
+        'edges': 0,
+        'peak_rss': None,
+    }
+    for metrics in part_metrics.values():
+        for key in ('wall_time', 'cpu_time', 'bytes_in', 'bytes_out',
+                    'triples', 'vertices', 'edges'):
+            summary[key] += metrics[key]
+        for stage, times in metrics['stages'].items():
+            for key, seconds in times.items():
+                # a stage that is not split in every part has no sum
+                total = summary['stages'][stage][key]
+                summary['stages'][stage][key] = (
+                    None if total is None or seconds is None else total + seconds
+                )
+        if metrics['peak_rss'] is not None:
+            summary['peak_rss'] = max(summary['peak_rss'] or 0, metrics['peak_rss'])
+
+    # per second of part wall time: the throughput of a single worker
+    summary['triples_per_second'] = (
+        summary['triples'] / summary['wall_time'] if summary['wall_time'] else None
+    )
+    return summary
@@ -0,0 +1,215 @@
+import re
+import sys
+
+from rdflib import Literal as RdflibLiteral
+from rdflib.compat import decodeUnicodeEscape
+from rdflib.plugins.parsers.ntriples import NTriplesParser
+from rdflib.term import XSDToPython
+
+FAST_PARSER_TYPE, RDFLIB_PARSER_TYPE = 'fast', 'rdflib'
+PARSER_TYPE_CHOICES = [FAST_PARSER_TYPE, RDFLIB_PARSER_TYPE]
+READ_SIZE = 2 ** 22  # bytes
+TERM_CACHE_SIZE = 2 ** 16  # terms
+
+# the same grammar as rdflib's NTriplesParser, compiled into a single pattern
+# that matches the `<s> <p> <o> .` and `<s> <p> "literal" .` lines Databus
+# dumps consist of; blank nodes, comments and malformed lines don't match
+_uriref = rb'<([^:]+:[^\s"<>]*)>'
+_literal = rb'"([^"\\]*(?:\\.[^"\\]*)*)"'
+_litinfo = rb'(?:@([a-zA-Z]+(?:-[a-zA-Z0-9]+)*)|\^\^' + _uriref + rb')?'
+r_triple = re.compile(
+    rb'[ \t]*' + _uriref +
+    rb'[ \t]+' + _uriref +
+    rb'[ \t]+(?:' + _uriref + rb'|' + _literal + _litinfo + rb')'
+    rb'[ \t]*\.[ \t]*(?:#.*)?$'
+)
+
+# rdflib's lexical-to-python conversions, keyed by plain strings
+TO_PYTHON = {
+    str(datatype) if datatype else None: conversion
+    for datatype, conversion in XSDToPython.items()
+}
+N3_ESCAPED_CHARS = ('\n', '\r', '\\', '"')
+# markup literals are re-serialized by rdflib, which changes their text
+MARKUP_DATATYPES = {
+    'http://www.w3.org/1999/02/22-rdf-syntax-ns#XMLLiteral',
+    'http://www.w3.org/1999/02/22-rdf-syntax-ns#HTML',
+}
+
+
+class NTriplesTokenizer:
+
+    def __init__(self, sink, subject_marker=None):
+        self.sink = sink
+        self.fallback_parser = NTriplesParser(sink=sink)
+        # lines whose subject lacks this marker are skipped unparsed
+        self.subject_marker = subject_marker
+        # predicates, datatypes and language tags repeat all the time, so
+        # they are decoded once and the sink gets the same string every time
+        self.terms = {}
+        self.last_subject_bytes = self.last_subject = None
+
+    def parse(self, lines):
+        for line in lines:
+            self.parse_range(line, 0, len(line))
+        return self.sink
+
+    def parse_range(self, buffer, left, right):
+        # `buffer` can be anything bytes-like, e.g. an mmap of the input file:
+        # lines are matched in place and only the matched terms are copied
+        marker = self.subject_marker
+        cursor = left
+        while cursor < right:
+            line_end = buffer.find(b'\n', cursor, right)
+            if line_end == -1:
+                line_end = right
+            if marker is None or has_subject_marker(buffer, cursor, line_end, marker):
+                self.parseline(buffer, cursor, line_end)
+                cursor = line_end + 1
+                continue
+
+            # skip to the next line that mentions the marker at all
+            marker_pos = buffer.find(marker, line_end, right)
+            if marker_pos == -1:
+                break
+            cursor = buffer.rfind(b'\n', line_end, marker_pos) + 1
+        return self.sink
+
+    def parse_file(self, in_file, left, right, read_size=READ_SIZE):
+        for chunk in iter_line_chunks(in_file, left, right, read_size):
+            self.parse_range(chunk, 0, len(chunk))
+        return self.sink
+
+    def parseline(self, buffer, start, end):
+        match = r_triple.match(buffer, start, end)
+        if match is None or buffer.find(b'\r', start, end) != -1:
+            # let rdflib deal with anything out of the ordinary
+            line = buffer[start:end]
+            if line.strip():
+                self.fallback_parser.parsestring(line.decode('utf8'))
+            return
+
+        subj, pred, uri_obj, lexical, language, datatype = match.groups()
+        terms = self.terms
+        if uri_obj is not None:
+            obj = unquote(uri_obj)
+        else:
+            language = language and (terms.get(language) or self.intern(language))
+            datatype = datatype and (terms.get(datatype) or self.intern(datatype))
+            literal_type = RdflibLiteral if datatype in MARKUP_DATATYPES else Literal
+            obj = literal_type(unquote(lexical), language, datatype)
+
+        # the lines of a subject follow each other
+        if subj != self.last_subject_bytes:
+            self.last_subject_bytes = subj
+            self.last_subject = unquote(subj)
+
+        self.sink.triple(self.last_subject, terms.get(pred) or self.intern(pred), obj)
+
+    def intern(self, term_bytes):
+        if len(self.terms) >= TERM_CACHE_SIZE:
+            self.terms.clear()
+        term = self.terms[term_bytes] = sys.intern(unquote(term_bytes))
+        return term
+
+
+class Literal(str):
+    """Stand-in for `rdflib.Literal` that only converts its value on demand"""
+
+    def __new__(cls, lexical, language=None, datatype=None):
+        inst = str.__new__(cls, lexical)
+        inst.language = language
+        inst.datatype = datatype
+        return inst
+
+    def __eq__(self, other):
+        # like rdflib: a literal never equals a URI with the same text
+        return (
+            isinstance(other, Literal)
+            and str.__eq__(self, other)
+            and self.language == other.language
+            and self.datatype == other.datatype
+        )
+
+    __hash__ = str.__hash__
+
+    def toPython(self):
+        conversion = TO_PYTHON.get(self.datatype, False)
+        if conversion:
+            try:
+                value = conversion(str(self))
+            except Exception:
+                # not a valid lexical representation for this datatype
+                value = None
+        elif conversion is None:
+            value = str(self)
+        else:
+            value = None
+
+        return self if value is None else value
+
+    def n3(self):
+        if (self.datatype in TO_PYTHON
+                or any(char in self for char in N3_ESCAPED_CHARS)):
+            return RdflibLiteral(str(self), self.language, self.datatype).n3()
+        elif self.language:
+            return f'"{self}"@{self.language}'
+        elif self.datatype:
+            return f'"{self}"^^<{self.datatype}>'
+        else:
+            return f'"{self}"'
+
+
+def iter_line_chunks(in_file, left, right, read_size=READ_SIZE):
+    # whole lines of the range, read `read_size` bytes at a time: lines
+    # that straddle two reads are completed by the next read
+    in_file.seek(left)
+    remaining = right - left
+    carry = b''
+    while remaining > 0:
+        chunk = in_file.read(min(read_size, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        chunk = carry + chunk
+        chunk_end = chunk.rfind(b'\n') + 1 if remaining > 0 else len(chunk)
+        if chunk_end:
+            yield chunk[:chunk_end]
+        carry = chunk[chunk_end:]
+    if carry:
+        yield carry
+
+
+def iter_line_ranges(buffer, left, right, read_size=READ_SIZE):
+    # the same, for a `buffer` that holds the whole input, e.g. an mmap: the
+    # (start, end) of whole lines of the range, about `read_size` bytes each
+    right = min(right, len(buffer))
+    while left < right:
+        end = min(left + read_size, right)
+        if end < right:
+            end = buffer.rfind(b'\n', left, end) + 1 or buffer.find(b'\n', end, right) + 1
+        end = end or right
+        yield left, end
+        left = end
+
+
+def has_subject_marker(buffer, start, end, marker):
+    # the subject ends at the first '>', which IRIs can't contain
+    subject_end = buffer.find(b'>', start, end)
+    return subject_end != -1 and buffer.find(marker, start, subject_end) != -1
+
+
+def select_subject_lines(chunk, marker):
+    # the lines of `chunk` whose subject has the marker
+    return b''.join(
+        line
+        for line in chunk.splitlines(keepends=True)
+        if has_subject_marker(line, 0, len(line), marker)
+    )
+
+
+def unquote(term_bytes):
+    term = term_bytes.decode('utf8')
+    if '\\' in term:
+        term = decodeUnicodeEscape(term)
+    return term
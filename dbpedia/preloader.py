@@ -3,9 +3,21 @@ import os
 import sys
 import time
 
+from dbpedia.compressed_input import default_block_index_path
 from dbpedia.compute_parts import SEARCH_TYPE_CHOICES, BINARY_SEARCH_TYPE
 from dbpedia.graph_elements import make_graph_elements
+from dbpedia.ledger import ResumeError
+from dbpedia.ntriples import PARSER_TYPE_CHOICES, FAST_PARSER_TYPE
+from dbpedia.progress import AUTO_PROGRESS, PROGRESS_CHOICES
+from dbpedia.scheduler import PartFailedError
+from dbpedia.subject_index import default_index_path
 from dbpedia.utils import base_path
+from dbpedia.writers import (
+    COMPRESSION_CHOICES,
+    FORMAT_CHOICES,
+    JSONL_FORMAT,
+    NO_COMPRESSION,
+)
 
 arg_parser = argparse.ArgumentParser(
     description='Transform sorted Databus NTriples into property graph-friendly JSON.',
@@ -22,6 +34,24 @@ def parse_arguments(arg_list, parser=arg_parser, **kwargs):
     args.parts_file = getattr(
         args, 'parts_file', os.path.join(args.output_dir, 'parts.tsv')
     )
+    args.subject_index = getattr(
+        args, 'subject_index', default_index_path(args.input_path)
+    )
+    args.block_index = getattr(
+        args, 'block_index', default_block_index_path(args.input_path)
+    )
+    args.ledger_file = getattr(
+        args, 'ledger_file', os.path.join(args.output_dir, 'parts-ledger.json')
+    )
+    args.same_as_mapping = getattr(
+        args, 'same_as_mapping', os.path.join(args.output_dir, 'same-as-mapping.tsv')
+    )
+    args.dictionary_file = getattr(
+        args, 'dictionary_file', os.path.join(args.output_dir, 'dictionary.tsv')
+    )
+    if args.dictionary_encode and args.cluster_same_as:
+        parser.error('--dictionary-encode can not be combined with --cluster-same-as')
+    args.compress_level = getattr(args, 'compress_level', None)
     args.backpedal_size = getattr(args, 'backpedal_size', args.jump_size // 10)
     return args
 
@@ -52,19 +82,65 @@ arg_parser.add_argument(
 arg_parser.add_argument(
     '--parallel',
     action='store_true',
-    help='transform parts in parallel using a multiprocessing pool'
+    help='transform parts in parallel worker processes'
+)
+arg_parser.add_argument(
+    '--workers',
+    type=int,
+    default=os.environ.get('WORKERS', os.cpu_count()),
+    help='the number of parts that are transformed at the same time '
+         '(applies only to parallel execution)'
+)
+arg_parser.add_argument(
+    '--align-in-workers',
+    action='store_true',
+    help='let each worker align its part to subject transitions, instead '
+         'of computing all part boundaries before any part is transformed'
 )
 arg_parser.add_argument(
     '--shorten-uris',
     action='store_true',
     help='shorten URIs by replacing known namespaces with their corresponding prefix'
 )
+arg_parser.add_argument(
+    '--parser',
+    choices=PARSER_TYPE_CHOICES,
+    default=os.environ.get('PARSER', FAST_PARSER_TYPE),
+    help='the NTriples parser to use: the built-in byte-level tokenizer '
+         'or the (slower) rdflib parser'
+)
 arg_parser.add_argument(
     '--target-size',
     type=cast_int,
-    default=os.environ.get('TARGET_SIZE', '500e6'),  # bytes
+    default=os.environ.get('TARGET_SIZE', '100e6'),  # bytes
     help='the approximate size of parts in bytes'
 )
+arg_parser.add_argument(
+    '--format',
+    choices=FORMAT_CHOICES,
+    default=os.environ.get('FORMAT', JSONL_FORMAT),
+    help='the output format: JSON Lines, CSV with the fixed headers '
+         'id,property,value,language (a row per vertex property value) and '
+         'outv,label,inv, or length-prefixed MessagePack records'
+)
+arg_parser.add_argument(
+    '--compress',
+    choices=COMPRESSION_CHOICES,
+    default=os.environ.get('COMPRESS', NO_COMPRESSION),
+    help='compress the output files of each part while they are written'
+)
+arg_parser.add_argument(
+    '--compress-level',
+    type=int,
+    default=os.environ.get('COMPRESS_LEVEL', argparse.SUPPRESS),
+    help='the compression level (default: 6 for gzip, 3 for zstd)'
+)
+arg_parser.add_argument(
+    '--write-buffer-size',
+    type=cast_int,
+    default=os.environ.get('WRITE_BUFFER_SIZE', '1e6'),  # bytes
+    help='the size of the write buffer of each output file in bytes'
+)
 arg_parser.add_argument(
     '--global-id-marker',
     default=os.environ.get('GLOBAL_ID_MARKER', 'id.dbpedia.org/global/'),
@@ -83,6 +159,32 @@ arg_parser.add_argument(
          'corresponding input file positions (left and right) '
          '(default: <output_dir>/parts.tsv)'
 )
+arg_parser.add_argument(
+    '--subject-index',
+    default=os.environ.get('SUBJECT_INDEX', argparse.SUPPRESS),
+    help='the subject index of the input file (see `dbpedia.subjects index`); '
+         'when it exists, parts are computed from it instead of by searching '
+         'the input file (default: <input_path>.idx)'
+)
+arg_parser.add_argument(
+    '--block-index',
+    default=os.environ.get('BLOCK_INDEX', argparse.SUPPRESS),
+    help='the block index of bzip2, gzip or zstd compressed input, which is '
+         'built when it does not exist yet (default: <input_path>.blocks)'
+)
+arg_parser.add_argument(
+    '--ledger-file',
+    default=os.environ.get('LEDGER_FILE', argparse.SUPPRESS),
+    help='the file in which the status of each part is kept, so that an '
+         'interrupted run can be resumed (default: <output_dir>/parts-ledger.json)'
+)
+arg_parser.add_argument(
+    '--resume',
+    action='store_true',
+    help='only transform the parts that did not finish in a previous run '
+         'into the same output directory, with the same input, partitioning '
+         'and output arguments'
+)
 arg_parser.add_argument(
     '--task-timeout',
     type=int,
@@ -90,11 +192,70 @@ arg_parser.add_argument(
     help='the number of seconds a "transform part" task is allowed to run '
          '(applies only to parallel execution)'
 )
+arg_parser.add_argument(
+    '--max-retries',
+    type=int,
+    default=os.environ.get('MAX_RETRIES', 2),
+    help='the number of times a part that fails or times out is retried; '
+         'a part that times out twice is split in two instead'
+)
+arg_parser.add_argument(
+    '--progress',
+    choices=PROGRESS_CHOICES,
+    default=os.environ.get('PROGRESS', AUTO_PROGRESS),
+    help='how to show the progress of all parts: a bar, a log line every '
+         '`progress_interval` seconds, off, or auto (a bar if stderr is a '
+         'terminal, log lines otherwise)'
+)
+arg_parser.add_argument(
+    '--progress-interval',
+    type=float,
+    default=os.environ.get('PROGRESS_INTERVAL', 30),
+    help='the number of seconds between progress log lines'
+)
+arg_parser.add_argument(
+    '--profile',
+    action='store_true',
+    help='sample the stacks of every part into <part>_profile.folded, and '
+         'split the time of each triple into parsing, transforming and '
+         'serializing by them'
+)
+arg_parser.add_argument(
+    '--cluster-same-as',
+    action='store_true',
+    help='replace global IDs that are linked by owl:sameAs with the smallest '
+         'ID of their cluster, instead of writing the links as edges'
+)
+arg_parser.add_argument(
+    '--same-as-mapping',
+    default=os.environ.get('SAME_AS_MAPPING', argparse.SUPPRESS),
+    help='the TSV file in which every replaced ID is listed with its '
+         'canonical ID (default: <output_dir>/same-as-mapping.tsv)'
+)
+arg_parser.add_argument(
+    '--dictionary-encode',
+    action='store_true',
+    help='replace the IDs of vertices and edges with dense integers, which '
+         'are listed with their URIs in `dictionary_file`'
+)
+arg_parser.add_argument(
+    '--dictionary-file',
+    default=os.environ.get('DICTIONARY_FILE', argparse.SUPPRESS),
+    help='the TSV file in which every integer ID is listed with its URI '
+         '(default: <output_dir>/dictionary.tsv)'
+)
+arg_parser.add_argument(
+    '--predicate-statistics',
+    action='store_true',
+    help='gather statistics of the objects and subjects of every predicate, '
+         'which are saved to <output_dir>/predicate-statistics.json'
+)
 arg_parser.add_argument(
     '--search-type',
     choices=SEARCH_TYPE_CHOICES,
     default=os.environ.get('SEARCH_TYPE', BINARY_SEARCH_TYPE),
-    help='the type of search to use to skip to the first `global_id_marker` triple'
+    help='the type of search to use to skip to the first `global_id_marker` triple, '
+         'and to the first triple after them'
 )
 arg_parser.add_argument(
     '--bin-search-limit',
@@ -127,3 +288,6 @@ if __name__ == "__main__":
         print(err, file=sys.stderr)
         arg_parser.print_help(sys.stderr)
         exit(1)
+    except (ResumeError, PartFailedError) as err:
+        print(err, file=sys.stderr)
+        exit(1)
@@ -0,0 +1,102 @@
+import sys
+import time
+
+import tqdm
+
+AUTO_PROGRESS, BAR_PROGRESS, LOG_PROGRESS, NO_PROGRESS = 'auto', 'bar', 'log', 'off'
+PROGRESS_CHOICES = [AUTO_PROGRESS, BAR_PROGRESS, LOG_PROGRESS, NO_PROGRESS]
+
+
+class ProgressReporter:
+    """Adds up the bytes and triples of all parts as they are transformed
+
+    Parts report how far they are, so a part that is retried or split
+    starts over from zero. Progress is shown as a bar on a terminal and as
+    a log line every `log_interval` seconds otherwise.
+    """
+
+    def __init__(self, total_bytes, mode=AUTO_PROGRESS, log_interval=30, file=None):
+        file = file or sys.stderr
+        if mode == AUTO_PROGRESS:
+            mode = BAR_PROGRESS if file.isatty() else LOG_PROGRESS
+        self.mode = mode
+        self.total_bytes = total_bytes
+        self.log_interval = log_interval
+        self.file = file
+        # part name: (bytes read, triples)
+        self.part_progress = {}
+        self.bytes_read = 0
+        self.triples = 0
+        self.start_time = self.last_log_time = time.monotonic()
+
+        self.bar = None
+        if mode == BAR_PROGRESS:
+            self.bar = tqdm.tqdm(
+                total=total_bytes,
+                unit='B',
+                unit_scale=True,
+                file=file,
+                dynamic_ncols=True,
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def update(self, part_name, bytes_read, triples):
+        last_bytes, last_triples = self.part_progress.get(part_name, (0, 0))
+        self.part_progress[part_name] = bytes_read, triples
+        self.add(bytes_read - last_bytes, triples - last_triples)
+
+    def reset(self, part_name):
+        last_bytes, last_triples = self.part_progress.pop(part_name, (0, 0))
+        self.add(-last_bytes, -last_triples)
+
+    def add(self, bytes_read, triples):
+        self.bytes_read += bytes_read
+        self.triples += triples
+        if self.bar is not None:
+            self.bar.update(bytes_read)
+            self.bar.set_postfix_str(f'{self.triples_per_second():,.0f} triples/s', refresh=False)
+        elif self.mode == LOG_PROGRESS:
+            now = time.monotonic()
+            if now - self.last_log_time >= self.log_interval:
+                self.last_log_time = now
+                self.log()
+
+    def triples_per_second(self):
+        elapsed = time.monotonic() - self.start_time
+        return self.triples / elapsed if elapsed > 0 else 0
+
+    def eta(self):
+        # seconds, at the average rate so far
+        elapsed = time.monotonic() - self.start_time
+        if self.bytes_read <= 0 or elapsed <= 0:
+            return None
+        return max(self.total_bytes - self.bytes_read, 0) * elapsed / self.bytes_read
+
+    def log(self):
+        share = self.bytes_read / self.total_bytes if self.total_bytes else 1
+        eta = self.eta()
+        print(
+            f'progress: {share:.1%} ({self.bytes_read} of {self.total_bytes} bytes), '
+            f'{self.triples} triples, {self.triples_per_second():.0f} triples/s, '
+            f'ETA {format_seconds(eta) if eta is not None else "unknown"}',
+            file=self.file,
+            flush=True,
+        )
+
+    def close(self):
+        if self.bar is not None:
+            self.bar.close()
+            self.bar = None
+        elif self.mode == LOG_PROGRESS:
+            self.log()
+
+
+def format_seconds(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02}:{seconds:02}'
@@ -0,0 +1,306 @@
+import csv
+import functools
+import itertools
+import json
+import operator
+import os
+import sqlite3
+
+from dbpedia.writers import (
+    JSONL_FORMAT,
+    NO_COMPRESSION,
+    REWRITE_BUFFER_SIZE,
+    WRITER_TYPES,
+    encode_json,
+    rewrite_ids,
+)
+
+LINKS_SUFFIX = 'same_as.tsv'
+UNION_FIND_CACHE_SIZE = 2 ** 19  # nodes
+STORED_FILTER_SIZE = 2 ** 29  # bits
+LOOKUP_CACHE_SIZE = 2 ** 16  # IDs
+
+
+class DiskUnionFind:
+    """Union-find of string IDs, kept in an SQLite file instead of memory
+
+    Only the parents of nodes that aren't roots are stored; the parents of
+    recently used nodes are cached, up to `cache_size` of them, and written
+    out when the cache is full. Most nodes are never stored, so a Bloom
+    filter of the stored ones saves looking those up. The root of every
+    cluster is its smallest ID, so it doesn't depend on the order of the
+    links.
+    """
+
+    def __init__(self, path, cache_size=UNION_FIND_CACHE_SIZE, filter_size=STORED_FILTER_SIZE):
+        self.connection = sqlite3.connect(path)
+        # a scratch file, which is rebuilt rather than recovered after a crash
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS parents '
+            '(node TEXT PRIMARY KEY, parent TEXT NOT NULL) WITHOUT ROWID'
+        )
+        self.cursor = self.connection.cursor()
+        self.cache = {}
+        self.cache_size = cache_size
+        self.stored_filter = bytearray(filter_size // 8)
+        self.filter_mask = filter_size - 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def parent(self, node):
+        try:
+            return self.cache[node]
+        except KeyError:
+            pass
+        parent = node
+        if self.may_be_stored(node):
+            row = self.cursor.execute(
+                'SELECT parent FROM parents WHERE node = ?', (node,)
+            ).fetchone()
+            if row:
+                parent = row[0]
+        self.set_parent(node, parent)
+        return parent
+
+    def set_parent(self, node, parent):
+        # nodes only ever get a parent with a smaller ID, so cached entries
+        # of roots never go stale
+        self.cache[node] = parent
+        if len(self.cache) >= self.cache_size:
+            self.flush()
+
+    def flush(self):
+        # sorted, which inserts into the table's B-tree a lot quicker
+        stored = sorted(
+            (node, parent) for node, parent in self.cache.items() if node != parent
+        )
+        self.connection.executemany('INSERT OR REPLACE INTO parents VALUES (?, ?)', stored)
+        self.connection.commit()
+        for node, _ in stored:
+            self.add_to_filter(node)
+        self.cache.clear()
+
+    def filter_bits(self, node):
+        # two bits per node, from the two halves of its hash
+        node_hash = hash(node)
+        return node_hash & self.filter_mask, (node_hash >> 32) & self.filter_mask
+
+    def add_to_filter(self, node):
+        for bit in self.filter_bits(node):
+            self.stored_filter[bit >> 3] |= 1 << (bit & 7)
+
+    def may_be_stored(self, node):
+        return all(
+            self.stored_filter[bit >> 3] & (1 << (bit & 7))
+            for bit in self.filter_bits(node)
+        )
+
+    def find(self, node):
+        path = []
+        parent = self.parent(node)
+        while parent != node:
+            path.append(node)
+            node, parent = parent, self.parent(parent)
+        for child in path:
+            self.set_parent(child, node)
+        return node
+
+    def union(self, node, other):
+        root, other_root = self.find(node), self.find(other)
+        if root != other_root:
+            root, other_root = min(root, other_root), max(root, other_root)
+            self.set_parent(other_root, root)
+
+    def resolve(self):
+        # points every node straight at its root by repeatedly replacing
+        # parents with theirs, which takes log(depth) passes
+        self.flush()
+        while self.connection.execute(
+            'UPDATE parents SET parent = '
+            '(SELECT grandparent.parent FROM parents AS grandparent '
+            'WHERE grandparent.node = parents.parent) '
+            'WHERE parent IN (SELECT node FROM parents)'
+        ).rowcount:
+            pass
+        self.connection.commit()
+
+    def root(self, node):
+        # only after `resolve`
+        row = self.connection.execute(
+            'SELECT parent FROM parents WHERE node = ?', (node,)
+        ).fetchone()
+        return row[0] if row else node
+
+    def members(self):
+        # (node, root) of every node that isn't a root, a cluster at a time
+        return self.connection.execute('SELECT node, parent FROM parents ORDER BY parent, node')
+
+
+class ClusterVertices:
+    """The vertex records of clusters, set aside while parts are rewritten
+
+    They are kept in the SQLite file of the union-find, and merged into a
+    vertex per cluster once all parts are rewritten.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS cluster_vertices (root TEXT NOT NULL, '
+            'seq INTEGER NOT NULL, record TEXT NOT NULL, PRIMARY KEY (root, seq)) WITHOUT ROWID'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS parents_parent ON parents (parent)')
+        self.is_cluster_root = functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self.has_members)
+        self.record_count = 0
+
+    def has_members(self, node):
+        return self.connection.execute(
+            'SELECT 1 FROM parents WHERE parent = ? LIMIT 1', (node,)
+        ).fetchone() is not None
+
+    def set_aside(self, record):
+        # a vertex, or a CSV row, with its ID replaced by the canonical one
+        root = record[0] if isinstance(record, list) else record['id']
+        if not self.is_cluster_root(root):
+            return False
+        self.connection.execute(
+            'INSERT INTO cluster_vertices VALUES (?, ?, ?)',
+            (root, self.record_count, encode_json(record)),
+        )
+        self.record_count += 1
+        return True
+
+    def merged(self):
+        # a vertex per cluster, in the order of their canonical IDs
+        self.connection.commit()
+        rows = self.connection.execute(
+            'SELECT root, record FROM cluster_vertices ORDER BY root, seq'
+        )
+        for root, root_rows in itertools.groupby(rows, key=operator.itemgetter(0)):
+            yield merge_vertices(root, (json.loads(record) for _, record in root_rows))
+
+
+def merge_vertices(vertex_id, records):
+    """One vertex with the properties of all records
+
+    The values of a property that several records have are listed, without
+    duplicates, in the order of the records.
+    """
+    merged = {'id': vertex_id}
+    for record in records:
+        if isinstance(record, list):
+            # a CSV row: id, property, value, language
+            _, key, value, language = record
+            record = {key: {'value': value, 'language': language} if language else value}
+        for key, value in record.items():
+            if key == 'id':
+                continue
+            if key not in merged:
+                merged[key] = value
+                continue
+            values = merged[key] if isinstance(merged[key], list) else [merged[key]]
+            for item in (value if isinstance(value, list) else [value]):
+                if item not in values:
+                    values.append(item)
+            if len(values) > 1:
+                merged[key] = values
+    return merged
+
+
+def links_path(part_name):
+    return f'{part_name}_{LINKS_SUFFIX}'
+
+
+def read_links(part_name):
+    try:
+        links_file = open(links_path(part_name), encoding='utf8')
+    except FileNotFoundError:
+        return
+
+    with links_file:
+        for line in links_file:
+            yield line.rstrip('\n').split('\t')
+
+
+def cluster_same_as(
+        part_names,
+        mapping_path,
+        union_find_path,
+        output_format=JSONL_FORMAT,
+        compression=NO_COMPRESSION,
+        compress_level=None,
+):
+    """Replace IDs linked by owl:sameAs with the canonical ID of their cluster
+
+    The links of all parts are clustered first, then the vertices and edges
+    of every part are rewritten, and every ID that is replaced is written to
+    `mapping_path` with its canonical ID. The vertices of a cluster are
+    merged into one, which is appended to the vertices of the last part.
+    """
+    link_count = 0
+    with DiskUnionFind(union_find_path) as union_find:
+        for part_name in part_names:
+            for node, other in read_links(part_name):
+                union_find.union(node, other)
+                link_count += 1
+        union_find.resolve()
+
+        member_count, cluster_count = write_mapping(mapping_path, union_find.members())
+
+        canonical_id = functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)(union_find.root)
+        cluster_vertices = ClusterVertices(union_find.connection)
+        for part_name in part_names:
+            rewrite_ids(
+                part_name,
+                canonical_id,
+                canonical_id,
+                canonical_id,
+                output_format,
+                compression,
+                compress_level,
+                cluster_vertices.set_aside,
+            )
+
+        merged_count = 0
+        if part_names:
+            writer = WRITER_TYPES[output_format].open(
+                part_names[-1], REWRITE_BUFFER_SIZE, compression, compress_level
+            )
+            try:
+                for vertex in cluster_vertices.merged():
+                    writer.write_vertex(vertex)
+                    merged_count += 1
+            finally:
+                writer.close()
+    os.remove(union_find_path)
+
+    return {
+        'links': link_count,
+        'clusters': cluster_count,
+        'replaced_ids': member_count,
+        'merged_vertices': merged_count,
+    }
+
+
+def write_mapping(mapping_path, members):
+    member_count = cluster_count = 0
+    last_root = None
+    with open(mapping_path, 'w', encoding='utf8', newline='') as mapping_file:
+        mapping_writer = csv.writer(mapping_file, delimiter='\t')
+        mapping_writer.writerow(['id', 'canonical_id'])
+        for node, root in members:
+            mapping_writer.writerow([node, root])
+            member_count += 1
+            if root != last_root:
+                cluster_count += 1
+                last_root = root
+    return member_count, cluster_count
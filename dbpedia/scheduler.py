@@ -0,0 +1,161 @@
+import multiprocessing
+import sys
+import time
+import traceback
+from collections import deque
+from multiprocessing.connection import wait
+
+from dbpedia.ledger import remove_part_output
+
+DONE_RESULT, FAILED_RESULT, PROGRESS_RESULT = 'done', 'failed', 'progress'
+MIN_SPLIT_SIZE = 2 ** 20  # bytes
+
+
+class PartFailedError(Exception):
+    pass
+
+
+class PartScheduler:
+    """Runs every part in a worker process of its own
+
+    Results are handled in the order the parts finish. A part that fails
+    or times out is retried up to `max_retries` times, and a part that
+    times out again is split in two halves, which are aligned to subject
+    transitions by the workers that transform them.
+
+    The task function is called with an `on_progress` callback, whose
+    arguments are passed on to `progress.update` with the part name.
+    """
+
+    def __init__(
+            self,
+            task_function,
+            make_task_args,
+            workers=None,
+            task_timeout=None,
+            max_retries=2,
+            progress=None,
+    ):
+        self.task_function = task_function
+        self.make_task_args = make_task_args
+        self.workers = workers or multiprocessing.cpu_count()
+        self.task_timeout = task_timeout
+        self.max_retries = max_retries
+        self.progress = progress
+
+    def run(self, ledger, parts):
+        # parts are queued with the number of times they failed and timed out
+        pending = deque((part, 0, 0) for part in parts)
+        running = {}
+        failed_parts = []
+
+        try:
+            while pending or running:
+                while pending and len(running) < self.workers:
+                    self.start(running, *pending.popleft())
+
+                for connection in wait(list(running), self.wait_timeout(running)):
+                    process, part, failures, timeouts, _ = running[connection]
+                    try:
+                        status, result = connection.recv()
+                    except EOFError:
+                        status, result = FAILED_RESULT, f'exit code {process.exitcode}'
+                    if status == PROGRESS_RESULT:
+                        if self.progress:
+                            self.progress.update(part[0], *result)
+                        continue
+
+                    del running[connection]
+                    connection.close()
+                    process.join()
+
+                    if status == DONE_RESULT:
+                        ledger.mark_done(*result)
+                    elif failures < self.max_retries:
+                        print(f'WARN: retrying {part[0]}, which failed with:\n{result}',
+                              file=sys.stderr)
+                        self.discard_output(part[0])
+                        pending.appendleft((part, failures + 1, timeouts))
+                    else:
+                        print(f'WARN: giving up on {part[0]}, which failed with:\n{result}',
+                              file=sys.stderr)
+                        failed_parts.append(part[0])
+
+                now = time.monotonic()
+                for connection, task in list(running.items()):
+                    process, part, failures, timeouts, deadline = task
+                    if deadline > now:
+                        continue
+
+                    del running[connection]
+                    process.terminate()
+                    process.join()
+                    connection.close()
+                    self.discard_output(part[0])
+                    self.handle_timeout(ledger, pending, failed_parts, part, failures, timeouts)
+        finally:
+            for process, *_ in running.values():
+                process.terminate()
+                process.join()
+
+        if failed_parts:
+            raise PartFailedError(
+                f'{len(failed_parts)} parts failed: {", ".join(failed_parts)}\n'
+                f'Run again with --resume to only transform the unfinished parts.'
+            )
+
+    def start(self, running, part, failures, timeouts):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(
+            target=run_task,
+            args=(sender, self.task_function, self.make_task_args(part)),
+            daemon=True,
+        )
+        process.start()
+        sender.close()
+
+        deadline = time.monotonic() + (self.task_timeout or float('inf'))
+        running[receiver] = (process, part, failures, timeouts, deadline)
+
+    def discard_output(self, part_name):
+        remove_part_output(part_name)
+        if self.progress:
+            self.progress.reset(part_name)
+
+    def wait_timeout(self, running):
+        if self.task_timeout is None:
+            return None
+        next_deadline = min(deadline for *_, deadline in running.values())
+        return max(next_deadline - time.monotonic(), 0)
+
+    def handle_timeout(self, ledger, pending, failed_parts, part, failures, timeouts):
+        part_name, left, right, align_left, align_right = part
+        print(f'WARN: {part_name} timed out after {self.task_timeout} seconds',
+              file=sys.stderr)
+
+        if timeouts > 0 and right - left >= 2 * MIN_SPLIT_SIZE:
+            middle = (left + right) // 2
+            halves = [
+                (f'{part_name}-1', left, middle, align_left, True),
+                (f'{part_name}-2', middle, right, True, align_right),
+            ]
+            print(f'splitting {part_name} into {halves[0][0]} and {halves[1][0]}')
+            ledger.split_part(part_name, halves)
+            pending.extendleft((half, 0, 0) for half in reversed(halves))
+        elif failures < self.max_retries:
+            pending.appendleft((part, failures + 1, timeouts + 1))
+        else:
+            failed_parts.append(part_name)
+
+
+def run_task(connection, task_function, task_args):
+    def on_progress(*progress):
+        connection.send((PROGRESS_RESULT, progress))
+
+    try:
+        result = DONE_RESULT, task_function(*task_args, on_progress=on_progress)
+    except Exception:
+        result = FAILED_RESULT, traceback.format_exc()
+
+    connection.send(result)
+    connection.close()
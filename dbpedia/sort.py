@@ -0,0 +1,272 @@
+import argparse
+import heapq
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from dbpedia.compressed_input import detect_compression, ensure_block_index, open_input
+from dbpedia.preloader import cast_int
+from dbpedia.utils import base_path
+
+SPLITTER_SAMPLE_SIZE = 2 ** 16  # lines
+MAX_MERGE_FAN_IN = 256  # runs
+MERGE_BUFFER_SIZE = 2 ** 16  # bytes per run
+COPY_SIZE = 2 ** 22  # bytes
+
+arg_parser = argparse.ArgumentParser(
+    description='Sort NTriples by line, as `LC_ALL=C sort` does, so that the '
+                'triples of every subject are together.',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+
+
+def sort_triples(input_path, output_path, workers=None, run_size=int(1e8), temp_dir=None):
+    """An external merge sort of the lines of `input_path` into `output_path`
+
+    The input is cut into runs of about `run_size` bytes, which workers sort
+    in memory and write to temporary files. Lines sampled from the runs
+    split the sort order into one range per worker, and every worker merges
+    its range of all runs straight into its own region of the output file.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    if detect_compression(input_path):
+        # workers share the block index, so it is built first
+        ensure_block_index(input_path)
+
+    with open_input(input_path) as in_file:
+        input_size = in_file.seek(0, os.SEEK_END)
+        run_ranges = compute_run_ranges(in_file, input_size, run_size)
+    run_sample_size = max(SPLITTER_SAMPLE_SIZE // max(len(run_ranges), 1), 1)
+
+    temp_dir = temp_dir or os.path.dirname(output_path)
+    with tempfile.TemporaryDirectory(prefix='sort-', dir=temp_dir) as run_dir, \
+            multiprocessing.Pool(workers) as pool:
+        print(f'Sorting {len(run_ranges)} runs of {input_path} ...')
+        runs = pool.starmap(sort_run, [
+            (input_path, left, right, os.path.join(run_dir, f'run-{run_number:06}'),
+             run_sample_size)
+            for run_number, (left, right) in enumerate(run_ranges)
+        ])
+
+        splitters = choose_splitters([line for _, _, sample in runs for line in sample], workers)
+        run_offsets = pool.starmap(
+            find_split_offsets,
+            [(run_path, size, splitters) for run_path, size, _ in runs],
+        )
+
+        # the output regions of the merge ranges follow from the run segments
+        range_sizes = [
+            sum(offsets[range_number + 1] - offsets[range_number] for offsets in run_offsets)
+            for range_number in range(len(splitters) + 1)
+        ]
+        with open(output_path, 'wb') as out_file:
+            out_file.truncate(sum(range_sizes))
+
+        print(f'Merging {len(runs)} runs into {output_path} ...')
+        output_offset = 0
+        merges = []
+        for range_number, range_size in enumerate(range_sizes):
+            segments = [
+                (run_path, offsets[range_number], offsets[range_number + 1])
+                for (run_path, _, _), offsets in zip(runs, run_offsets)
+            ]
+            merges.append((segments, output_path, output_offset, run_dir))
+            output_offset += range_size
+        pool.starmap(merge_range, merges)
+
+    return output_offset
+
+
+def compute_run_ranges(in_file, input_size, run_size):
+    # byte ranges of whole lines
+    run_ranges = []
+    left = 0
+    while left < input_size:
+        right = seek_line_start(in_file, left + run_size, input_size)
+        run_ranges.append((left, right))
+        left = right
+    return run_ranges
+
+
+def seek_line_start(in_file, position, file_size):
+    # the start of the first line at or after `position`
+    if position <= 0:
+        return 0
+    elif position >= file_size:
+        return file_size
+    in_file.seek(position - 1)
+    in_file.readline()
+    return in_file.tell()
+
+
+def with_line_break(line):
+    # the last line of the input may lack one
+    return line if line.endswith(b'\n') else line + b'\n'
+
+
+def sort_run(input_path, left, right, run_path, sample_size):
+    with open_input(input_path) as in_file:
+        in_file.seek(left)
+        lines = in_file.read(right - left).splitlines(keepends=True)
+    if lines:
+        lines[-1] = with_line_break(lines[-1])
+    lines.sort()
+
+    with open(run_path, 'wb') as run_file:
+        run_file.writelines(lines)
+        run_size = run_file.tell()
+    # evenly spaced lines, to choose splitters from
+    step = max(len(lines) // sample_size, 1)
+    return run_path, run_size, lines[step // 2::step]
+
+
+def choose_splitters(sample, workers):
+    # lines that split the sample, and so the input, into `workers` ranges
+    # of about the same size
+    sample.sort()
+    return sorted(set(
+        sample[len(sample) * number // workers]
+        for number in range(1, workers)
+        if sample
+    ))
+
+
+def find_split_offsets(run_path, run_size, splitters):
+    # the offsets of the first lines of every merge range in a run
+    with open(run_path, 'rb') as run_file:
+        return [
+            0,
+            *(find_first_line(run_file, run_size, splitter) for splitter in splitters),
+            run_size,
+        ]
+
+
+def find_first_line(run_file, run_size, key):
+    # the offset of the first line that is not less than `key`: a binary
+    # search between line starts, and a scan once they are a line apart
+    low, high = 0, run_size
+    while low < high:
+        middle = seek_line_start(run_file, (low + high) // 2, run_size)
+        if middle >= high:
+            break
+        run_file.seek(middle)
+        if run_file.readline() < key:
+            low = run_file.tell()
+        else:
+            high = middle
+
+    run_file.seek(low)
+    while low < high:
+        line = run_file.readline()
+        if line >= key:
+            break
+        low += len(line)
+    return low
+
+
+def merge_range(segments, output_path, output_offset, run_dir):
+    segments = [segment for segment in segments if segment[2] > segment[1]]
+
+    # too many runs to keep open at once are merged a group at a time first
+    while len(segments) > MAX_MERGE_FAN_IN:
+        merged_segments = []
+        for group_start in range(0, len(segments), MAX_MERGE_FAN_IN):
+            group = segments[group_start:group_start + MAX_MERGE_FAN_IN]
+            fd, merged_path = tempfile.mkstemp(prefix='merged-', dir=run_dir)
+            with os.fdopen(fd, 'wb') as merged_file:
+                merge_segments(group, merged_file)
+                merged_segments.append((merged_path, 0, merged_file.tell()))
+        segments = merged_segments
+
+    with open(output_path, 'r+b') as out_file:
+        out_file.seek(output_offset)
+        merge_segments(segments, out_file)
+
+
+def merge_segments(segments, out_file):
+    if len(segments) == 1:
+        # nothing to merge
+        run_path, start, end = segments[0]
+        with open(run_path, 'rb') as run_file:
+            run_file.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = run_file.read(min(COPY_SIZE, remaining))
+                out_file.write(chunk)
+                remaining -= len(chunk)
+        return
+
+    segment_files = [
+        open(run_path, 'rb', buffering=MERGE_BUFFER_SIZE) for run_path, _, _ in segments
+    ]
+    try:
+        out_file.writelines(heapq.merge(*(
+            iter_segment(segment_file, start, end)
+            for segment_file, (_, start, end) in zip(segment_files, segments)
+        )))
+    finally:
+        for segment_file in segment_files:
+            segment_file.close()
+
+
+def iter_segment(segment_file, start, end):
+    segment_file.seek(start)
+    remaining = end - start
+    for line in segment_file:
+        yield line
+        remaining -= len(line)
+        if remaining <= 0:
+            break
+
+
+arg_parser.add_argument(
+    'input_path',
+    type=os.path.abspath,
+    help='the NTriples file to sort, which may be bzip2, gzip or zstd compressed'
+)
+arg_parser.add_argument(
+    'output_path',
+    nargs='?',
+    type=os.path.abspath,
+    default=os.environ.get('OUTPUT_PATH', base_path('sorted.nt')),
+    help='the sorted NTriples file to write'
+)
+arg_parser.add_argument(
+    '--workers',
+    type=int,
+    default=os.environ.get('WORKERS', os.cpu_count()),
+    help='the number of processes that sort runs and merge them'
+)
+arg_parser.add_argument(
+    '--run-size',
+    type=cast_int,
+    default=os.environ.get('RUN_SIZE', '1e8'),  # bytes
+    help='the number of input bytes a worker sorts in memory at a time; '
+         'a worker needs about 3 times as many bytes of memory'
+)
+arg_parser.add_argument(
+    '--temp-dir',
+    default=os.environ.get('TEMP_DIR', argparse.SUPPRESS),
+    help='the directory for the sorted runs, which take as much space as the '
+         '(uncompressed) input (default: the directory of `output_path`)'
+)
+
+
+if __name__ == "__main__":
+    args = arg_parser.parse_args(sys.argv[1:])
+    start_time = time.perf_counter()
+    try:
+        size = sort_triples(
+            args.input_path,
+            args.output_path,
+            args.workers,
+            args.run_size,
+            getattr(args, 'temp_dir', None),
+        )
+    except FileNotFoundError as err:
+        print(err, file=sys.stderr)
+        exit(1)
+    print(f'Done! {size} bytes have been sorted into {args.output_path} '
+          f'in {time.perf_counter() - start_time:.1f} s')
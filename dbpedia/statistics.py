@@ -0,0 +1,262 @@
+import base64
+import hashlib
+import json
+import math
+import zlib
+
+from rdflib import Literal
+
+from dbpedia import ntriples
+
+STATISTICS_SUFFIX = 'statistics.json'
+HLL_PRECISION = 11  # 2 ** 11 registers, about 2.3 % standard error
+
+EDGE_KIND = 'edge'
+URI_PROP_KIND = 'uri_prop'
+LANG_LITERAL_KIND = 'lang_literal'
+TYPED_LITERAL_KIND = 'typed_literal'
+PLAIN_LITERAL_KIND = 'plain_literal'
+LITERAL_TYPES = (Literal, ntriples.Literal)
+
+
+def hash64(value, blake2b=hashlib.blake2b, from_bytes=int.from_bytes):
+    # the same in every process, unlike `hash`, so that the sketches of
+    # different workers and runs can be merged
+    return from_bytes(blake2b(value.encode('utf8', 'surrogatepass'), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """Estimates the number of distinct values added, in fixed memory
+
+    Registers are kept in a dict while few of them are set, which is the
+    case for most predicates, and in a `2 ** precision` byte array after
+    that.
+    """
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.size = 2 ** precision
+        self.rank_bits = 64 - precision
+        self.rank_mask = 2 ** self.rank_bits - 1
+        self.sparse_limit = self.size // 32
+        self.registers = {}
+
+    def add_hash(self, value_hash):
+        index = value_hash >> self.rank_bits
+        # the position of the first 1 bit in the rest of the hash
+        rank = self.rank_bits - (value_hash & self.rank_mask).bit_length() + 1
+        registers = self.registers
+        if type(registers) is dict:
+            if rank > registers.get(index, 0):
+                registers[index] = rank
+                if len(registers) > self.sparse_limit:
+                    self.make_dense()
+        elif rank > registers[index]:
+            registers[index] = rank
+
+    def make_dense(self):
+        if type(self.registers) is dict:
+            self.registers = self.dense_registers()
+
+    def dense_registers(self):
+        registers = self.registers
+        if type(registers) is dict:
+            registers = bytearray(self.size)
+            for index, rank in self.registers.items():
+                registers[index] = rank
+        return registers
+
+    def merge(self, other):
+        registers = self.registers
+        if type(registers) is dict and type(other.registers) is dict:
+            for index, rank in other.registers.items():
+                if rank > registers.get(index, 0):
+                    registers[index] = rank
+            if len(registers) > self.sparse_limit:
+                self.make_dense()
+        else:
+            self.registers = bytearray(map(
+                max, self.dense_registers(), other.dense_registers()
+            ))
+
+    def estimate(self):
+        ranks = [rank for rank in self.dense_registers() if rank]
+        zero_count = self.size - len(ranks)
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / (zero_count + sum(2.0 ** -rank for rank in ranks))
+        if estimate <= 2.5 * self.size and zero_count:
+            # linear counting, which is more accurate for few values
+            estimate = self.size * math.log(self.size / zero_count)
+        return round(estimate)
+
+    def to_json(self):
+        # mostly zeros, unless many values were added
+        return base64.b64encode(zlib.compress(bytes(self.dense_registers()))).decode('ascii')
+
+    @classmethod
+    def from_json(cls, data, precision=HLL_PRECISION):
+        hll = cls(precision)
+        registers = zlib.decompress(base64.b64decode(data))
+        hll.registers = {index: rank for index, rank in enumerate(registers) if rank}
+        if len(hll.registers) > hll.sparse_limit:
+            hll.registers = bytearray(registers)
+        return hll
+
+
+class PredicateStatistics:
+
+    def __init__(self):
+        # plain dicts, which are quicker to count in than Counters
+        self.object_kinds = {}
+        self.datatypes = {}
+        self.languages = {}
+        self.subjects = HyperLogLog()
+        self.objects = HyperLogLog()
+        self.max_values_per_subject = 0
+
+    def merge(self, other):
+        for counts, other_counts in (
+                (self.object_kinds, other.object_kinds),
+                (self.datatypes, other.datatypes),
+                (self.languages, other.languages),
+        ):
+            for key, count in other_counts.items():
+                counts[key] = counts.get(key, 0) + count
+        self.subjects.merge(other.subjects)
+        self.objects.merge(other.objects)
+        self.max_values_per_subject = max(
+            self.max_values_per_subject, other.max_values_per_subject
+        )
+
+    def to_json(self):
+        # with the sketches, so that the statistics of parts can be merged
+        return {
+            'object_kinds': self.object_kinds,
+            'datatypes': self.datatypes,
+            'languages': self.languages,
+            'subjects': self.subjects.to_json(),
+            'objects': self.objects.to_json(),
+            'max_values_per_subject': self.max_values_per_subject,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        statistics = cls()
+        statistics.object_kinds = data['object_kinds']
+        statistics.datatypes = data['datatypes']
+        statistics.languages = data['languages']
+        statistics.subjects = HyperLogLog.from_json(data['subjects'])
+        statistics.objects = HyperLogLog.from_json(data['objects'])
+        statistics.max_values_per_subject = data['max_values_per_subject']
+        return statistics
+
+    def triple_count(self):
+        return sum(self.object_kinds.values())
+
+    def summary(self):
+        return {
+            'triples': self.triple_count(),
+            'object_kinds': most_common(self.object_kinds),
+            'datatypes': most_common(self.datatypes),
+            'languages': most_common(self.languages),
+            'distinct_subjects': self.subjects.estimate(),
+            'distinct_objects': self.objects.estimate(),
+            'max_values_per_subject': self.max_values_per_subject,
+        }
+
+
+def most_common(counts):
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+
+class StatisticsCollector:
+    """Statistics per predicate, gathered a triple at a time
+
+    `subject` has to be called whenever the subject changes, and once more
+    with None at the end, since the subjects of a predicate and the most
+    values a subject has for it are only counted once a subject is done.
+    """
+
+    def __init__(self, qname=str):
+        self.qname = qname
+        self.predicates = {}
+        # the number of values of every predicate of the current subject
+        self.subject_values = {}
+        self.subject_hash = None
+
+    def subject(self, subj):
+        predicates = self.predicates
+        for pred, value_count in self.subject_values.items():
+            statistics = predicates[pred]
+            statistics.subjects.add_hash(self.subject_hash)
+            if value_count > statistics.max_values_per_subject:
+                statistics.max_values_per_subject = value_count
+        self.subject_values.clear()
+        self.subject_hash = hash64(subj) if subj is not None else None
+
+    def triple(self, pred, obj, is_edge):
+        try:
+            statistics = self.predicates[pred]
+        except KeyError:
+            statistics = self.predicates[pred] = PredicateStatistics()
+        subject_values = self.subject_values
+        subject_values[pred] = subject_values.get(pred, 0) + 1
+
+        value = obj
+        if is_edge:
+            kind = EDGE_KIND
+        elif isinstance(obj, LITERAL_TYPES):
+            if obj.language:
+                kind = LANG_LITERAL_KIND
+                languages = statistics.languages
+                languages[obj.language] = languages.get(obj.language, 0) + 1
+                value = f'{obj}@{obj.language}'
+            elif obj.datatype:
+                kind = TYPED_LITERAL_KIND
+                datatype = self.qname(obj.datatype)
+                datatypes = statistics.datatypes
+                datatypes[datatype] = datatypes.get(datatype, 0) + 1
+            else:
+                kind = PLAIN_LITERAL_KIND
+        else:
+            kind = URI_PROP_KIND
+        object_kinds = statistics.object_kinds
+        object_kinds[kind] = object_kinds.get(kind, 0) + 1
+        statistics.objects.add_hash(hash64(value))
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf8') as statistics_file:
+            json.dump({
+                pred: statistics.to_json()
+                for pred, statistics in self.predicates.items()
+            }, statistics_file)
+
+
+def statistics_path(part_name):
+    return f'{part_name}_{STATISTICS_SUFFIX}'
+
+
+def merge_statistics(part_names, output_path):
+    """Merge the statistics of all parts into one file
+
+    The predicates are listed by their number of triples, most first.
+    """
+    predicates = {}
+    for part_name in part_names:
+        with open(statistics_path(part_name), encoding='utf8') as statistics_file:
+            part_predicates = json.load(statistics_file)
+        for pred, data in part_predicates.items():
+            statistics = PredicateStatistics.from_json(data)
+            if pred in predicates:
+                predicates[pred].merge(statistics)
+            else:
+                predicates[pred] = statistics
+
+    with open(output_path, 'w', encoding='utf8') as statistics_file:
+        json.dump({
+            pred: statistics.summary()
+            for pred, statistics in sorted(
+                predicates.items(), key=lambda item: (-item[1].triple_count(), item[0])
+            )
+        }, statistics_file, indent=4)
+    return len(predicates)
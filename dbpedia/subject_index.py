@@ -0,0 +1,111 @@
+import os
+import sys
+
+from dbpedia.compressed_input import input_fingerprint, open_input
+
+INDEX_HEADER_PREFIX = b'#subject-index'
+
+
+class SubjectIndex:
+    """Sorted `<subject>\\toffset` lines pointing into a sorted NTriples file
+
+    Only global subjects are indexed. A sparse index only lists the first
+    subject after every `interval` bytes, a full index (interval 0) lists
+    every global subject.
+    """
+
+    def __init__(self, index_file, data_start, index_end):
+        self.index_file = index_file
+        self.data_start = data_start
+        self.index_end = index_end
+
+    @classmethod
+    def open(cls, index_path, input_path):
+        # returns `None` when there is no index or it's out of date
+        try:
+            index_file = open(index_path, 'rb')
+        except FileNotFoundError:
+            return None
+
+        header = index_file.readline().rstrip(b'\n').split(b'\t')
+        if header[0] != INDEX_HEADER_PREFIX or header[1:] != input_fingerprint(input_path):
+            print(f'WARN: ignoring {index_path}, it does not match '
+                  f'{input_path}', file=sys.stderr)
+            index_file.close()
+            return None
+
+        data_start = index_file.tell()
+        index_end = index_file.seek(0, os.SEEK_END)
+        return cls(index_file, data_start, index_end)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.index_file.close()
+
+    def __iter__(self):
+        self.index_file.seek(self.data_start)
+        for line in self.index_file:
+            subject, offset = line.split(b'\t')
+            yield subject, int(offset)
+
+    def seek_subject(self, subject):
+        """Return the offset of the last entry at or before `subject`"""
+        # invariant: `lo` is a line start and no line from `hi` on is a match
+        lo, hi = self.data_start, self.index_end
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            line_start, entry = self.read_entry_after(mid)
+            if line_start < hi and entry[0] <= subject:
+                lo = line_start
+            else:
+                hi = mid
+
+        _, entry = self.read_entry_after(lo)
+        if entry is None or entry[0] > subject:
+            return None
+        return entry[1]
+
+    def read_entry_after(self, cursor):
+        # read the first entry that starts at or after `cursor`
+        self.index_file.seek(max(cursor - 1, self.data_start))
+        if cursor > self.data_start:
+            self.index_file.readline()
+
+        line_start = self.index_file.tell()
+        line = self.index_file.readline()
+        if not line:
+            return line_start, None
+
+        subject, offset = line.split(b'\t')
+        return line_start, (subject, int(offset))
+
+
+def build_subject_index(input_path, index_path, global_id_marker, interval):
+    id_marker = global_id_marker.encode('utf8')
+    last_subject = None
+    last_indexed_pos = -interval
+    entry_count = 0
+
+    in_file = open_input(input_path)
+    with in_file, open(index_path, 'wb') as index_file:
+        index_file.write(b'\t'.join([INDEX_HEADER_PREFIX, *input_fingerprint(input_path)]))
+        index_file.write(b'\n')
+
+        cursor = 0
+        for line in in_file:
+            subject = line[:line.find(b'> ') + 1]
+            if subject != last_subject:
+                last_subject = subject
+                if cursor - last_indexed_pos >= interval and id_marker in subject:
+                    index_file.write(b'%s\t%d\n' % (subject, cursor))
+                    last_indexed_pos = cursor
+                    entry_count += 1
+            cursor += len(line)
+
+    return entry_count
+
+
+def default_index_path(input_path):
+    return f'{input_path}.idx'
@@ -0,0 +1,163 @@
+import argparse
+import os
+import sys
+
+from dbpedia.compressed_input import open_input
+from dbpedia.graph_elements import NamespacePrefixer, PropertyGraphSink
+from dbpedia.ntriples import NTriplesTokenizer
+from dbpedia.preloader import cast_int
+from dbpedia.subject_index import (
+    SubjectIndex,
+    build_subject_index,
+    default_index_path,
+)
+from dbpedia.utils import base_path
+from dbpedia.writers import JsonLinesWriter
+
+arg_parser = argparse.ArgumentParser(
+    description='Index the subjects of sorted Databus NTriples and look up single subjects.',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+subparsers = arg_parser.add_subparsers(dest='command')
+subparsers.required = True
+
+
+class StreamSink(PropertyGraphSink):
+    # writes vertices and edges to an open text stream instead of part files
+
+    def __init__(self, global_id_marker, out_stream, prefixer=None):
+        super().__init__(global_id_marker, 'lookup', prefixer)
+        self.out_stream = out_stream
+
+    def __enter__(self):
+        self.writer = StreamWriter(self.out_stream, self.out_stream)
+        return self
+
+
+class StreamWriter(JsonLinesWriter):
+
+    def close(self):
+        # leave the stream open for whoever passed it in
+        self.flush()
+        self.vertex_file.flush()
+
+
+def index_subjects(args):
+    print(f'Indexing the subjects of {args.input_path} ...')
+    entry_count = build_subject_index(
+        args.input_path,
+        args.subject_index,
+        args.global_id_marker,
+        args.interval,
+    )
+    print(f'Done! {entry_count} subjects have been indexed in {args.subject_index}')
+
+
+def lookup_subject(
+        input_path,
+        index_path,
+        subject,
+        global_id_marker,
+        out_stream,
+        prefixer=None,
+):
+    if ':' not in subject:
+        # a bare global ID
+        subject = f'http://{global_id_marker}{subject}'
+    subject_key = f'<{subject}>'.encode('utf8')
+
+    subject_index = SubjectIndex.open(index_path, input_path)
+    if subject_index is None:
+        raise FileNotFoundError(f'No usable subject index for {input_path}')
+    with subject_index:
+        offset = subject_index.seek_subject(subject_key)
+
+    with StreamSink(global_id_marker, out_stream, prefixer) as sink:
+        if offset is None:
+            return sink
+
+        tokenizer = NTriplesTokenizer(sink=sink)
+        with open_input(input_path) as in_file:
+            in_file.seek(offset)
+            for line in in_file:
+                line_subject = line[:line.find(b'> ') + 1]
+                if line_subject > subject_key:
+                    break
+                elif line_subject == subject_key:
+                    tokenizer.parse([line])
+
+    return sink
+
+
+def add_common_arguments(parser):
+    parser.add_argument(
+        'input_path',
+        nargs='?',
+        type=os.path.abspath,
+        default=os.environ.get('INPUT_PATH', base_path('sorted.nt')),
+        help='the Databus NTriples input file path'
+    )
+    parser.add_argument(
+        '--subject-index',
+        default=os.environ.get('SUBJECT_INDEX', argparse.SUPPRESS),
+        help='the subject index file path (default: <input_path>.idx)'
+    )
+    parser.add_argument(
+        '--global-id-marker',
+        default=os.environ.get('GLOBAL_ID_MARKER', 'id.dbpedia.org/global/'),
+        help='only subjects with this marker are indexed'
+    )
+
+
+index_parser = subparsers.add_parser(
+    'index',
+    help='write a sorted index of subject byte offsets next to the input',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+add_common_arguments(index_parser)
+index_parser.add_argument(
+    '--interval',
+    type=cast_int,
+    default=os.environ.get('INDEX_INTERVAL', '1e6'),  # bytes
+    help='the approximate number of bytes between indexed subjects '
+         '(0 indexes every subject)'
+)
+
+lookup_parser = subparsers.add_parser(
+    'lookup',
+    help='print the vertex and edges of a single global subject',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+lookup_parser.add_argument(
+    'subject',
+    help='the subject URI, or just the ID that follows the `global_id_marker`'
+)
+add_common_arguments(lookup_parser)
+lookup_parser.add_argument(
+    '--shorten-uris',
+    action='store_true',
+    help='shorten URIs by replacing known namespaces with their corresponding prefix'
+)
+
+
+if __name__ == "__main__":
+    args = arg_parser.parse_args(sys.argv[1:])
+    args.subject_index = getattr(
+        args, 'subject_index', default_index_path(args.input_path)
+    )
+
+    try:
+        if args.command == 'index':
+            index_subjects(args)
+        else:
+            lookup_subject(
+                args.input_path,
+                args.subject_index,
+                args.subject,
+                args.global_id_marker,
+                sys.stdout,
+                NamespacePrefixer() if args.shorten_uris else None,
+            )
+    except FileNotFoundError as err:
+        print(err, file=sys.stderr)
+        exit(1)
@@ -0,0 +1,289 @@
+import argparse
+import math
+import os
+import random
+import sys
+
+from dbpedia.preloader import cast_int
+
+GLOBAL_NAMESPACE = 'http://id.dbpedia.org/global/'
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+GLOBAL_ID_LENGTH = 7
+
+DBO = 'http://dbpedia.org/ontology/'
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+OWL_SAME_AS = 'http://www.w3.org/2002/07/owl#sameAs'
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+LANGUAGE_PREDICATES = [
+    'http://www.w3.org/2000/01/rdf-schema#label',
+    'http://www.w3.org/2000/01/rdf-schema#comment',
+    'http://xmlns.com/foaf/0.1/name',
+    f'{DBO}abstract',
+]
+LANGUAGES = ['en', 'de', 'fr', 'nl', 'es', 'it', 'pt', 'ru', 'ja', 'zh', 'pt-BR', 'sr-Latn']
+# predicates that take a single plain or typed literal per subject
+TYPED_PREDICATES = [
+    (f'{DBO}birthDate', f'{XSD}date'),
+    (f'{DBO}deathDate', f'{XSD}date'),
+    (f'{DBO}foundingYear', f'{XSD}gYear'),
+    (f'{DBO}populationTotal', f'{XSD}nonNegativeInteger'),
+    (f'{DBO}number', f'{XSD}integer'),
+    (f'{DBO}height', f'{XSD}double'),
+    (f'{DBO}elevation', f'{XSD}double'),
+    (f'{DBO}areaTotal', 'http://dbpedia.org/datatype/squareKilometre'),
+    (f'{DBO}alias', None),
+    (f'{DBO}motto', f'{XSD}string'),
+]
+EDGE_PREDICATES = [
+    f'{DBO}birthPlace',
+    f'{DBO}country',
+    f'{DBO}party',
+    f'{DBO}occupation',
+    f'{DBO}team',
+    f'{DBO}location',
+]
+TYPE_OBJECTS = [
+    f'{DBO}{class_name}'
+    for class_name in ['Person', 'Place', 'Organisation', 'Work', 'Species', 'Event', 'Agent']
+]
+SAME_AS_NAMESPACES = [
+    'http://dbpedia.org/resource/',
+    'http://de.dbpedia.org/resource/',
+    'http://fr.dbpedia.org/resource/',
+    'http://www.wikidata.org/entity/Q',
+]
+WORDS = [
+    'river', 'Landesrat', 'österreichischer', 'Politiker', 'city', 'ville',
+    'football', 'club', 'album', 'année', 'Straße', 'village', 'church',
+    'station', 'nation', 'über', 'mountain', 'école', 'language', 'song',
+]
+
+arg_parser = argparse.ArgumentParser(
+    description='Write sorted, DBpedia-like NTriples with global URI subjects.',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+
+
+def write_synthetic_triples(out_file, args):
+    rng = random.Random(args.seed)
+    written = write_external_subjects(
+        out_file, rng, args.leading_size, 'http://commons.wikimedia.org/wiki/Special:FilePath/'
+    )
+
+    global_number = rng.randrange(58 ** (GLOBAL_ID_LENGTH - 1))
+    global_size = args.size - args.leading_size - args.trailing_size
+    global_end = written + max(global_size, 0)
+    while written < global_end:
+        global_number += rng.randint(1, 100)
+        group_size = draw_group_size(rng, args)
+        lines = make_subject_lines(rng, args, global_number, group_size)
+        out_file.write(lines)
+        written += len(lines)
+
+    written += write_external_subjects(
+        out_file, rng, args.trailing_size, 'http://www.wikidata.org/entity/'
+    )
+    return written
+
+
+def draw_group_size(rng, args):
+    if rng.random() < args.heavy_subject_rate:
+        return args.heavy_group_size
+    # geometric, with `mean_group_size` as its mean
+    return 1 + int(rng.expovariate(1 / max(args.mean_group_size - 1, 1e-9)))
+
+
+def make_subject_lines(rng, args, global_number, group_size):
+    subject = f'<{GLOBAL_NAMESPACE}{base58(global_number)}>'
+    objects = set()
+
+    for _ in range(poisson(rng, args.same_as_density)):
+        if rng.random() < 0.1:
+            objects.add((OWL_SAME_AS, f'<{GLOBAL_NAMESPACE}{random_global_id(rng)}>'))
+        else:
+            namespace = rng.choice(SAME_AS_NAMESPACES)
+            objects.add((OWL_SAME_AS, f'<{namespace}{random_name(rng)}>'))
+
+    # the graph sink keeps a single value of these per subject
+    unused_typed = list(TYPED_PREDICATES)
+    used_languages = set()
+    language_pairs = len(LANGUAGE_PREDICATES) * len(LANGUAGES)
+    while len(objects) < group_size:
+        literals_left = unused_typed or len(used_languages) < language_pairs
+        if literals_left and rng.random() < args.literal_ratio:
+            if unused_typed and (
+                    rng.random() >= args.language_ratio
+                    or len(used_languages) == language_pairs
+            ):
+                predicate, datatype = unused_typed.pop(rng.randrange(len(unused_typed)))
+                objects.add((predicate, typed_literal(rng, datatype)))
+            else:
+                predicate = rng.choice(LANGUAGE_PREDICATES)
+                language = rng.choice(LANGUAGES)
+                if (predicate, language) in used_languages:
+                    continue
+                used_languages.add((predicate, language))
+                objects.add((predicate, f'"{random_text(rng)}"@{language}'))
+        elif rng.random() < 0.5:
+            edge_object = f'<{GLOBAL_NAMESPACE}{random_global_id(rng)}>'
+            objects.add((rng.choice(EDGE_PREDICATES), edge_object))
+        else:
+            objects.add((RDF_TYPE, f'<{rng.choice(TYPE_OBJECTS)}>'))
+            if len(objects) < group_size:
+                objects.add((
+                    f'{DBO}wikiPageExternalLink',
+                    f'<http://www.{random_name(rng).lower()}.org/{rng.randrange(10 ** 6)}>',
+                ))
+
+    lines = sorted(f'{subject} <{predicate}> {obj} .\n' for predicate, obj in objects)
+    return ''.join(lines).encode('utf8')
+
+
+def write_external_subjects(out_file, rng, size, namespace):
+    written = 0
+    number = 0
+    while written < size:
+        number += 1
+        subject = f'<{namespace}{number:012}>'
+        lines = (
+            f'{subject} <http://purl.org/dc/terms/license> '
+            f'"{random_text(rng)}"@en .\n'
+            f'{subject} <http://xmlns.com/foaf/0.1/depicts> '
+            f'<http://dbpedia.org/resource/{random_name(rng)}> .\n'
+        ).encode('utf8')
+        out_file.write(lines)
+        written += len(lines)
+    return written
+
+
+def typed_literal(rng, datatype):
+    if datatype is None or datatype == f'{XSD}string':
+        lexical = random_text(rng)
+    elif datatype == f'{XSD}date':
+        lexical = f'{rng.randint(1000, 2020)}-{rng.randint(1, 12):02}-{rng.randint(1, 28):02}'
+    elif datatype == f'{XSD}gYear':
+        lexical = str(rng.randint(1000, 2020))
+    elif datatype.endswith('Integer') or datatype.endswith('integer'):
+        lexical = str(rng.randrange(10 ** rng.randint(1, 8)))
+    else:
+        lexical = repr(round(rng.uniform(0, 10 ** 4), 2))
+
+    if datatype is None:
+        return f'"{lexical}"'
+    return f'"{lexical}"^^<{datatype}>'
+
+
+def random_text(rng):
+    text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+    if rng.random() < 0.05:
+        # escaped quotes and characters, as found in abstracts
+        text = f'\\"{text}\\" \\u00E9t\\u00E9'
+    return text
+
+
+def random_name(rng):
+    return '_'.join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(1, 3)))
+
+
+def random_global_id(rng):
+    return base58(rng.randrange(58 ** GLOBAL_ID_LENGTH))
+
+
+def base58(number):
+    # fixed-width, so that IDs sort like the numbers they encode
+    digits = []
+    for _ in range(GLOBAL_ID_LENGTH):
+        number, digit = divmod(number, 58)
+        digits.append(BASE58_ALPHABET[digit])
+    return ''.join(reversed(digits))
+
+
+def poisson(rng, mean):
+    # Knuth's method is fine for the small means used here
+    limit, count, product = math.exp(-mean), 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def add_generator_arguments(parser):
+    parser.add_argument(
+        '--size',
+        type=cast_int,
+        default=os.environ.get('SYNTHETIC_SIZE', '100e6'),  # bytes
+        help='the approximate size of the generated file in bytes'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=os.environ.get('SYNTHETIC_SEED', 0),
+        help='the seed of the random generator: the same seed and '
+             'arguments give the same file'
+    )
+    parser.add_argument(
+        '--leading-size',
+        type=cast_int,
+        default=os.environ.get('LEADING_SIZE', '1e6'),  # bytes
+        help='the number of bytes of non-global subjects before the first '
+             'global subject'
+    )
+    parser.add_argument(
+        '--trailing-size',
+        type=cast_int,
+        default=os.environ.get('TRAILING_SIZE', '1e5'),  # bytes
+        help='the number of bytes of non-global subjects after the last '
+             'global subject'
+    )
+    parser.add_argument(
+        '--mean-group-size',
+        type=float,
+        default=os.environ.get('MEAN_GROUP_SIZE', 20),
+        help='the mean number of triples per global subject'
+    )
+    parser.add_argument(
+        '--heavy-subject-rate',
+        type=float,
+        default=os.environ.get('HEAVY_SUBJECT_RATE', 0.001),
+        help='the fraction of global subjects with `heavy_group_size` triples'
+    )
+    parser.add_argument(
+        '--heavy-group-size',
+        type=int,
+        default=os.environ.get('HEAVY_GROUP_SIZE', 2000),
+        help='the number of triples of heavy global subjects'
+    )
+    parser.add_argument(
+        '--literal-ratio',
+        type=float,
+        default=os.environ.get('LITERAL_RATIO', 0.6),
+        help='the fraction of triples with a literal object'
+    )
+    parser.add_argument(
+        '--language-ratio',
+        type=float,
+        default=os.environ.get('LANGUAGE_RATIO', 0.5),
+        help='the fraction of literals with a language tag, the others are '
+             'plain or typed'
+    )
+    parser.add_argument(
+        '--same-as-density',
+        type=float,
+        default=os.environ.get('SAME_AS_DENSITY', 3),
+        help='the mean number of owl:sameAs triples per global subject'
+    )
+
+
+arg_parser.add_argument(
+    'output_path',
+    type=os.path.abspath,
+    help='the NTriples file to write'
+)
+add_generator_arguments(arg_parser)
+
+
+if __name__ == "__main__":
+    args = arg_parser.parse_args(sys.argv[1:])
+    with open(args.output_path, 'wb') as out_file:
+        size = write_synthetic_triples(out_file, args)
+    print(f'Done! {size} bytes have been written to {args.output_path}')
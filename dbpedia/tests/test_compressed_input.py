@@ -0,0 +1,53 @@
+import bz2
+import gzip
+import random
+
+import pytest
+
+from dbpedia.compressed_input import (
+    BZIP2_COMPRESSION,
+    GZIP_COMPRESSION,
+    BlockIndex,
+    build_block_index,
+    open_input,
+)
+from dbpedia.utils import base_path
+
+
+def make_input():
+    # enough text for a few bzip2 blocks of 100 kB
+    sample_bytes = open(base_path('samples/skip-to-right-test.nt'), 'rb').read()
+    rng = random.Random(1)
+    return b''.join(
+        sample_bytes[rng.randrange(len(sample_bytes)):]
+        for _ in range(100)
+    )
+
+
+def compress_in_two_streams(compress):
+    return lambda data: compress(data[:5000]) + compress(data[5000:])
+
+
+@pytest.mark.parametrize('compression, compress, block_count', [
+    (BZIP2_COMPRESSION, lambda data: bz2.compress(data, compresslevel=1), 4),
+    (BZIP2_COMPRESSION, compress_in_two_streams(bz2.compress), 2),
+    (GZIP_COMPRESSION, compress_in_two_streams(gzip.compress), 2),
+])
+def test_read_compressed_blocks(tmp_path, compression, compress, block_count):
+    input_bytes = make_input()
+    input_path = str(tmp_path / 'input.nt.compressed')
+    with open(input_path, 'wb') as in_file:
+        in_file.write(compress(input_bytes))
+
+    block_index = build_block_index(input_path, f'{input_path}.blocks')
+    assert compression == block_index.compression
+    assert block_count == len(block_index.blocks)
+    assert len(input_bytes) == block_index.uncompressed_size
+    assert block_index.blocks == BlockIndex.open(f'{input_path}.blocks', input_path).blocks
+
+    with open_input(input_path) as in_file:
+        assert input_bytes == in_file.read()
+        for position in [300000, 4990, 0, 123456, len(input_bytes) - 10]:
+            in_file.seek(position)
+            assert input_bytes[position:position + 2000] == in_file.read(2000)
+        assert len(input_bytes) == in_file.seek(0, 2)
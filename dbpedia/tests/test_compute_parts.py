@@ -1,22 +1,24 @@
-from dbpedia.compute_parts import compute_parts
+from dbpedia.compute_parts import (
+    align_part,
+    compute_parts,
+    compute_raw_parts,
+)
 from dbpedia.preloader import parse_arguments
 from dbpedia.utils import base_path
 
 
-def get_test_args(**kwargs):
+def get_test_args(output_dir, **kwargs):
     args = parse_arguments(
         [],  # we don't want to test the parser by default
-        output_dir=base_path('tests/output/'),
+        output_dir=str(output_dir),
         **kwargs
     )
     return args
 
 
-# TODO: clean output before each test
-
-
-def test_skip_to_global_right_binary():
+def test_skip_to_global_right_binary(tmp_path):
     args = get_test_args(
+        tmp_path,
         input_path=base_path('samples/skip-to-right-test.nt'),
         target_size=500,
         search_type='binary',
@@ -25,11 +27,12 @@ def test_skip_to_global_right_binary():
 
     assert 2 == len(part_positions)
     assert (4615, 7243) == part_positions[0][1:]
-    assert (7243, 7743) == part_positions[1][1:]
+    assert (7243, 7735) == part_positions[1][1:]
 
 
-def test_skip_to_global_right_jump():
+def test_skip_to_global_right_jump(tmp_path):
     args = get_test_args(
+        tmp_path,
         input_path=base_path('samples/skip-to-right-test.nt'),
         target_size=500,
         search_type='jump',
@@ -39,11 +42,12 @@ def test_skip_to_global_right_jump():
 
     assert 2 == len(part_positions)
     assert (4615, 7243) == part_positions[0][1:]
-    assert (7243, 7743) == part_positions[1][1:]
+    assert (7243, 7735) == part_positions[1][1:]
 
 
-def test_skip_to_global_middle_binary():
+def test_skip_to_global_middle_binary(tmp_path):
     args = get_test_args(
+        tmp_path,
         input_path=base_path('samples/skip-to-middle-test.nt'),
         target_size=500,
         search_type='binary',
@@ -53,11 +57,12 @@ def test_skip_to_global_middle_binary():
     assert 3 == len(part_positions)
     assert (1834, 6236) == part_positions[0][1:]
     assert (6236, 6949) == part_positions[1][1:]
-    assert (6949, 7676) == part_positions[2][1:]
+    assert (6949, 7462) == part_positions[2][1:]
 
 
-def test_skip_to_global_middle_jump():
+def test_skip_to_global_middle_jump(tmp_path):
     args = get_test_args(
+        tmp_path,
         input_path=base_path('samples/skip-to-middle-test.nt'),
         target_size=500,
         search_type='jump',
@@ -68,24 +73,26 @@ def test_skip_to_global_middle_jump():
     assert 3 == len(part_positions)
     assert (1834, 6236) == part_positions[0][1:]
     assert (6236, 6949) == part_positions[1][1:]
-    assert (6949, 7676) == part_positions[2][1:]
+    assert (6949, 7462) == part_positions[2][1:]
 
 
-def test_skip_to_global_left_binary():
+def test_skip_to_global_left_binary(tmp_path):
     args = get_test_args(
+        tmp_path,
         input_path=base_path('samples/skip-to-left-test.nt'),
         target_size=500,
         search_type='binary',
     )
     part_positions = list(compute_parts(args))
 
-    assert 2 == len(part_positions)
+    # the non-global subjects after the global ones are left out
+    assert 1 == len(part_positions)
     assert (314, 1703) == part_positions[0][1:]
-    assert (1703, 3587) == part_positions[1][1:]
 
 
-def test_skip_to_global_left_jump():
+def test_skip_to_global_left_jump(tmp_path):
     args = get_test_args(
+        tmp_path,
         input_path=base_path('samples/skip-to-left-test.nt'),
         target_size=500,
         search_type='jump',
@@ -94,8 +101,47 @@ def test_skip_to_global_left_jump():
     )
     part_positions = list(compute_parts(args))
 
-    assert 2 == len(part_positions)
+    # the non-global subjects after the global ones are left out
+    assert 1 == len(part_positions)
     assert (314, 1703) == part_positions[0][1:]
-    assert (1703, 3587) == part_positions[1][1:]
 
 
+def read_line_subjects(input_path):
+    # map the position of each line to the subject on that line
+    line_subjects = {}
+    with open(input_path, 'rb') as in_file:
+        for line in iter(in_file.readline, b''):
+            line_subjects[in_file.tell() - len(line)] = line.split(b'> <')[0]
+    return line_subjects
+
+
+def test_aligned_raw_parts_cover_global_subjects(tmp_path):
+    for sample, first_global_pos, region_end in [
+        ('right', 4615, 7735),
+        ('middle', 1834, 7462),
+        ('left', 314, 1703),
+    ]:
+        args = get_test_args(
+            tmp_path,
+            input_path=base_path(f'samples/skip-to-{sample}-test.nt'),
+            target_size=300,
+        )
+        with open(args.input_path, 'rb') as in_file:
+            aligned_parts = [
+                align_part(in_file, left, right, align_left, align_right)
+                for _, left, right, align_left, align_right
+                in compute_raw_parts(args)
+            ]
+
+        assert first_global_pos == aligned_parts[0][0]
+        assert region_end == aligned_parts[-1][1]
+
+        # parts are contiguous and no subject is split between parts
+        line_subjects = read_line_subjects(args.input_path)
+        line_positions = sorted(line_subjects)
+        for (_, right), (left, _) in zip(aligned_parts, aligned_parts[1:]):
+            assert right == left
+            if left == right or right == region_end:
+                continue
+            previous_line = line_positions[line_positions.index(right) - 1]
+            assert line_subjects[previous_line] != line_subjects[right]
@@ -0,0 +1,46 @@
+import csv
+import json
+
+from dbpedia.tests.test_graph_elements import run_preloader
+from dbpedia.tests.test_synthetic import generate
+
+
+def test_dictionary_ids_decode_to_the_plain_output(tmp_path):
+    input_path = tmp_path / 'synthetic.nt'
+    input_path.write_bytes(generate(tmp_path, '--size', '2e5', '--leading-size', '2e4'))
+    run_args = {'input_path': str(input_path), 'target_size': 50000}
+    vertices, edges = run_preloader(tmp_path / 'plain', **run_args)
+    encoded_vertices, encoded_edges = run_preloader(
+        tmp_path / 'encoded', dictionary_encode=True, **run_args
+    )
+
+    with open(tmp_path / 'encoded' / 'dictionary.tsv', newline='') as dictionary_file:
+        dictionary = {
+            int(uri_id): uri
+            for uri_id, uri in list(csv.reader(dictionary_file, delimiter='\t'))[1:]
+        }
+    assert list(range(len(dictionary))) == list(dictionary)
+
+    decoded_vertices = []
+    for line in encoded_vertices.splitlines():
+        vertex = json.loads(line)
+        decoded_vertices.append({**vertex, 'id': dictionary[vertex['id']]})
+    assert [json.loads(line) for line in vertices.splitlines()] == decoded_vertices
+
+    decoded_edges = []
+    for line in encoded_edges.splitlines():
+        edge = json.loads(line)
+        decoded_edges.append({
+            **edge,
+            'outv': dictionary[edge['outv']],
+            'inv': dictionary[edge['inv']],
+        })
+    assert [json.loads(line) for line in edges.splitlines()] == decoded_edges
+    assert len(encoded_edges) < len(edges)
+
+    # subjects come first, in input order
+    report = json.loads((tmp_path / 'encoded' / 'run-report.json').read_text())
+    subject_count = report['dictionary']['subjects']
+    subjects = [dictionary[uri_id] for uri_id in range(subject_count)]
+    assert sorted(subjects) == subjects
+    assert len(dictionary) == report['dictionary']['ids'] > subject_count
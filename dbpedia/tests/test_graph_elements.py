@@ -0,0 +1,191 @@
+import bz2
+import glob
+import gzip
+import json
+import os
+import signal
+
+import pytest
+
+from dbpedia.graph_elements import (
+    NamespacePrefixer,
+    make_graph_elements,
+    transform_part,
+)
+from dbpedia.ledger import ResumeError
+from dbpedia.preloader import parse_arguments
+from dbpedia.utils import base_path
+
+GLOBAL_ID_MARKER = 'id.dbpedia.org/global/'
+SAMPLE_PATH = base_path('samples/skip-to-right-test.nt')
+
+
+def read_output(part_name):
+    return [
+        open(f'{part_name}_{kind}.jsonl', encoding='utf8').readlines()
+        for kind in ('vertices', 'edges')
+    ]
+
+
+def run_preloader(
+        output_dir,
+        target_size=300,
+        input_path=base_path('samples/skip-to-middle-test.nt'),
+        **kwargs
+):
+    os.makedirs(output_dir, exist_ok=True)
+    args = parse_arguments(
+        [],
+        input_path=input_path,
+        output_dir=str(output_dir),
+        target_size=target_size,
+        **kwargs
+    )
+    make_graph_elements(args)
+
+    # all vertices and edges, in part order
+    return [
+        b''.join(
+            open(path, 'rb').read()
+            for path in sorted(glob.glob(f'{output_dir}/part-*_{kind}.jsonl'))
+        )
+        for kind in ('vertices', 'edges')
+    ]
+
+
+def test_transform_part_appends_to_existing_files(tmp_path):
+    part_name = str(tmp_path / 'part-001')
+
+    transform_part(SAMPLE_PATH, GLOBAL_ID_MARKER, part_name, 4615, 7243)
+    vertices, edges = read_output(part_name)
+    assert 1 == len(vertices)
+    assert 4 == len(edges)
+
+    transform_part(SAMPLE_PATH, GLOBAL_ID_MARKER, part_name, 4615, 7243)
+    assert [vertices * 2, edges * 2] == read_output(part_name)
+
+
+def test_qname_uses_longest_namespace():
+    prefixer = NamespacePrefixer({
+        'http://dbpedia.org/': 'dbp',
+        'http://dbpedia.org/ontology/': 'dbo',
+        'http://www.w3.org/2002/07/owl#': 'owl',
+    })
+
+    assert 'dbo:birthPlace' == prefixer.qname('http://dbpedia.org/ontology/birthPlace')
+    assert 'dbp:resource/Foo/Bar' == prefixer.qname('http://dbpedia.org/resource/Foo/Bar')
+    assert 'dbg:1rUej' == prefixer.qname('http://id.dbpedia.org/global/1rUej')
+    assert 'owl:sameAs' == prefixer.qname('http://www.w3.org/2002/07/owl#sameAs')
+    assert 'http://example.org/a' == prefixer.qname('http://example.org/a')
+    assert 'no namespace' == prefixer.qname('no namespace')
+
+
+def test_qname_cache_follows_namespace_changes():
+    prefixer = NamespacePrefixer({'http://dbpedia.org/': 'dbp'})
+    assert 'dbp:ontology/name' == prefixer.qname('http://dbpedia.org/ontology/name')
+
+    prefixer['http://dbpedia.org/ontology/'] = 'dbo'
+    assert 'dbo:name' == prefixer.qname('http://dbpedia.org/ontology/name')
+
+    del prefixer['http://dbpedia.org/ontology/']
+    assert 'dbp:ontology/name' == prefixer.qname('http://dbpedia.org/ontology/name')
+
+
+def test_workers_can_align_their_own_parts(tmp_path):
+    aligned_output = run_preloader(tmp_path / 'aligned', align_in_workers=True)
+    assert run_preloader(tmp_path / 'computed') == aligned_output
+    assert all(aligned_output)
+
+
+@pytest.mark.parametrize('compress', [bz2.compress, gzip.compress])
+def test_compressed_input_gives_the_same_output(tmp_path, compress):
+    sample_bytes = open(base_path('samples/skip-to-middle-test.nt'), 'rb').read()
+    input_path = tmp_path / 'sorted.nt.compressed'
+    # independent streams that don't end on line breaks
+    input_path.write_bytes(b''.join(
+        compress(sample_bytes[start:start + 2000])
+        for start in range(0, len(sample_bytes), 2000)
+    ))
+
+    compressed_output = run_preloader(tmp_path / 'compressed', input_path=str(input_path))
+    assert run_preloader(tmp_path / 'plain') == compressed_output
+    assert os.path.exists(f'{input_path}.blocks')
+
+
+def test_resume_only_transforms_unfinished_parts(tmp_path, capsys):
+    expected_output = run_preloader(tmp_path / 'expected')
+
+    output_dir = tmp_path / 'resumed'
+    run_preloader(output_dir)
+    ledger_path = output_dir / 'parts-ledger.json'
+    ledger_data = json.loads(ledger_path.read_text())
+    finished_part, crashed_part = [part['name'] for part in ledger_data['parts'][:2]]
+
+    # pretend the run crashed while transforming the second part
+    ledger_data['parts'][1]['status'] = 'pending'
+    ledger_path.write_text(json.dumps(ledger_data))
+    with open(f'{crashed_part}_edges.jsonl', 'a') as edge_file:
+        edge_file.write('{"outv": "half an edge')
+
+    capsys.readouterr()
+    assert expected_output == run_preloader(output_dir, resume=True)
+    stdout = capsys.readouterr().out
+    assert f'starting {finished_part}:' not in stdout
+    assert f'starting {crashed_part}:' in stdout
+
+    predicate_counts = json.loads((output_dir / 'predicate-counts.json').read_text())
+    byte_counts = json.loads((output_dir / 'byte-counts.json').read_text())
+    assert len(ledger_data['parts']) == len(predicate_counts) == len(byte_counts)
+
+
+def test_resume_refuses_other_partitioning(tmp_path):
+    run_preloader(tmp_path)
+    with pytest.raises(ResumeError):
+        run_preloader(tmp_path, resume=True, target_size=400)
+
+
+def test_resume_refuses_other_output_format(tmp_path):
+    run_preloader(tmp_path)
+    with pytest.raises(ResumeError):
+        run_preloader(tmp_path, resume=True, format='csv')
+
+
+def test_run_report_sums_part_metrics(tmp_path):
+    vertices, edges = run_preloader(tmp_path, profile=True)
+
+    report = json.loads((tmp_path / 'run-report.json').read_text())
+    assert {'partitioning', 'transform'} == set(report['phases'])
+    summary, part_metrics = report['parts'], report['part_metrics']
+    assert len(part_metrics) == summary['parts'] > 1
+    assert vertices.count(b'\n') == summary['vertices']
+    assert edges.count(b'\n') == summary['edges']
+    assert len(vertices) + len(edges) == summary['bytes_out']
+    input_size = os.path.getsize(base_path('samples/skip-to-middle-test.nt'))
+    part_ranges = [line.split('\t')[1:] for line in open(tmp_path / 'parts.tsv')]
+    assert summary['bytes_in'] == sum(
+        min(int(right), input_size) - int(left) for left, right in part_ranges
+    )
+
+    for part_name, metrics in part_metrics.items():
+        stages = metrics['stages']
+        stage_time = stages['read']['wall_time'] + stages['parse_transform_serialize']['wall_time']
+        assert stage_time == pytest.approx(metrics['wall_time'], abs=0.01)
+        if stages['parse']['wall_time'] is not None:
+            split_time = sum(stages[stage]['wall_time']
+                             for stage in ('parse', 'transform', 'serialize'))
+            assert split_time == pytest.approx(stages['parse_transform_serialize']['wall_time'])
+        assert os.path.exists(f'{part_name}_profile.folded')
+
+
+def test_stages_are_only_sampled_with_profile(tmp_path, monkeypatch):
+    monkeypatch.setattr(signal, 'setitimer', None)
+    run_preloader(tmp_path)
+
+    report = json.loads((tmp_path / 'run-report.json').read_text())
+    for part_name, metrics in report['part_metrics'].items():
+        for stage in ('parse', 'transform', 'serialize'):
+            assert metrics['stages'][stage] == {'wall_time': None, 'cpu_time': None}
+        assert metrics['stages']['parse_transform_serialize']['wall_time'] > 0.0
+    for stage in ('parse', 'transform', 'serialize'):
+        assert report['parts']['stages'][stage] == {'wall_time': None, 'cpu_time': None}
+        assert not os.path.exists(f'{part_name}_profile.folded')
@@ -0,0 +1,150 @@
+import io
+import mmap
+
+import pytest
+
+from rdflib.plugins.parsers.ntriples import NTriplesParser
+
+from dbpedia.graph_elements import transform_part
+from dbpedia.ntriples import (
+    RDFLIB_PARSER_TYPE,
+    TO_PYTHON,
+    NTriplesTokenizer,
+    iter_line_chunks,
+    iter_line_ranges,
+)
+from dbpedia.utils import base_path
+
+GLOBAL_ID_MARKER = 'id.dbpedia.org/global/'
+EDGE_CASES = r'''
+# a comment
+<http://id.dbpedia.org/global/1> <http://dbpedia.org/ontology/abstract> "say \"hi\"\n\\o/ é\U0001F600"@en-GB .
+<http://id.dbpedia.org/global/1> <http://dbpedia.org/ontology/birthDate> "1963-8-28"^^<http://www.w3.org/2001/XMLSchema#date> .
+<http://id.dbpedia.org/global/1> <http://dbpedia.org/ontology/deathDate> "1993-08-28"^^<http://www.w3.org/2001/XMLSchema#date> .
+<http://id.dbpedia.org/global/1> <http://dbpedia.org/ontology/height> "1.85E0"^^<http://www.w3.org/2001/XMLSchema#double> .
+<http://id.dbpedia.org/global/1> <http://dbpedia.org/ontology/rank> "007"^^<http://www.w3.org/2001/XMLSchema#integer> .
+<http://id.dbpedia.org/global/1> <http://dbpedia.org/ontology/seed> "seven"^^<http://www.w3.org/2001/XMLSchema#integer> .
+<http://id.dbpedia.org/global/1> <http://dbpedia.org/ontology/area> "12.5"^^<http://dbpedia.org/datatype/squareKilometre> .
+<http://id.dbpedia.org/global/1> <http://dbpedia.org/ontology/motto> "a \"quoted\" motto"^^<http://dbpedia.org/datatype/text> .
+<http://id.dbpedia.org/global/1> <http://dbpedia.org/ontology/name>	"plain"	.
+<http://id.dbpedia.org/global/1> <http://www.w3.org/2002/07/owl#sameAs> <http://id.dbpedia.org/global/1> .
+<http://id.dbpedia.org/global/1> <http://www.w3.org/2002/07/owl#sameAs> "http://id.dbpedia.org/global/1" .
+<http://id.dbpedia.org/global/1> <http://xmlns.com/foaf/0.1/page> <http://example.org/café> .
+'''.lstrip()
+
+
+class RecordingSink:
+
+    def __init__(self):
+        self.triples = []
+
+    def triple(self, subj, pred, obj):
+        language = getattr(obj, 'language', None)
+        datatype = getattr(obj, 'datatype', None)
+        datatype = datatype and str(datatype)
+        value = obj.toPython() if datatype or language else obj
+        self.triples.append((
+            str(subj),
+            str(pred),
+            # rdflib normalizes the lexical form of typed literals it can
+            # convert, but only their python value ends up in the output
+            None if datatype in TO_PYTHON else str(obj),
+            str if isinstance(value, str) else type(value),
+            str(value),
+            language,
+            datatype,
+            datatype and obj.n3(),
+        ))
+
+
+def tokenize(nt_bytes):
+    tokenizer = NTriplesTokenizer(sink=RecordingSink())
+    return tokenizer.parse(nt_bytes.splitlines()).triples
+
+
+def rdflib_parse(nt_bytes):
+    ntp = NTriplesParser(sink=RecordingSink())
+    ntp.parsestring(nt_bytes.decode('utf8'))
+    return ntp.sink.triples
+
+
+def test_tokenizer_matches_rdflib_on_edge_cases():
+    nt_bytes = EDGE_CASES.encode('utf8')
+    assert rdflib_parse(nt_bytes) == tokenize(nt_bytes)
+
+
+def test_tokenizer_matches_rdflib_on_samples():
+    for sample in ('left', 'middle', 'right'):
+        with open(base_path(f'samples/skip-to-{sample}-test.nt'), 'rb') as nt_file:
+            nt_bytes = nt_file.read()
+        # skip the malformed lines that precede the global subjects
+        nt_bytes = nt_bytes[nt_bytes.index(b'<http://id.dbpedia.org/global/'):]
+        assert rdflib_parse(nt_bytes) == tokenize(nt_bytes)
+
+
+def test_transform_part_output_matches_rdflib(tmp_path):
+    input_path = tmp_path / 'edge-cases.nt'
+    input_path.write_bytes(EDGE_CASES.encode('utf8'))
+
+    outputs = {}
+    for parser_type in ('fast', RDFLIB_PARSER_TYPE):
+        part_name = str(tmp_path / f'part-{parser_type}')
+        transform_part(
+            str(input_path),
+            GLOBAL_ID_MARKER,
+            part_name,
+            0,
+            input_path.stat().st_size,
+            parser_type=parser_type,
+        )
+        outputs[parser_type] = [
+            open(f'{part_name}_{kind}.jsonl', 'rb').read()
+            for kind in ('vertices', 'edges')
+        ]
+
+    assert outputs['fast'] == outputs[RDFLIB_PARSER_TYPE]
+
+
+def test_parse_range_reads_lines_in_place():
+    with open(base_path('samples/skip-to-right-test.nt'), 'rb') as nt_file:
+        with mmap.mmap(nt_file.fileno(), 0, access=mmap.ACCESS_READ) as nt_map:
+            tokenizer = NTriplesTokenizer(sink=RecordingSink())
+            triples = tokenizer.parse_range(nt_map, 4615, 7243).triples
+            assert tokenize(nt_map[4615:7243]) == triples
+
+
+@pytest.mark.parametrize('read_size', [10, 1000, 2 ** 22])
+def test_line_ranges_match_line_chunks(read_size):
+    with open(base_path('samples/skip-to-right-test.nt'), 'rb') as nt_file:
+        nt_bytes = nt_file.read()
+    line_ranges = list(iter_line_ranges(nt_bytes, 4615, len(nt_bytes) + 10, read_size))
+    line_chunks = list(iter_line_chunks(io.BytesIO(nt_bytes), 4615, len(nt_bytes), read_size))
+    lines = [nt_bytes[start:end] for start, end in line_ranges]
+    assert b''.join(lines) == b''.join(line_chunks)
+    assert all(line.endswith(b'\n') for line in lines)
+
+    class TermSink:
+        def __init__(self):
+            self.terms = []
+
+        def triple(self, subj, pred, obj):
+            self.terms.append((
+                subj, pred, getattr(obj, 'language', None), getattr(obj, 'datatype', None)
+            ))
+
+    nt_bytes = EDGE_CASES.encode('utf8') * 2
+    terms = NTriplesTokenizer(sink=TermSink()).parse(nt_bytes.splitlines()).terms
+    first_half, second_half = terms[:len(terms) // 2], terms[len(terms) // 2:]
+    for first_terms, second_terms in zip(first_half, second_half):
+        assert first_terms == second_terms
+        for first_term, second_term in zip(first_terms, second_terms):
+            assert first_term is second_term or first_term is None
+
+
+def test_lines_of_other_subjects_are_skipped():
+    with open(base_path('samples/skip-to-middle-test.nt'), 'rb') as nt_file:
+        nt_bytes = nt_file.read()
+    # malformed lines before and lines with global objects after the global subjects
+    tokenizer = NTriplesTokenizer(RecordingSink(), subject_marker=GLOBAL_ID_MARKER.encode())
+    triples = tokenizer.parse_range(nt_bytes, 0, len(nt_bytes)).triples
+    assert tokenize(nt_bytes[1834:7462]) == triples
@@ -0,0 +1,29 @@
+import io
+
+from dbpedia.progress import LOG_PROGRESS, ProgressReporter
+from dbpedia.tests.test_graph_elements import run_preloader
+
+
+def test_parts_start_over_when_reset():
+    log_file = io.StringIO()
+    with ProgressReporter(1000, LOG_PROGRESS, log_interval=60, file=log_file) as progress:
+        progress.update('part-001', 300, 10)
+        progress.update('part-002', 200, 5)
+        progress.update('part-001', 500, 20)
+        progress.reset('part-002')
+        progress.update('part-002', 100, 2)
+        assert (600, 22) == (progress.bytes_read, progress.triples)
+        assert '' == log_file.getvalue()
+
+    assert log_file.getvalue().startswith('progress: 60.0% (600 of 1000 bytes), 22 triples')
+
+
+def test_parallel_progress_reaches_all_bytes(tmp_path, capsys):
+    run_preloader(tmp_path, parallel=True, workers=2, progress=LOG_PROGRESS, progress_interval=0)
+
+    log_lines = [
+        line for line in capsys.readouterr().err.splitlines()
+        if line.startswith('progress: ')
+    ]
+    assert len(log_lines) > 2
+    assert log_lines[-1].startswith('progress: 100.0%')
@@ -0,0 +1,143 @@
+import csv
+import glob
+import json
+import struct
+
+import pytest
+
+from dbpedia.same_as import DiskUnionFind, merge_vertices
+from dbpedia.tests.test_graph_elements import run_preloader
+from dbpedia.tests.test_synthetic import generate
+from dbpedia.writers import unpack_record
+
+OWL_SAME_AS = 'http://www.w3.org/2002/07/owl#sameAs'
+GLOBAL = 'http://id.dbpedia.org/global/'
+NAME = 'http://xmlns.com/foaf/0.1/name'
+HEIGHT = 'http://dbpedia.org/ontology/height'
+LINKED_VERTICES = f"""\
+<{GLOBAL}A> <{NAME}> "A"@en .
+<{GLOBAL}A> <{NAME}> "Ä"@de .
+<{GLOBAL}A> <{OWL_SAME_AS}> <{GLOBAL}B> .
+<{GLOBAL}B> <{NAME}> "A"@en .
+<{GLOBAL}B> <{NAME}> "B"@fr .
+<{GLOBAL}B> <{HEIGHT}> "1.5" .
+<{GLOBAL}C> <{NAME}> "C"@en .
+"""
+
+
+def test_clusters_are_rooted_at_their_smallest_id(tmp_path):
+    links = [('d', 'b'), ('e', 'd'), ('f', 'c'), ('c', 'a'), ('g', 'e'), ('y', 'x')]
+    # a tiny cache and filter, so that parents are stored and looked up
+    with DiskUnionFind(str(tmp_path / 'clusters.db'), cache_size=2, filter_size=64) as union_find:
+        for node, other in links:
+            union_find.union(node, other)
+        union_find.resolve()
+
+        assert ['a', 'b', 'b', 'a', 'b', 'x', 'z'] == [
+            union_find.root(node) for node in 'cdefgyz'
+        ]
+        assert [
+            ('c', 'a'), ('f', 'a'), ('d', 'b'), ('e', 'b'), ('g', 'b'), ('y', 'x'),
+        ] == list(union_find.members())
+
+
+def test_same_as_links_are_replaced_by_canonical_ids(tmp_path):
+    input_path = tmp_path / 'synthetic.nt'
+    input_path.write_bytes(generate(
+        tmp_path, '--size', '2e5', '--leading-size', '2e4', '--same-as-density', '10'
+    ))
+    run_args = {'input_path': str(input_path), 'target_size': 50000}
+    vertices, edges = run_preloader(tmp_path / 'plain', **run_args)
+    clustered_vertices, clustered_edges = run_preloader(
+        tmp_path / 'clustered', cluster_same_as=True, **run_args
+    )
+
+    with open(tmp_path / 'clustered' / 'same-as-mapping.tsv', newline='') as mapping_file:
+        mapping = dict(list(csv.reader(mapping_file, delimiter='\t'))[1:])
+    assert mapping
+    assert all(canonical_id < node for node, canonical_id in mapping.items())
+
+    # the vertices of a cluster are merged into one, after all others
+    roots = set(mapping.values())
+    expected_vertices, cluster_vertices = [], {}
+    for line in vertices.splitlines():
+        vertex = json.loads(line)
+        canonical_id = mapping.get(vertex['id'], vertex['id'])
+        if canonical_id in roots:
+            cluster_vertices.setdefault(canonical_id, []).append(vertex)
+        else:
+            expected_vertices.append(vertex)
+    expected_vertices.extend(
+        merge_vertices(root, cluster_vertices[root]) for root in sorted(cluster_vertices)
+    )
+    clustered_vertices = [json.loads(line) for line in clustered_vertices.splitlines()]
+    assert expected_vertices == clustered_vertices
+    vertex_ids = [vertex['id'] for vertex in clustered_vertices]
+    assert len(vertex_ids) == len(set(vertex_ids))
+
+    # links within clusters are gone, other edges point to canonical IDs
+    expected_edges = []
+    for line in edges.splitlines():
+        edge = json.loads(line)
+        outv, inv = (mapping.get(edge[end], edge[end]) for end in ('outv', 'inv'))
+        if edge['label'] == OWL_SAME_AS:
+            assert outv == inv
+        else:
+            expected_edges.append({**edge, 'outv': outv, 'inv': inv})
+    assert expected_edges == [json.loads(line) for line in clustered_edges.splitlines()]
+
+    report = json.loads((tmp_path / 'clustered' / 'run-report.json').read_text())
+    assert len(mapping) == report['same_as']['replaced_ids']
+    assert len(cluster_vertices) == report['same_as']['merged_vertices']
+
+
+def test_linked_vertices_are_merged(tmp_path):
+    input_path = tmp_path / 'linked.nt'
+    input_path.write_text(LINKED_VERTICES, encoding='utf8')
+    vertices, edges = run_preloader(
+        tmp_path, input_path=str(input_path), cluster_same_as=True
+    )
+
+    assert b'' == edges
+    assert [
+        {'id': f'{GLOBAL}C', NAME: [{'value': 'C', 'language': 'en'}]},
+        {
+            'id': f'{GLOBAL}A',
+            NAME: [
+                {'value': 'A', 'language': 'en'},
+                {'value': 'Ä', 'language': 'de'},
+                {'value': 'B', 'language': 'fr'},
+            ],
+            HEIGHT: '1.5',
+        },
+    ] == [json.loads(line) for line in vertices.splitlines()]
+
+
+def read_vertex_ids(path, output_format):
+    if output_format == 'csv':
+        with open(path, encoding='utf8', newline='') as vertex_file:
+            # a row per property value, after the header
+            return [row[0] for row in list(csv.reader(vertex_file))[1:]]
+
+    data = open(path, 'rb').read()
+    vertex_ids, cursor = [], 0
+    while cursor < len(data):
+        length, = struct.unpack_from('<I', data, cursor)
+        vertex_ids.append(unpack_record(data[cursor + 4:cursor + 4 + length])['id'])
+        cursor += 4 + length
+    return vertex_ids
+
+
+@pytest.mark.parametrize('output_format, a_records', [('csv', 4), ('binary', 1)])
+def test_linked_vertices_are_merged_in_every_format(tmp_path, output_format, a_records):
+    input_path = tmp_path / 'linked.nt'
+    input_path.write_text(LINKED_VERTICES, encoding='utf8')
+    run_preloader(
+        tmp_path, input_path=str(input_path), cluster_same_as=True, format=output_format
+    )
+
+    vertex_ids = sum((
+        read_vertex_ids(path, output_format)
+        for path in sorted(glob.glob(str(tmp_path / 'part-*_vertices.*')))
+    ), [])
+    assert [f'{GLOBAL}C'] + [f'{GLOBAL}A'] * a_records == vertex_ids
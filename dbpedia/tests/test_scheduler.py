@@ -0,0 +1,78 @@
+import json
+import os
+import time
+
+import pytest
+
+from dbpedia import graph_elements, scheduler
+from dbpedia.graph_elements import transform_part
+from dbpedia.scheduler import PartFailedError
+from dbpedia.tests.test_graph_elements import run_preloader
+
+
+def slow_transform_part(*task_args, **task_kwargs):
+    _, _, part_name, left, right, *_ = task_args
+    if right - left > 1000:
+        time.sleep(60)
+    return transform_part(*task_args, **task_kwargs)
+
+
+def flaky_transform_part(*task_args, **task_kwargs):
+    part_name = task_args[2]
+    if not os.path.exists(f'{part_name}.failed'):
+        open(f'{part_name}.failed', 'w').close()
+        raise RuntimeError(f'{part_name} fails once')
+    return transform_part(*task_args, **task_kwargs)
+
+
+def failing_transform_part(*task_args, **task_kwargs):
+    part_name = task_args[2]
+    if part_name.endswith('part-002'):
+        raise RuntimeError(f'{part_name} always fails')
+    return transform_part(*task_args, **task_kwargs)
+
+
+def test_parallel_output_is_serial_output(tmp_path):
+    serial_output = run_preloader(tmp_path / 'serial')
+    assert serial_output == run_preloader(tmp_path / 'parallel', parallel=True, workers=3)
+
+
+def test_parts_that_keep_timing_out_are_split(tmp_path, monkeypatch):
+    expected_output = run_preloader(tmp_path / 'expected')
+
+    monkeypatch.setattr(graph_elements, 'transform_part', slow_transform_part)
+    monkeypatch.setattr(scheduler, 'MIN_SPLIT_SIZE', 500)
+    output_dir = tmp_path / 'split'
+    split_output = run_preloader(
+        output_dir,
+        target_size=2000,
+        align_in_workers=True,
+        parallel=True,
+        workers=3,
+        task_timeout=0.5,
+    )
+    assert expected_output == split_output
+
+    ledger_data = json.loads((output_dir / 'parts-ledger.json').read_text())
+    part_names = [os.path.basename(part['name']) for part in ledger_data['parts']]
+    assert ['part-001-1', 'part-001-2', 'part-002-1', 'part-002-2',
+            'part-003-1', 'part-003-2'] == part_names
+
+
+def test_failed_parts_are_retried(tmp_path, monkeypatch):
+    expected_output = run_preloader(tmp_path / 'expected')
+
+    monkeypatch.setattr(graph_elements, 'transform_part', flaky_transform_part)
+    assert expected_output == run_preloader(tmp_path / 'flaky', parallel=True)
+
+
+def test_retries_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(graph_elements, 'transform_part', failing_transform_part)
+    output_dir = tmp_path / 'failing'
+    with pytest.raises(PartFailedError, match='part-002'):
+        run_preloader(output_dir, parallel=True, max_retries=1)
+
+    ledger_data = json.loads((output_dir / 'parts-ledger.json').read_text())
+    statuses = {os.path.basename(part['name']): part['status'] for part in ledger_data['parts']}
+    assert 'pending' == statuses.pop('part-002')
+    assert {'done'} == set(statuses.values())
@@ -0,0 +1,32 @@
+import random
+
+import pytest
+
+from dbpedia import sort
+from dbpedia.tests.test_synthetic import generate
+
+
+@pytest.mark.parametrize('max_fan_in', [2, sort.MAX_MERGE_FAN_IN])
+def test_shuffled_triples_are_sorted_back(tmp_path, monkeypatch, max_fan_in):
+    monkeypatch.setattr(sort, 'MAX_MERGE_FAN_IN', max_fan_in)
+    triples = generate(tmp_path, '--size', '2e5', '--leading-size', '2e4')
+    lines = triples.splitlines(keepends=True)
+    random.Random(0).shuffle(lines)
+    input_path = tmp_path / 'shuffled.nt'
+    # without a line break at the end
+    input_path.write_bytes(b''.join(lines)[:-1])
+
+    output_path = tmp_path / 'sorted.nt'
+    size = sort.sort_triples(str(input_path), str(output_path), workers=3, run_size=20000)
+    assert triples == output_path.read_bytes()
+    assert len(triples) == size
+
+
+def test_first_line_is_found_in_runs(tmp_path):
+    run_path = tmp_path / 'run'
+    run_path.write_bytes(b'a\nbb\nbb\ncccc\nd\n')
+    with open(run_path, 'rb') as run_file:
+        assert [0, 2, 8, 13, 15] == [
+            sort.find_first_line(run_file, 15, key)
+            for key in (b'a', b'bb\n', b'c', b'd', b'e')
+        ]
@@ -0,0 +1,74 @@
+import json
+from collections import Counter, defaultdict
+
+from dbpedia.ntriples import NTriplesTokenizer
+from dbpedia.statistics import HyperLogLog, hash64
+from dbpedia.tests.test_graph_elements import GLOBAL_ID_MARKER, run_preloader
+from dbpedia.tests.test_synthetic import generate
+
+
+class TripleList(list):
+
+    def triple(self, subj, pred, obj):
+        self.append((subj, pred, obj))
+
+
+def test_merged_sketches_equal_the_sketch_of_all_values():
+    sketches = [HyperLogLog(), HyperLogLog(), HyperLogLog()]
+    all_values = HyperLogLog()
+    for number in range(20000):
+        value_hash = hash64(f'value-{number}')
+        # a sparse, a small and a large sketch
+        sketches[0 if number < 10 else 1 if number < 100 else 2].add_hash(value_hash)
+        all_values.add_hash(value_hash)
+
+    merged = HyperLogLog.from_json(sketches[0].to_json())
+    for sketch in sketches[1:]:
+        merged.merge(HyperLogLog.from_json(sketch.to_json()))
+    assert all_values.dense_registers() == merged.dense_registers()
+    assert abs(merged.estimate() - 20000) < 20000 * 0.05
+    assert [10, 90] == [sketch.estimate() for sketch in sketches[:2]]
+
+
+def test_predicate_statistics_match_the_input(tmp_path):
+    input_path = tmp_path / 'synthetic.nt'
+    input_path.write_bytes(generate(tmp_path, '--size', '2e5', '--leading-size', '2e4'))
+    run_preloader(
+        tmp_path / 'output',
+        target_size=50000,
+        input_path=str(input_path),
+        predicate_statistics=True,
+    )
+    with open(tmp_path / 'output' / 'predicate-statistics.json') as statistics_file:
+        statistics = json.load(statistics_file)
+
+    triples = NTriplesTokenizer(
+        TripleList(), subject_marker=GLOBAL_ID_MARKER.encode('utf8')
+    ).parse(input_path.read_bytes().splitlines(keepends=True))
+    predicates = defaultdict(list)
+    for subj, pred, obj in triples:
+        predicates[str(pred)].append((subj, obj))
+    assert sorted(predicates) == sorted(statistics)
+
+    for pred, pairs in predicates.items():
+        pred_statistics = statistics[pred]
+        assert len(pairs) == pred_statistics['triples']
+        assert len(pairs) == sum(pred_statistics['object_kinds'].values())
+        assert Counter(
+            str(obj.datatype) for _, obj in pairs if getattr(obj, 'datatype', None)
+        ) == pred_statistics['datatypes']
+        assert Counter(
+            obj.language for _, obj in pairs if getattr(obj, 'language', None)
+        ) == pred_statistics['languages']
+        assert max(Counter(subj for subj, _ in pairs).values()) \
+            == pred_statistics['max_values_per_subject']
+
+        for key, values in (
+                ('distinct_subjects', {subj for subj, _ in pairs}),
+                ('distinct_objects', {obj for _, obj in pairs}),
+        ):
+            assert abs(pred_statistics[key] - len(values)) <= len(values) * 0.05 + 1
+    edge_count = sum(
+        pred_statistics['object_kinds'].get('edge', 0) for pred_statistics in statistics.values()
+    )
+    assert sum(GLOBAL_ID_MARKER in obj for _, _, obj in triples) == edge_count
@@ -0,0 +1,80 @@
+import io
+import shutil
+
+from dbpedia.compute_parts import compute_parts
+from dbpedia.graph_elements import transform_part
+from dbpedia.preloader import parse_arguments
+from dbpedia.subject_index import SubjectIndex, build_subject_index
+from dbpedia.subjects import lookup_subject
+from dbpedia.utils import base_path
+
+GLOBAL_ID_MARKER = 'id.dbpedia.org/global/'
+
+
+def copy_sample(tmp_path, sample='middle'):
+    input_path = str(tmp_path / f'skip-to-{sample}-test.nt')
+    shutil.copy(base_path(f'samples/skip-to-{sample}-test.nt'), input_path)
+    return input_path
+
+
+def test_seek_subject_in_full_and_sparse_index(tmp_path):
+    input_path = copy_sample(tmp_path)
+    index_path = f'{input_path}.idx'
+
+    assert 3 == build_subject_index(input_path, index_path, GLOBAL_ID_MARKER, 0)
+    with SubjectIndex.open(index_path, input_path) as subject_index:
+        assert [1834, 6236, 6949] == [offset for _, offset in subject_index]
+        assert 6236 == subject_index.seek_subject(b'<http://id.dbpedia.org/global/1rUek>')
+        assert 6236 == subject_index.seek_subject(b'<http://id.dbpedia.org/global/1rUeka>')
+        assert 6949 == subject_index.seek_subject(b'<http://id.dbpedia.org/global/zzz>')
+        assert subject_index.seek_subject(b'<http://commons.wikimedia.org/>') is None
+
+    assert 2 == build_subject_index(input_path, index_path, GLOBAL_ID_MARKER, 1000)
+    with SubjectIndex.open(index_path, input_path) as subject_index:
+        assert 6236 == subject_index.seek_subject(b'<http://id.dbpedia.org/global/1rUev>')
+
+
+def test_stale_index_is_ignored(tmp_path):
+    input_path = copy_sample(tmp_path)
+    index_path = f'{input_path}.idx'
+    build_subject_index(input_path, index_path, GLOBAL_ID_MARKER, 0)
+
+    with open(input_path, 'ab') as in_file:
+        in_file.write(b'\n')
+    assert SubjectIndex.open(index_path, input_path) is None
+
+
+def test_compute_parts_from_index(tmp_path):
+    input_path = copy_sample(tmp_path)
+    build_subject_index(input_path, f'{input_path}.idx', GLOBAL_ID_MARKER, 0)
+    args = parse_arguments(
+        [],
+        input_path=input_path,
+        output_dir=str(tmp_path),
+        target_size=500,
+    )
+
+    part_positions = [part[1:] for part in compute_parts(args)]
+    assert [(1834, 6236), (6236, 6949), (6949, 7462)] == part_positions
+
+
+def test_lookup_subject_matches_transformed_part(tmp_path):
+    input_path = copy_sample(tmp_path)
+    build_subject_index(input_path, f'{input_path}.idx', GLOBAL_ID_MARKER, 1000)
+
+    part_name = str(tmp_path / 'part-001')
+    transform_part(input_path, GLOBAL_ID_MARKER, part_name, 6236, 6949)
+    expected_output = ''.join(
+        open(f'{part_name}_{kind}.jsonl', encoding='utf8').read()
+        for kind in ('vertices', 'edges')
+    )
+
+    out_stream = io.StringIO()
+    lookup_subject(
+        input_path,
+        f'{input_path}.idx',
+        '1rUek',
+        GLOBAL_ID_MARKER,
+        out_stream,
+    )
+    assert expected_output == out_stream.getvalue()
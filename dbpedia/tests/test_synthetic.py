@@ -0,0 +1,52 @@
+import io
+import json
+
+from dbpedia import benchmark
+from dbpedia.compute_parts import seek_first_global_subject
+from dbpedia.preloader import parse_arguments
+from dbpedia.synthetic import arg_parser, write_synthetic_triples
+
+
+def generate(tmp_path, *options):
+    args = arg_parser.parse_args([str(tmp_path / 'synthetic.nt'), *options])
+    out_file = io.BytesIO()
+    write_synthetic_triples(out_file, args)
+    return out_file.getvalue()
+
+
+def test_synthetic_triples_are_sorted_and_reproducible(tmp_path):
+    options = ['--size', '3e5', '--leading-size', '5e4', '--heavy-subject-rate', '0.05']
+    triples = generate(tmp_path, *options)
+    assert triples == generate(tmp_path, *options)
+    assert triples != generate(tmp_path, *options, '--seed', '1')
+
+    lines = triples.splitlines(keepends=True)
+    assert sorted(lines) == lines
+    assert len(lines) == len(set(lines))
+
+    # the first global subject follows the leading bytes
+    first_global_pos = triples.find(b'<http://id.dbpedia.org/global/')
+    assert 5e4 <= first_global_pos < 5e4 + 1000
+
+    input_path = tmp_path / 'synthetic.nt'
+    input_path.write_bytes(triples)
+    args = parse_arguments([], input_path=str(input_path), output_dir=str(tmp_path))
+    with open(input_path, 'rb') as in_file:
+        assert first_global_pos == seek_first_global_subject(args, in_file, len(triples))
+
+
+def test_benchmark_report(tmp_path):
+    args = benchmark.arg_parser.parse_args([
+        '--size', '2e5',
+        '--leading-size', '2e4',
+        '--target-size', '5e4',
+        '--repeat', '2',
+        '--workers', '2',
+    ])
+    report = benchmark.run_benchmarks(args, str(tmp_path))
+
+    assert benchmark.BENCHMARK_NAMES == [result['name'] for result in report['results']]
+    for result in report['results']:
+        assert 2 == len(result['seconds'])
+        assert 0 < result['best'] <= result['median']
+    json.dumps(report)
@@ -0,0 +1,206 @@
+import csv
+import datetime
+import gzip
+import json
+import os
+import struct
+from decimal import Decimal
+
+import pytest
+
+from dbpedia import writers
+from dbpedia.graph_elements import transform_part
+from dbpedia.ntriples import Literal
+from dbpedia.utils import base_path
+from dbpedia.writers import (
+    BINARY_FORMAT,
+    CSV_FORMAT,
+    GZIP_COMPRESSION,
+    WRITE_BATCH_SIZE,
+    JSON_ENCODER,
+    JsonLinesWriter,
+    make_encode_json,
+    pack,
+    pack_record,
+    rewrite_ids,
+    unpack,
+    unpack_record,
+)
+
+GLOBAL_ID_MARKER = 'id.dbpedia.org/global/'
+SAMPLE_PATH = base_path('samples/skip-to-right-test.nt')
+RECORDS = [
+    {'id': 'dbg:1', 'name': 'x' * 40, 'height': 1.85, 'rank': 7, 'flag': True},
+    {'id': 'dbg:2', 'nothing': None, 'date': datetime.date(1963, 8, 28)},
+    {'id': 'dbg:3', 'area': Decimal('12.5'), 'motto': Literal('a motto', 'en')},
+    {'id': 'dbg:4', 'labels': [{'value': 'é' * 300, 'language': 'de'}] * 20},
+    [-1, -33, -200, -40000, -2 ** 40, 127, 200, 70000, 2 ** 40, 2 ** 64 - 1],
+    ['y' * 70000, list(range(70000)), {str(i): i for i in range(20)}],
+]
+
+
+def test_pack_matches_msgpack():
+    msgpack = pytest.importorskip('msgpack')
+    for record in RECORDS:
+        chunks = []
+        pack(record, chunks)
+        assert msgpack.packb(record, default=str, use_bin_type=True) == b''.join(chunks)
+
+
+def test_unpack_matches_msgpack():
+    msgpack = pytest.importorskip('msgpack')
+    for record in RECORDS + [{'blob': b'\x00' * 300}]:
+        payload = msgpack.packb(record, default=str, use_bin_type=True)
+        assert (msgpack.unpackb(payload, raw=False), len(payload)) == unpack(payload, 0)
+
+
+def test_pack_writes_huge_integers_as_strings():
+    assert pack_record(['1' * 30]) == pack_record([int('1' * 30)])
+
+
+def test_json_lines_match_json_dumps(tmp_path):
+    part_name = str(tmp_path / 'part-001')
+    vertices = [record for record in RECORDS if isinstance(record, dict)]
+    edges = [('dbg:1', 'dbo:birthPlace', 'dbg:\u00e9"\\'), ('dbg:2', 'dbo:team', 'dbg:3')]
+    writer = JsonLinesWriter.open(part_name, 2 ** 16)
+    for _ in range(WRITE_BATCH_SIZE):
+        for vertex in vertices:
+            writer.write_vertex(vertex)
+        writer.write_edges(edges)
+    writer.close()
+
+    with open(f'{part_name}_vertices.jsonl', encoding='utf8') as vertex_file:
+        assert vertex_file.read() == ''.join(
+            json.dumps(vertex, default=str) + '\n' for vertex in vertices
+        ) * WRITE_BATCH_SIZE
+    with open(f'{part_name}_edges.jsonl', encoding='utf8') as edge_file:
+        assert edge_file.read() == ''.join(
+            json.dumps({'outv': outv, 'label': label, 'inv': inv}) + '\n'
+            for outv, label, inv in edges
+        ) * WRITE_BATCH_SIZE
+
+
+@pytest.mark.parametrize('c_make_encoder', [
+    None,
+    lambda markers, default, encoder, indent: None,
+    lambda *args: lambda record, level: ['{}'],
+])
+def test_json_encoder_falls_back_to_the_public_one(c_make_encoder):
+    encode_json = make_encode_json(c_make_encoder)
+    assert encode_json == JSON_ENCODER.encode
+    for record in RECORDS:
+        assert json.dumps(record, default=str) == encode_json(record)
+
+
+def test_transform_part_to_csv(tmp_path):
+    part_name = str(tmp_path / 'part-001')
+    for _ in range(2):
+        transform_part(
+            SAMPLE_PATH,
+            GLOBAL_ID_MARKER,
+            part_name,
+            4615,
+            7243,
+            output_format=CSV_FORMAT,
+        )
+
+    with open(f'{part_name}_vertices.csv', encoding='utf8', newline='') as vertex_file:
+        vertex_rows = list(csv.reader(vertex_file))
+    with open(f'{part_name}_edges.csv', encoding='utf8', newline='') as edge_file:
+        edge_rows = list(csv.reader(edge_file))
+
+    # appending doesn't repeat the header
+    assert ['id', 'property', 'value', 'language'] == vertex_rows[0]
+    assert ['outv', 'label', 'inv'] == edge_rows[0]
+    assert 1 + 2 * 4 == len(edge_rows)
+    assert [
+        'http://id.dbpedia.org/global/1rUej',
+        'http://dbpedia.org/ontology/birthPlace',
+        'http://id.dbpedia.org/global/12Scvj',
+    ] == edge_rows[1]
+    assert [
+        'http://id.dbpedia.org/global/1rUej',
+        'http://xmlns.com/foaf/0.1/name',
+        'Strugl, Michael',
+        'de',
+    ] in vertex_rows
+
+
+def test_transform_part_to_binary(tmp_path):
+    part_name = str(tmp_path / 'part-001')
+    transform_part(
+        SAMPLE_PATH,
+        GLOBAL_ID_MARKER,
+        part_name,
+        4615,
+        7243,
+        output_format=BINARY_FORMAT,
+    )
+
+    with open(f'{part_name}_edges.bin', 'rb') as edge_file:
+        edge_bytes = edge_file.read()
+
+    records = []
+    cursor = 0
+    while cursor < len(edge_bytes):
+        length, = struct.unpack_from('<I', edge_bytes, cursor)
+        records.append(edge_bytes[cursor + 4:cursor + 4 + length])
+        cursor += 4 + length
+
+    assert 4 == len(records)
+    assert pack_record([
+        'http://id.dbpedia.org/global/1rUej',
+        'http://dbpedia.org/ontology/birthPlace',
+        'http://id.dbpedia.org/global/12Scvj',
+    ]) == records[0]
+
+
+def test_binary_ids_are_rewritten_without_msgpack(tmp_path, monkeypatch):
+    monkeypatch.setattr(writers, 'msgpack', None)
+    part_name = str(tmp_path / 'part-001')
+    transform_part(
+        SAMPLE_PATH,
+        GLOBAL_ID_MARKER,
+        part_name,
+        4615,
+        7243,
+        output_format=BINARY_FORMAT,
+    )
+    rewrite_ids(part_name, str.upper, str.upper, len, BINARY_FORMAT)
+
+    with open(f'{part_name}_edges.bin', 'rb') as edge_file:
+        length, = struct.unpack('<I', edge_file.read(4))
+        assert [
+            'HTTP://ID.DBPEDIA.ORG/GLOBAL/1RUEJ',
+            'http://dbpedia.org/ontology/birthPlace',
+            len('http://id.dbpedia.org/global/12Scvj'),
+        ] == unpack_record(edge_file.read(length))
+
+
+def test_transform_part_to_gzip(tmp_path):
+    plain_part = str(tmp_path / 'plain')
+    *_, plain_byte_counts, _ = transform_part(
+        SAMPLE_PATH, GLOBAL_ID_MARKER, plain_part, 4615, 7243
+    )
+
+    gzip_part = str(tmp_path / 'gzip')
+    for _ in range(2):
+        *_, byte_counts, _ = transform_part(
+            SAMPLE_PATH,
+            GLOBAL_ID_MARKER,
+            gzip_part,
+            4615,
+            7243,
+            output_compression=GZIP_COMPRESSION,
+            compress_level=1,
+        )
+
+    for kind in ('vertices', 'edges'):
+        plain_bytes = open(f'{plain_part}_{kind}.jsonl', 'rb').read()
+        gzip_path = f'{gzip_part}_{kind}.jsonl.gz'
+        # appending adds a gzip member
+        assert plain_bytes * 2 == gzip.decompress(open(gzip_path, 'rb').read())
+
+        assert len(plain_bytes) == plain_byte_counts[kind]['compressed']
+        assert len(plain_bytes) == byte_counts[kind]['uncompressed']
+        assert os.path.getsize(gzip_path) == 2 * byte_counts[kind]['compressed']
@@ -0,0 +1,515 @@
+import csv
+import gzip
+import io
+import json
+import os
+import struct
+import zlib
+from decimal import Decimal
+
+from dbpedia.compressed_input import GZIP_COMPRESSION, ZSTD_COMPRESSION
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSONL_FORMAT, CSV_FORMAT, BINARY_FORMAT = 'jsonl', 'csv', 'binary'
+FORMAT_CHOICES = [JSONL_FORMAT, CSV_FORMAT, BINARY_FORMAT]
+NO_COMPRESSION = 'none'
+COMPRESSION_CHOICES = [NO_COMPRESSION, GZIP_COMPRESSION, ZSTD_COMPRESSION]
+COMPRESSION_EXTENSIONS = {NO_COMPRESSION: '', GZIP_COMPRESSION: '.gz', ZSTD_COMPRESSION: '.zst'}
+DEFAULT_COMPRESS_LEVELS = {GZIP_COMPRESSION: 6, ZSTD_COMPRESSION: 3}
+OUTPUT_KINDS = ('vertices', 'edges')
+REWRITE_BUFFER_SIZE = 2 ** 20  # bytes
+WRITE_BATCH_SIZE = 1024  # records
+
+JSON_ENCODER = json.JSONEncoder(default=str, check_circular=False)
+# what the C encoder has to encode like the public one before it is used
+ENCODER_PROBE = {'id': 'a"\u00e9\\', 'values': [1, -2.5, None, True, {'x': []}], 'area': Decimal(1)}
+
+
+def make_encode_json(c_make_encoder=json.encoder.c_make_encoder):
+    # what `json.dumps(record, default=str)` writes, with the C encoder made
+    # once instead of on every call; its arguments are a CPython internal,
+    # so it is only used when it encodes like the public encoder
+    try:
+        encode_chunks = c_make_encoder(
+            None, str, json.encoder.encode_basestring_ascii, None,
+            ': ', ', ', False, False, True,
+        )
+        c_encoded = ''.join(encode_chunks(ENCODER_PROBE, 0))
+    except (TypeError, ValueError):
+        # missing (None) on some Pythons, or called differently
+        return JSON_ENCODER.encode
+    if c_encoded != JSON_ENCODER.encode(ENCODER_PROBE):
+        return JSON_ENCODER.encode
+
+    def encode_json(record):
+        return ''.join(encode_chunks(record, 0))
+    return encode_json
+
+
+encode_json = make_encode_json()
+encode_json_string = json.encoder.encode_basestring_ascii
+EDGE_TEMPLATE = '{"outv": %s, "label": %s, "inv": %s}\n'
+
+
+class CompressedFile(io.RawIOBase):
+    """Compresses everything written to it into a file that is appended to
+
+    Appending to a compressed file adds a gzip member or zstd frame, which
+    decompress as if they were a single one.
+    """
+
+    def __init__(self, path, compression, compress_level=None):
+        super().__init__()
+        self.file = open(path, 'ab')
+        self.compressor = new_compressor(compression, compress_level)
+        self.uncompressed_bytes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.uncompressed_bytes += len(data)
+        self.file.write(self.compressor.compress(data))
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.file.write(self.compressor.flush())
+            self.file.close()
+        super().close()
+
+
+class JsonLinesWriter:
+    """One JSON object per line: vertices as dicts, edges as outv/label/inv
+
+    Records are encoded as they come in and written in batches of
+    `WRITE_BATCH_SIZE` records.
+    """
+
+    extension = 'jsonl'
+    newline = None
+
+    def __init__(self, vertex_file, edge_file, output_files=()):
+        self.vertex_file = vertex_file
+        self.edge_file = edge_file
+        # (path, initial size, raw file) of each file that is appended to
+        self.output_files = output_files
+        self.vertex_batch = []
+        self.edge_batch = []
+
+    @classmethod
+    def open(cls, part_name, buffer_size, compression=NO_COMPRESSION, compress_level=None):
+        output_files = []
+        for kind in OUTPUT_KINDS:
+            path = output_path(part_name, kind, cls.extension, compression)
+            initial_size = os.path.getsize(path) if os.path.exists(path) else 0
+            if compression == NO_COMPRESSION:
+                # a plain FileIO keeps the text layer on its fastest path
+                raw_file = io.FileIO(path, 'a')
+            else:
+                raw_file = CompressedFile(path, compression, compress_level)
+            output_files.append((path, initial_size, raw_file))
+
+        return cls(
+            *(cls.wrap(raw_file, buffer_size) for _, _, raw_file in output_files),
+            output_files,
+        )
+
+    @classmethod
+    def wrap(cls, raw_file, buffer_size):
+        return io.TextIOWrapper(
+            io.BufferedWriter(raw_file, buffer_size),
+            encoding='utf8',
+            newline=cls.newline,
+        )
+
+    def flush(self):
+        if self.vertex_batch:
+            self.vertex_file.write(''.join(self.vertex_batch))
+            self.vertex_batch.clear()
+        if self.edge_batch:
+            self.edge_file.write(''.join(self.edge_batch))
+            self.edge_batch.clear()
+
+    def close(self):
+        self.flush()
+        self.vertex_file.close()
+        self.edge_file.close()
+
+    def byte_counts(self):
+        # the bytes written since the files were opened
+        byte_counts = {}
+        for kind, (path, initial_size, raw_file) in zip(OUTPUT_KINDS, self.output_files):
+            compressed = os.path.getsize(path) - initial_size
+            byte_counts[kind] = {
+                'uncompressed': getattr(raw_file, 'uncompressed_bytes', compressed),
+                'compressed': compressed,
+            }
+        return byte_counts
+
+    def write_vertex(self, vertex):
+        self.vertex_batch.append(encode_json(vertex) + '\n')
+        if len(self.vertex_batch) >= WRITE_BATCH_SIZE:
+            self.flush()
+
+    def write_edges(self, edges):
+        # edges are strings only, which is quicker to format than to encode
+        try:
+            lines = [
+                EDGE_TEMPLATE % (encode_json_string(outv), encode_json_string(label),
+                                 encode_json_string(inv))
+                for outv, label, inv in edges
+            ]
+        except TypeError:
+            # integer IDs, with --dictionary-encode
+            lines = [
+                encode_json({'outv': outv, 'label': label, 'inv': inv}) + '\n'
+                for outv, label, inv in edges
+            ]
+        self.edge_batch.extend(lines)
+        if len(self.edge_batch) >= WRITE_BATCH_SIZE:
+            self.flush()
+
+
+class CsvWriter(JsonLinesWriter):
+    """CSV files with a fixed header: one row per vertex property value
+
+    Vertices have no label, and which properties they have is only known
+    once a part is done, so vertices are written in this long format
+    instead of with a column per property.
+    """
+
+    extension = 'csv'
+    newline = ''
+    vertex_header = ['id', 'property', 'value', 'language']
+    edge_header = ['outv', 'label', 'inv']
+    delimiter = ','
+
+    def __init__(self, vertex_file, edge_file, output_files=()):
+        super().__init__(vertex_file, edge_file, output_files)
+        self.vertex_csv = csv.writer(vertex_file, delimiter=self.delimiter)
+        self.edge_csv = csv.writer(edge_file, delimiter=self.delimiter)
+
+        # files that are appended to already have a header
+        (_, vertex_size, _), (_, edge_size, _) = output_files
+        if vertex_size == 0:
+            self.vertex_csv.writerow(self.vertex_header)
+        if edge_size == 0:
+            self.edge_csv.writerow(self.edge_header)
+
+    def write_vertex(self, vertex):
+        vertex_id = vertex['id']
+        rows = []
+        for key, value in vertex.items():
+            if key == 'id':
+                continue
+            for item in (value if isinstance(value, list) else [value]):
+                if isinstance(item, dict):
+                    rows.append([vertex_id, key, item['value'], item['language'] or ''])
+                else:
+                    rows.append([vertex_id, key, item, ''])
+        self.vertex_csv.writerows(rows)
+
+    def write_edges(self, edges):
+        self.edge_csv.writerows(edges)
+
+
+class BinaryWriter(JsonLinesWriter):
+    """Records of a little-endian uint32 byte length followed by MessagePack
+
+    Vertices are maps like the JSON objects, edges are [outv, label, inv]
+    arrays. Values MessagePack has no type for are written as strings.
+    """
+
+    extension = 'bin'
+
+    @classmethod
+    def wrap(cls, raw_file, buffer_size):
+        return io.BufferedWriter(raw_file, buffer_size)
+
+    def write_vertex(self, vertex):
+        self.vertex_file.write(frame_record(vertex))
+
+    def write_edges(self, edges):
+        self.edge_file.write(b''.join(frame_record(edge) for edge in edges))
+
+
+WRITER_TYPES = {
+    JSONL_FORMAT: JsonLinesWriter,
+    CSV_FORMAT: CsvWriter,
+    BINARY_FORMAT: BinaryWriter,
+}
+
+
+def output_path(part_name, kind, extension, compression=NO_COMPRESSION):
+    return f'{part_name}_{kind}.{extension}{COMPRESSION_EXTENSIONS[compression]}'
+
+
+def open_output(path, compression=NO_COMPRESSION):
+    # a binary stream of the uncompressed output, of all gzip members or
+    # zstd frames that were appended
+    if compression == NO_COMPRESSION:
+        return open(path, 'rb')
+    elif compression == GZIP_COMPRESSION:
+        return gzip.open(path, 'rb')
+    elif zstandard is None:
+        raise ImportError('Install the `zstandard` package to read zstd output')
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(
+        open(path, 'rb'), read_across_frames=True, closefd=True,
+    ))
+
+
+def new_compressor(compression, compress_level=None):
+    if compression == NO_COMPRESSION:
+        return None
+
+    if compress_level is None:
+        compress_level = DEFAULT_COMPRESS_LEVELS[compression]
+    if compression == GZIP_COMPRESSION:
+        return zlib.compressobj(compress_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    elif zstandard is None:
+        raise ImportError('Install the `zstandard` package to write zstd output')
+    return zstandard.ZstdCompressor(level=compress_level).compressobj()
+
+
+def frame_record(record):
+    payload = pack_record(record)
+    return struct.pack('<I', len(payload)) + payload
+
+
+def pack_record(record):
+    if msgpack is not None:
+        try:
+            return msgpack.packb(record, default=str, use_bin_type=True)
+        except OverflowError:
+            # integers beyond 64 bits: `pack` writes those as strings
+            pass
+
+    chunks = []
+    pack(record, chunks)
+    return b''.join(chunks)
+
+
+def unpack_record(payload):
+    if msgpack is not None:
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    value, _ = unpack(payload, 0)
+    return value
+
+
+def pack(value, chunks):
+    # the subset of MessagePack that `msgpack.packb` writes for our records
+    if value is None:
+        chunks.append(b'\xc0')
+    elif value is True:
+        chunks.append(b'\xc3')
+    elif value is False:
+        chunks.append(b'\xc2')
+    elif isinstance(value, int) and -2 ** 63 <= value < 2 ** 64:
+        chunks.append(pack_int(value))
+    elif isinstance(value, float):
+        chunks.append(struct.pack('>Bd', 0xcb, value))
+    elif isinstance(value, str):
+        data = value.encode('utf8')
+        chunks.append(pack_length(len(data), 0xa0, 31, 0xd9, 0xda, 0xdb))
+        chunks.append(data)
+    elif isinstance(value, (list, tuple)):
+        chunks.append(pack_length(len(value), 0x90, 15, None, 0xdc, 0xdd))
+        for item in value:
+            pack(item, chunks)
+    elif isinstance(value, dict):
+        chunks.append(pack_length(len(value), 0x80, 15, None, 0xde, 0xdf))
+        for key, item in value.items():
+            pack(key, chunks)
+            pack(item, chunks)
+    else:
+        pack(str(value), chunks)
+
+
+def pack_int(value):
+    if 0 <= value < 0x80:
+        return struct.pack('B', value)
+    elif -0x20 <= value < 0:
+        return struct.pack('b', value)
+    elif value >= 0:
+        for code, fmt, limit in ((0xcc, '>BB', 2 ** 8), (0xcd, '>BH', 2 ** 16),
+                                 (0xce, '>BI', 2 ** 32), (0xcf, '>BQ', 2 ** 64)):
+            if value < limit:
+                return struct.pack(fmt, code, value)
+    else:
+        for code, fmt, limit in ((0xd0, '>Bb', 2 ** 7), (0xd1, '>Bh', 2 ** 15),
+                                 (0xd2, '>Bi', 2 ** 31), (0xd3, '>Bq', 2 ** 63)):
+            if value >= -limit:
+                return struct.pack(fmt, code, value)
+
+
+def pack_length(length, fix_code, fix_limit, code_8, code_16, code_32):
+    if length <= fix_limit:
+        return struct.pack('B', fix_code | length)
+    elif code_8 is not None and length < 2 ** 8:
+        return struct.pack('>BB', code_8, length)
+    elif length < 2 ** 16:
+        return struct.pack('>BH', code_16, length)
+    else:
+        return struct.pack('>BI', code_32, length)
+
+
+# the codes of fixed-size values, and of the lengths before variable-size ones
+UNPACK_FORMATS = {
+    0xca: '>f', 0xcb: '>d',
+    0xcc: '>B', 0xcd: '>H', 0xce: '>I', 0xcf: '>Q',
+    0xd0: '>b', 0xd1: '>h', 0xd2: '>i', 0xd3: '>q',
+}
+UNPACK_LENGTH_FORMATS = {
+    0xc4: (bytes, '>B'), 0xc5: (bytes, '>H'), 0xc6: (bytes, '>I'),
+    0xd9: (str, '>B'), 0xda: (str, '>H'), 0xdb: (str, '>I'),
+    0xdc: (list, '>H'), 0xdd: (list, '>I'),
+    0xde: (dict, '>H'), 0xdf: (dict, '>I'),
+}
+
+
+def unpack(data, offset):
+    # the value at `offset` and the offset after it, for what `pack` and
+    # `msgpack.packb` write for our records
+    code = data[offset]
+    offset += 1
+    if code <= 0x7f:
+        return code, offset
+    elif code >= 0xe0:
+        return code - 0x100, offset
+    elif code == 0xc0:
+        return None, offset
+    elif code in (0xc2, 0xc3):
+        return code == 0xc3, offset
+    elif code in UNPACK_FORMATS:
+        fmt = UNPACK_FORMATS[code]
+        return struct.unpack_from(fmt, data, offset)[0], offset + struct.calcsize(fmt)
+
+    if 0x80 <= code <= 0x8f:
+        kind, length = dict, code & 0x0f
+    elif 0x90 <= code <= 0x9f:
+        kind, length = list, code & 0x0f
+    elif 0xa0 <= code <= 0xbf:
+        kind, length = str, code & 0x1f
+    elif code in UNPACK_LENGTH_FORMATS:
+        kind, fmt = UNPACK_LENGTH_FORMATS[code]
+        (length,) = struct.unpack_from(fmt, data, offset)
+        offset += struct.calcsize(fmt)
+    else:
+        raise ValueError(f'unsupported MessagePack code 0x{code:02x} at {offset - 1}')
+
+    if kind is str:
+        return data[offset:offset + length].decode('utf8'), offset + length
+    elif kind is bytes:
+        return bytes(data[offset:offset + length]), offset + length
+    elif kind is list:
+        items = []
+        for _ in range(length):
+            item, offset = unpack(data, offset)
+            items.append(item)
+        return items, offset
+    mapping = {}
+    for _ in range(length):
+        key, offset = unpack(data, offset)
+        mapping[key], offset = unpack(data, offset)
+    return mapping, offset
+
+
+def rewrite_ids(
+        part_name,
+        vertex_id,
+        outv_id,
+        inv_id,
+        output_format=JSONL_FORMAT,
+        compression=NO_COMPRESSION,
+        compress_level=None,
+        set_aside=None,
+):
+    # replaces every vertex ID and edge end of a part by what the functions
+    # return for it; vertex records (rows, for CSV) that `set_aside` returns
+    # True for are left out, to be written later
+    extension = WRITER_TYPES[output_format].extension
+    for kind in OUTPUT_KINDS:
+        path = output_path(part_name, kind, extension, compression)
+        if not os.path.exists(path):
+            continue
+
+        # the rewritten file replaces the original once it is complete
+        tmp_path = f'{path}.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if compression == NO_COMPRESSION:
+            raw_file = io.FileIO(tmp_path, 'w')
+        else:
+            raw_file = CompressedFile(tmp_path, compression, compress_level)
+
+        rewrite_records = REWRITERS[output_format]
+        with open_output(path, compression) as in_file, \
+                io.BufferedWriter(raw_file, REWRITE_BUFFER_SIZE) as out_file:
+            rewrite_records(in_file, out_file, kind, vertex_id, outv_id, inv_id, set_aside)
+        os.replace(tmp_path, path)
+
+
+def rewrite_json_lines(in_file, out_file, kind, vertex_id, outv_id, inv_id, set_aside=None):
+    for line in in_file:
+        record = json.loads(line)
+        if kind == 'vertices':
+            record['id'] = vertex_id(record['id'])
+            if set_aside is not None and set_aside(record):
+                continue
+        else:
+            record['outv'] = outv_id(record['outv'])
+            record['inv'] = inv_id(record['inv'])
+        out_file.write(f'{encode_json(record)}\n'.encode('utf8'))
+
+
+def rewrite_csv(in_file, out_file, kind, vertex_id, outv_id, inv_id, set_aside=None):
+    text_in = io.TextIOWrapper(in_file, encoding='utf8', newline='')
+    text_out = io.TextIOWrapper(out_file, encoding='utf8', newline='')
+    delimiter = WRITER_TYPES[CSV_FORMAT].delimiter
+    csv_out = csv.writer(text_out, delimiter=delimiter)
+    rows = csv.reader(text_in, delimiter=delimiter)
+    # the header
+    csv_out.writerow(next(rows))
+    for row in rows:
+        if kind == 'vertices':
+            row[0] = vertex_id(row[0])
+            if set_aside is not None and set_aside(row):
+                continue
+        else:
+            row[0], row[2] = outv_id(row[0]), inv_id(row[2])
+        csv_out.writerow(row)
+    text_out.detach()
+    text_in.detach()
+
+
+def rewrite_binary(in_file, out_file, kind, vertex_id, outv_id, inv_id, set_aside=None):
+    while True:
+        header = in_file.read(4)
+        if not header:
+            break
+        (length,) = struct.unpack('<I', header)
+        record = unpack_record(in_file.read(length))
+        if kind == 'vertices':
+            record['id'] = vertex_id(record['id'])
+            if set_aside is not None and set_aside(record):
+                continue
+        else:
+            record[0], record[2] = outv_id(record[0]), inv_id(record[2])
+        out_file.write(frame_record(record))
+
+
+REWRITERS = {
+    JSONL_FORMAT: rewrite_json_lines,
+    CSV_FORMAT: rewrite_csv,
+    BINARY_FORMAT: rewrite_binary,
+}
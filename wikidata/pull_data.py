@@ -11,77 +11,362 @@ Usage:
 Options:
     -h --help                    Show this message
     -d <depth>, --depth=<depth>  recursively crawl entities to depth. [default: 0]
+    -s <dir>, --state-dir=<dir>  where the frontier and fetched ids of an
+                                 unfinished crawl are kept. [default: dump/crawl]
+    -c <n>, --concurrency=<n>    number of requests in flight. [default: 4]
+    -r <rate>, --rate=<rate>     maximum number of requests per second. [default: 10]
+    --retries=<n>                number of times a throttled or failed request
+                                 is retried. [default: 5]
+    --api-url=<url>              the wikibase API to fetch from.
+                                 [default: https://www.wikidata.org/w/api.php]
+    --cache=<path>               the SQLite file entities are cached in.
+                                 [default: dump/entities.db]
+    --max-age=<days>             cached entities older than this are only used
+                                 once their revision is checked. [default: 7]
+    --offline                    only serve entities from the cache.
 """
 
+import collections
+import glob
+import json
+import mmap
+import os
+import shutil
+import sqlite3
 import sys
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
 import requests
-import json
-import urllib.parse
+from requests.adapters import HTTPAdapter
 
-ENTITIES_FILE = 'dump/fetched_entities'
-fetched_entities = set()
+USER_AGENT = 'graph-preloader/pull_data.py (python-requests)'
+REQUEST_TIMEOUT = 60  # seconds
+BITMAP_GROWTH = 2 ** 20  # bytes, or 8M ids
+CHECKPOINT_SIZE = 10000  # entities
+MAX_PENDING = 10000  # ids that wait for the ids before them
+CACHE_COMPRESS_LEVEL = 1
 
 
-class EntityError(Exception):
+class FetcherError(Exception):
     pass
 
 
-class FetcherError(Exception):
-    pass
+class EntityCache(object):
+    """EntityCache -- fetched entities, kept in an SQLite file
+
+    entities are stored compressed under the id they were requested by,
+    with their `lastrevid` and `modified` and the time they were fetched.
+    Entities fetched less than `max_age` seconds ago are fresh, older ones
+    are stale until their revision is confirmed by the server.
+    """
+
+    def __init__(self, path, max_age):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS entities (id TEXT PRIMARY KEY, lastrevid INTEGER, '
+            'modified TEXT, fetched REAL NOT NULL, entity BLOB NOT NULL)'
+        )
+        self.max_age = max_age
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, entity_ids):
+        """(entity, fresh) of every cached id of `entity_ids`, by id"""
+        rows = self.connection.execute(
+            'SELECT id, fetched, entity FROM entities WHERE id IN ({})'.format(
+                ', '.join('?' * len(entity_ids))),
+            entity_ids,
+        )
+        oldest = time.time() - self.max_age
+        return {
+            entity_id: (json.loads(zlib.decompress(entity)), fetched >= oldest)
+            for entity_id, fetched, entity in rows
+        }
+
+    def put(self, entities):
+        fetched = time.time()
+        self.connection.executemany('INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?)', [
+            (
+                entity_id,
+                entity.get('lastrevid'),
+                entity.get('modified'),
+                fetched,
+                zlib.compress(json.dumps(entity).encode('utf8'), CACHE_COMPRESS_LEVEL),
+            )
+            for entity_id, entity in entities.items()
+        ])
+        self.connection.commit()
+
+    def touch(self, entity_ids):
+        # confirmed to be the latest revision
+        fetched = time.time()
+        self.connection.executemany(
+            'UPDATE entities SET fetched = ? WHERE id = ?',
+            [(fetched, entity_id) for entity_id in entity_ids],
+        )
+        self.connection.commit()
 
 
 class Fetcher(object):
     """Fetcher -- submit entity ids and retrieve entities
 
-    batches entity ids into larger requests, to improve efficiency
+    batches entity ids into `wbgetentities` requests of up to 50 ids, and
+    keeps up to `concurrency` of them in flight, each thread over its own
+    kept-alive connection. Requests are spaced to stay under `rate` per
+    second, and requests that are throttled (429, maxlag) or fail on the
+    server (5xx) are retried after Retry-After or an exponential backoff,
+    during which no other request is sent either.
+
+    with a `cache`, fresh cached entities aren't requested at all, and
+    stale ones only when a request for just their revisions shows that
+    they changed. `offline` fetchers only serve what is cached.
     """
-    base_url = 'https://www.wikidata.org/w/api.php'
-    api_query = '?format=json&action=wbgetentities&ids={}'
-
-    def __init__(self):
-        self.request_queue = []
-        self.result_queue = []
-
-    def make_request(self):
-        if not self.request_queue:
-            raise FetcherError('nothing left to fetch')
-
-        print('fetching {} ids'.format(len(self.request_queue)), file=sys.stderr)
-        ids = self.request_queue[:50].join('|')
-        req = urllib.parse.quote_plus(self.api_query.format(ids))
-        resp = requests.get(self.base_url + req)
-
-        if not resp.ok:
-            raise FetcherError(resp.text)
-
-        # add existing entities to result queue
-        resp = resp.json()
-        results = resp['entities'].values()
-        not_missing = filter(lambda r: 'missing' not in r, results)
-        self.result_queue.extend(not_missing)
-        # remove what we fetched from request queue
-        del self.request_queue[:50]
-
-    def schedule(self, entity_id):
-        self.request_queue.append(entity_id)
-        while len(self.request_queue) >= 50:
-            self.make_request()
-
-    def get_next(self):
-        if not self.result_queue:
-            self.make_request()
-        return self.result_queue.pop()
-
-
-def fetch_entity(entity_id):
-    url = 'http://www.wikidata.org/entity/{}'.format(entity_id)
-    resp = requests.get(url, headers={'Accept': 'application/json'})
-    if resp.ok:
-        _, entity = resp.json()['entities'].popitem()
-        return entity
-    else:
-        raise EntityError('error fetching entity {}: {}\n'.format(
-            entity_id, resp.status_code))
+    api_url = 'https://www.wikidata.org/w/api.php'
+    batch_size = 50
+
+    def __init__(
+            self,
+            api_url=None,
+            concurrency=4,
+            rate=10,
+            max_retries=5,
+            backoff=1,
+            cache=None,
+            offline=False,
+    ):
+        self.api_url = api_url or self.api_url
+        self.concurrency = concurrency
+        self.interval = 1 / rate if rate else 0
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cache = cache
+        self.offline = offline
+        self.executor = None
+        self.local = threading.local()
+        self.rate_lock = threading.Lock()
+        self.next_request_time = 0
+        self.cached_count = 0
+        self.missing_ids = []
+        self.redirected_ids = []
+        self.uncached_ids = []
+        self.errors = []
+
+    def __enter__(self):
+        self.executor = ThreadPoolExecutor(self.concurrency)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.executor.shutdown()
+
+    def session(self):
+        # sessions aren't thread-safe, so every thread has one
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+            session.headers['User-Agent'] = USER_AGENT
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        return session
+
+    def fetch(self, entity_ids):
+        """yield the entities of `entity_ids` in the same order
+
+        ids that don't exist are added to `missing_ids`, ids that are
+        answered by the entity they redirect to to `redirected_ids`, ids
+        that aren't cached when offline to `uncached_ids`, and batches that
+        can't be fetched to `errors`.
+        """
+        in_flight = {}
+        # ids to request once there are enough of them for a batch
+        uncached, stale = [], {}
+        # the ids that haven't been yielded yet, in order, and the entities
+        # of those that are done, or None when there is none
+        pending = collections.deque()
+        pending_ids = set()
+        results = {}
+
+        def submit(ids, cached=None):
+            task = self.revalidate if cached else self.request_entities
+            in_flight[self.executor.submit(task, ids, cached)] = (ids, cached)
+
+        def release():
+            while pending and pending[0] in results:
+                entity_id = pending.popleft()
+                pending_ids.discard(entity_id)
+                entity = results.pop(entity_id)
+                if entity is not None:
+                    yield entity
+                    if entity['id'] != entity_id:
+                        self.redirected_ids.append(entity_id)
+
+        try:
+            for batch in iter_batches(entity_ids, self.batch_size):
+                cached = self.cache.get(batch) if self.cache else {}
+                for entity_id in batch:
+                    if entity_id in pending_ids:
+                        continue
+                    pending.append(entity_id)
+                    pending_ids.add(entity_id)
+                    if entity_id not in cached:
+                        if self.offline:
+                            self.uncached_ids.append(entity_id)
+                            results[entity_id] = None
+                        else:
+                            uncached.append(entity_id)
+                    elif cached[entity_id][1] or self.offline:
+                        self.cached_count += 1
+                        results[entity_id] = cached[entity_id][0]
+                    else:
+                        stale[entity_id] = cached[entity_id][0]
+
+                # partial batches as well when entities that are done pile
+                # up behind them
+                flush = len(pending) >= MAX_PENDING
+                while len(uncached) >= self.batch_size or flush and uncached:
+                    submit(uncached[:self.batch_size])
+                    del uncached[:self.batch_size]
+                if len(stale) >= self.batch_size or flush and stale:
+                    submit(list(stale), stale)
+                    stale = {}
+                while len(in_flight) >= self.concurrency or flush and in_flight:
+                    self.collect(in_flight, results)
+                yield from release()
+
+            if uncached:
+                submit(uncached)
+            if stale:
+                submit(list(stale), stale)
+            while in_flight:
+                self.collect(in_flight, results)
+                yield from release()
+            yield from release()
+        finally:
+            # when the caller stops early
+            for future in in_flight:
+                future.cancel()
+
+    def collect(self, in_flight, results):
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            ids, cached = in_flight.pop(future)
+            try:
+                entities, unchanged_ids = future.result()
+            except FetcherError as e:
+                self.errors.append('error fetching {} ids from {} on: {}\n'.format(
+                    len(ids), ids[0], e))
+                results.update(dict.fromkeys(ids))
+                continue
+
+            found = {}
+            for entity_id, entity in entities.items():
+                # redirected ids are answered by the entity they redirect to
+                entity_id = entity.get('redirects', {}).get('from', entity_id)
+                if 'missing' in entity:
+                    self.missing_ids.append(entity['id'])
+                    results[entity_id] = None
+                else:
+                    found[entity_id] = results[entity_id] = entity
+            if self.cache:
+                self.cache.put(found)
+                self.cache.touch(unchanged_ids)
+            for entity_id in unchanged_ids:
+                self.cached_count += 1
+                results[entity_id] = cached[entity_id]
+            for entity_id in ids:
+                if entity_id not in results:
+                    # redirected to an entity that was requested in the same
+                    # batch, which only comes once
+                    self.redirected_ids.append(entity_id)
+                    results[entity_id] = None
+
+    def request_entities(self, ids, cached=None):
+        return self.request(ids), []
+
+    def revalidate(self, ids, cached):
+        # just the revisions first, which is a fraction of the entities
+        revisions = self.request(ids, props='info')
+        changed_ids = [
+            entity_id for entity_id in ids
+            if revisions.get(entity_id, {}).get('lastrevid') != cached[entity_id].get('lastrevid')
+        ]
+        unchanged_ids = [entity_id for entity_id in ids if entity_id not in changed_ids]
+        return (self.request(changed_ids) if changed_ids else {}), unchanged_ids
+
+    def request(self, ids, props=None):
+        # the entities of `ids`, by the id they were requested by
+        params = {
+            'action': 'wbgetentities',
+            'format': 'json',
+            'ids': '|'.join(ids),
+            # wait when the servers lag behind, as bots are asked to
+            'maxlag': 5,
+        }
+        if props:
+            params['props'] = props
+        for attempt in range(self.max_retries + 1):
+            self.throttle()
+            retry_after = None
+            try:
+                resp = self.session().get(self.api_url, params=params, timeout=REQUEST_TIMEOUT)
+                retry_after = resp.headers.get('Retry-After')
+                if resp.status_code == 429 or resp.status_code >= 500:
+                    error = 'status {}'.format(resp.status_code)
+                elif not resp.ok:
+                    raise FetcherError('status {}: {}'.format(resp.status_code, resp.text))
+                else:
+                    # a ValueError for a truncated body or an HTML error page
+                    result = resp.json()
+                    if 'error' not in result:
+                        return result['entities']
+                    error = '{code}: {info}'.format(**result['error'])
+                    if result['error']['code'] != 'maxlag':
+                        raise FetcherError(error)
+            except (requests.RequestException, ValueError) as e:
+                error = '{}: {}'.format(type(e).__name__, e)
+
+            if attempt < self.max_retries:
+                delay = self.backoff * 2 ** attempt
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+                print('retrying {} ids in {} s ({})'.format(len(ids), delay, error),
+                      file=sys.stderr)
+                self.pause(delay)
+        raise FetcherError('giving up after {} attempts ({})'.format(attempt + 1, error))
+
+    def throttle(self):
+        # wait for this request's slot, `interval` after the one before
+        with self.rate_lock:
+            now = time.monotonic()
+            request_time = max(now, self.next_request_time)
+            self.next_request_time = request_time + self.interval
+        if request_time > now:
+            time.sleep(request_time - now)
+
+    def pause(self, delay):
+        with self.rate_lock:
+            self.next_request_time = max(self.next_request_time, time.monotonic() + delay)
+
+
+def iter_batches(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
 
 
 def crawl_entity(entity):
@@ -98,16 +383,186 @@ def crawl_entity(entity):
                 yield claim['mainsnak']['datavalue']['value']['id']
 
 
-def recursive_fetch(entity_id, max_depth, depth=0):
-    sys.stderr.write('crawling entity {}\n'.format(entity_id))
-    entity = fetch_entity(entity_id)
-    yield entity
-    fetched_entities.add(entity_id)
-    if depth < max_depth:
-        for sub_id in crawl_entity(entity):
-            if sub_id in fetched_entities:
-                continue
-            yield from recursive_fetch(sub_id, max_depth, depth + 1)
+class VisitedSet(object):
+    """VisitedSet -- a compact set of entity ids
+
+    ids like Q42 are bits in a bitmap per prefix letter, so 100M items take
+    12.5 MB. With a `directory`, the bitmaps are memory-mapped files in it,
+    which the OS writes out as they change; without one, they are kept in
+    memory. Other ids are kept in memory only.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.bitmaps = {}
+        self.others = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.directory:
+            for bitmap in self.bitmaps.values():
+                bitmap.close()
+        self.bitmaps.clear()
+
+    def __contains__(self, entity_id):
+        prefix, number = split_id(entity_id)
+        if number is None:
+            return entity_id in self.others
+        bitmap = self.bitmap(prefix)
+        return (number >> 3) < len(bitmap) and bool(bitmap[number >> 3] & (1 << (number & 7)))
+
+    def add(self, entity_id):
+        prefix, number = split_id(entity_id)
+        if number is None:
+            self.others.add(entity_id)
+            return
+        bitmap = self.bitmap(prefix, (number >> 3) + 1)
+        bitmap[number >> 3] |= 1 << (number & 7)
+
+    def bitmap(self, prefix, size=0):
+        bitmap = self.bitmaps.get(prefix)
+        if bitmap is not None and len(bitmap) >= size:
+            return bitmap
+
+        size = -(-size // BITMAP_GROWTH) * BITMAP_GROWTH
+        if not self.directory:
+            grown = bytearray(max(size, BITMAP_GROWTH))
+            if bitmap is not None:
+                grown[:len(bitmap)] = bitmap
+        else:
+            if bitmap is not None:
+                bitmap.close()
+            with open(os.path.join(self.directory, prefix + '.bitmap'), 'a+b') as bitmap_file:
+                if bitmap_file.seek(0, os.SEEK_END) < max(size, BITMAP_GROWTH):
+                    bitmap_file.truncate(max(size, BITMAP_GROWTH))
+                grown = mmap.mmap(bitmap_file.fileno(), 0)
+        self.bitmaps[prefix] = grown
+        return grown
+
+    def flush(self):
+        if self.directory:
+            for bitmap in self.bitmaps.values():
+                bitmap.flush()
+
+
+def split_id(entity_id):
+    prefix, number = entity_id[:1], entity_id[1:]
+    if prefix.isalpha() and number.isdigit():
+        return prefix, int(number)
+    return None, None
+
+
+def frontier_path(state_dir, depth):
+    return os.path.join(state_dir, 'frontier-{}.txt'.format(depth))
+
+
+def read_frontier(path, skipped_ids):
+    with open(path) as frontier_file:
+        for line in frontier_file:
+            entity_id = line.rstrip('\n')
+            if entity_id not in skipped_ids:
+                yield entity_id
+
+
+def crawl(fetcher, start, end, max_depth, state_dir):
+    """yield the entities Q<start> to Q<end - 1> and those they link to
+
+    The crawl is breadth first: every level's ids are read from
+    `frontier-<depth>.txt` in `state_dir` and fetched in batches, while the
+    ids they link to are written to the next level's file. Entities that
+    were visited by the crawl are skipped, and fetched ones are added to the
+    visited set in `state_dir` every `CHECKPOINT_SIZE` entities, after the
+    entities and the ids they link to have been written out. An interrupted
+    crawl with the same arguments resumes at the level it was at, and
+    fetches at most the entities since the last checkpoint again. The state
+    of other crawls is cleared, and that of a finished crawl removed.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    state_path = os.path.join(state_dir, 'crawl.json')
+    visited_dir = os.path.join(state_dir, 'visited')
+    state = {'start': start, 'end': end, 'max_depth': max_depth, 'depth': 0}
+    saved_state = None
+    if os.path.exists(state_path):
+        with open(state_path) as state_file:
+            saved_state = json.load(state_file)
+
+    if saved_state and saved_state['depth'] <= max_depth and all(
+            saved_state[key] == state[key] for key in ('start', 'end', 'max_depth')):
+        state = saved_state
+        print('resuming the crawl at depth {}'.format(state['depth']), file=sys.stderr)
+    else:
+        # the levels and visited ids of another crawl
+        for path in glob.glob(frontier_path(state_dir, '*')):
+            os.remove(path)
+        shutil.rmtree(visited_dir, ignore_errors=True)
+        with open(frontier_path(state_dir, 0), 'w') as frontier_file:
+            for i in range(start, end):
+                frontier_file.write('Q{}\n'.format(i))
+
+    with VisitedSet(visited_dir) as visited:
+        # the ids yielded before they are visited, which redirected ids can
+        # yield again
+        yielded = VisitedSet()
+        missing_count = len(fetcher.missing_ids)
+        redirect_count = len(fetcher.redirected_ids)
+        while state['depth'] <= max_depth:
+            depth = state['depth']
+            with open(state_path, 'w') as state_file:
+                json.dump(state, state_file)
+
+            # the ids in the next level so far, when the crawl is resumed
+            next_path = frontier_path(state_dir, depth + 1)
+            queued = VisitedSet()
+            if os.path.exists(next_path):
+                for entity_id in read_frontier(next_path, queued):
+                    queued.add(entity_id)
+
+            fetched = []
+            with open(next_path, 'a') as next_file:
+                def checkpoint():
+                    nonlocal missing_count, redirect_count
+                    # the entities have been printed, and the ids they link to
+                    # written, before they are marked
+                    sys.stdout.flush()
+                    next_file.flush()
+                    for entity_id in (fetched + fetcher.missing_ids[missing_count:]
+                                      + fetcher.redirected_ids[redirect_count:]):
+                        visited.add(entity_id)
+                    missing_count = len(fetcher.missing_ids)
+                    redirect_count = len(fetcher.redirected_ids)
+                    fetched.clear()
+
+                frontier = read_frontier(frontier_path(state_dir, depth), visited)
+                try:
+                    for entity in fetcher.fetch(frontier):
+                        entity_id = entity['id']
+                        if entity_id not in yielded and entity_id not in visited:
+                            yield entity
+                            yielded.add(entity_id)
+                            fetched.append(entity_id)
+                            if depth < max_depth:
+                                for sub_id in crawl_entity(entity):
+                                    if sub_id not in visited and sub_id not in queued:
+                                        queued.add(sub_id)
+                                        next_file.write(sub_id + '\n')
+                        if len(fetched) >= CHECKPOINT_SIZE:
+                            checkpoint()
+                finally:
+                    checkpoint()
+            visited.flush()
+
+            os.remove(frontier_path(state_dir, depth))
+            state['depth'] += 1
+    os.remove(frontier_path(state_dir, max_depth + 1))
+    os.remove(state_path)
+    shutil.rmtree(visited_dir)
 
 
 def main(args):
@@ -117,18 +572,38 @@ def main(args):
     else:
         start, end = int(args['<start>']), int(args['<end>'])
     depth = int(args['--depth'])
+    state_dir = args['--state-dir']
     success_count = 0
     errors = []
 
-    for i in range(start, end):
-        try:
-            for entity in recursive_fetch('Q' + str(i), depth):
-                print(json.dumps(entity))
-                success_count += 1
-        except EntityError as e:
-            errors.append(str(e))
-
-    sys.stderr.write('successfully fetched {} entities\n'.format(success_count))
+    start_time = time.monotonic()
+    with EntityCache(args['--cache'], float(args['--max-age']) * 24 * 3600) as cache, \
+            Fetcher(
+                args['--api-url'],
+                int(args['--concurrency']),
+                float(args['--rate']),
+                int(args['--retries']),
+                cache=cache,
+                offline=args['--offline'],
+            ) as fetcher:
+        for entity in crawl(fetcher, start, end, depth, state_dir):
+            print(json.dumps(entity))
+            success_count += 1
+    for entity_id in fetcher.missing_ids:
+        errors.append('error fetching entity {}: missing\n'.format(entity_id))
+    for entity_id in fetcher.uncached_ids:
+        errors.append('error fetching entity {}: not cached\n'.format(entity_id))
+    errors.extend(fetcher.errors)
+
+    elapsed = time.monotonic() - start_time
+    sys.stderr.write(
+        'successfully fetched {} entities ({} from the cache) in {:.1f} s '
+        '({:.1f} entities/s)\n'.format(
+            success_count,
+            fetcher.cached_count,
+            elapsed,
+            success_count / elapsed if elapsed else 0,
+        ))
     if errors:
         sys.stderr.write('The following errors were encountered:\n')
     for error in errors:
@@ -136,10 +611,6 @@ def main(args):
 
 
 if __name__ == "__main__":
-    with open(ENTITIES_FILE) as f:
-        for line in f:
-            fetched_entities.add(line.strip())
-
     import docopt
     try:
         args = docopt.docopt(__doc__, version='pull_data 0.1')
@@ -147,7 +618,3 @@ if __name__ == "__main__":
     except KeyboardInterrupt as e:
         sys.stderr.write('Received interrupt, exiting...\n')
         sys.exit(-1)
-    finally:
-        with open(ENTITIES_FILE) as f:
-            for entity in fetched_entities:
-                f.write(entity + '\n')
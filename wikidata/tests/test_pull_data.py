@@ -0,0 +1,291 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import pull_data
+from pull_data import EntityCache, Fetcher, crawl
+
+
+class WikibaseHandler(BaseHTTPRequestHandler):
+    """wbgetentities, for the entities of the server"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlparse(self.path).query)
+        ids, props = query['ids'][0].split('|'), query.get('props', [None])[0]
+        with server.lock:
+            server.requests.append((ids, props))
+            failure = server.failures.pop(0) if server.failures else None
+        if failure is not None:
+            status, headers, body = failure
+            if status is None:
+                # a dropped connection
+                self.close_connection = True
+                return
+            return self.respond(status, body, headers)
+
+        entities = {}
+        for entity_id in ids:
+            target_id = server.redirects.get(entity_id, entity_id)
+            entity = server.entities.get(target_id)
+            if entity is None:
+                entities[entity_id] = {'id': entity_id, 'missing': ''}
+                continue
+            if props == 'info':
+                entity = {'id': target_id, 'lastrevid': entity['lastrevid']}
+            if target_id != entity_id:
+                entity = dict(entity, redirects={'from': entity_id, 'to': target_id})
+            entities[target_id] = entity
+        # later batches overtake earlier ones
+        threading.Event().wait(server.delay(ids))
+        self.respond(200, json.dumps({'entities': entities}).encode('utf8'))
+
+    def respond(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class WikibaseServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), WikibaseHandler)
+        self.url = 'http://127.0.0.1:{}/w/api.php'.format(self.server_address[1])
+        self.lock = threading.Lock()
+        self.entities = {}
+        self.redirects = {}
+        # (status, headers, body) of the next responses, None for no response
+        self.failures = []
+        self.requests = []
+        self.delay = lambda ids: 0
+
+
+@pytest.fixture
+def wikibase():
+    server = WikibaseServer()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def entity_ids(start, end):
+    return ['Q{}'.format(i) for i in range(start, end)]
+
+
+def add_entities(server, ids, lastrevid=1):
+    for entity_id in ids:
+        server.entities[entity_id] = {'id': entity_id, 'lastrevid': lastrevid, 'claims': {}}
+
+
+def link(server, entity_id, *linked_ids):
+    server.entities[entity_id]['claims']['P31'] = [
+        {'mainsnak': {
+            'snaktype': 'value',
+            'datatype': 'wikibase-item',
+            'datavalue': {'value': {'id': linked_id}},
+        }}
+        for linked_id in linked_ids
+    ]
+
+
+def fetch(server, ids, **kwargs):
+    kwargs.setdefault('rate', 0)
+    with Fetcher(server.url, **kwargs) as fetcher:
+        return [entity['id'] for entity in fetcher.fetch(ids)], fetcher
+
+
+def test_ids_are_requested_in_batches(wikibase):
+    ids = entity_ids(1, 121)
+    add_entities(wikibase, ids)
+    fetched_ids, fetcher = fetch(wikibase, ids)
+    assert ids == fetched_ids
+    # sent at the same time, so they may arrive in any order
+    requests = sorted(wikibase.requests, key=lambda request: int(request[0][0][1:]))
+    assert [50, 50, 20] == [len(request_ids) for request_ids, _ in requests]
+    assert ids == sum((request_ids for request_ids, _ in requests), [])
+
+
+def test_output_order_is_serial_order(wikibase):
+    ids = entity_ids(1, 1000)
+    add_entities(wikibase, [entity_id for entity_id in ids if int(entity_id[1:]) % 7])
+    serial_ids, _ = fetch(wikibase, ids, concurrency=1)
+
+    # the first batches take the longest
+    wikibase.delay = lambda request_ids: 0.05 / int(request_ids[0][1:]) ** 0.5
+    concurrent_ids, fetcher = fetch(wikibase, ids, concurrency=8)
+    assert serial_ids == concurrent_ids
+    assert len(fetcher.missing_ids) == len(ids) - len(concurrent_ids)
+
+
+def test_missing_entities_are_reported(wikibase):
+    ids = entity_ids(1, 11)
+    # deleted entities are missing as well
+    add_entities(wikibase, ids[::2] + ['Q11'])
+    wikibase.redirects['Q10'] = 'Q11'
+    fetched_ids, fetcher = fetch(wikibase, ids)
+    assert ['Q1', 'Q3', 'Q5', 'Q7', 'Q9', 'Q11'] == fetched_ids
+    assert ['Q2', 'Q4', 'Q6', 'Q8'] == sorted(fetcher.missing_ids)
+    assert ['Q10'] == fetcher.redirected_ids
+    assert not fetcher.errors
+
+
+def test_throttled_and_failed_requests_are_retried(wikibase, monkeypatch):
+    ids = entity_ids(1, 3)
+    add_entities(wikibase, ids)
+    maxlag = {'error': {'code': 'maxlag', 'info': 'Waiting for a database server'}}
+    wikibase.failures = [
+        (429, {'Retry-After': '2'}, b''),
+        (503, {}, b''),
+        (None, {}, b''),
+        (200, {}, b'{"entities": {"Q1": {'),
+        (200, {'Content-Type': 'text/html'}, b'<html>Wikimedia Error</html>'),
+        (200, {'Retry-After': '1'}, json.dumps(maxlag).encode('utf8')),
+    ]
+    delays = []
+    monkeypatch.setattr(Fetcher, 'pause', lambda self, delay: delays.append(delay))
+
+    fetched_ids, fetcher = fetch(wikibase, ids, backoff=0.01, max_retries=6)
+    assert ids == fetched_ids
+    assert not fetcher.errors
+    assert len(wikibase.requests) == 7
+    assert [2, 0.02, 0.04, 0.08, 0.16, 1] == pytest.approx(delays)
+
+
+def test_batches_that_keep_failing_are_reported(wikibase, monkeypatch):
+    ids = entity_ids(1, 61)
+    add_entities(wikibase, ids)
+    wikibase.failures = [(500, {}, b'')] * 3
+    monkeypatch.setattr(Fetcher, 'pause', lambda self, delay: None)
+
+    fetched_ids, fetcher = fetch(wikibase, ids, concurrency=1, max_retries=2)
+    assert ids[50:] == fetched_ids
+    assert 1 == len(fetcher.errors)
+    assert 'giving up after 3 attempts (status 500)' in fetcher.errors[0]
+
+
+def test_client_errors_are_not_retried(wikibase):
+    wikibase.failures = [(400, {}, b'bad request')]
+    fetched_ids, fetcher = fetch(wikibase, entity_ids(1, 3))
+    assert [] == fetched_ids
+    assert 1 == len(wikibase.requests)
+    assert 'status 400: bad request' in fetcher.errors[0]
+
+
+def crawl_ids(server, state_dir, start, end, max_depth, stop_after=None, **kwargs):
+    kwargs.setdefault('rate', 0)
+    with Fetcher(server.url, **kwargs) as fetcher:
+        entities = crawl(fetcher, start, end, max_depth, str(state_dir))
+        crawled_ids = []
+        for entity in entities:
+            crawled_ids.append(entity['id'])
+            if len(crawled_ids) == stop_after:
+                entities.close()
+        return crawled_ids
+
+
+def make_graph(server):
+    add_entities(server, entity_ids(1, 30))
+    for i in range(1, 10):
+        link(server, 'Q{}'.format(i), 'Q{}'.format(i + 10), 'Q{}'.format(i + 20))
+
+
+def test_repeated_crawls_start_over(wikibase, tmp_path):
+    make_graph(wikibase)
+    assert ['Q1', 'Q2', 'Q3'] == crawl_ids(wikibase, tmp_path, 1, 4, 0)
+    assert ['Q1', 'Q2', 'Q3'] == crawl_ids(wikibase, tmp_path, 1, 4, 0)
+    assert [] == os.listdir(str(tmp_path))
+
+    # and P31, which is missing
+    linked_ids = ['Q1', 'Q2', 'Q3', 'Q11', 'Q21', 'Q12', 'Q22', 'Q13', 'Q23']
+    assert linked_ids == crawl_ids(wikibase, tmp_path, 1, 4, 1)
+
+
+def test_interrupted_crawls_resume(wikibase, tmp_path, monkeypatch):
+    make_graph(wikibase)
+    monkeypatch.setattr(pull_data, 'CHECKPOINT_SIZE', 2)
+    crawled_ids = crawl_ids(wikibase, tmp_path, 1, 10, 1)
+    assert len(crawled_ids) == len(set(crawled_ids)) == 27
+
+    first_ids = crawl_ids(wikibase, tmp_path, 1, 10, 1, stop_after=12)
+    assert crawled_ids[:12] == first_ids
+    # the entity that was being written out when the crawl stopped is fetched again
+    assert crawled_ids[11:] == crawl_ids(wikibase, tmp_path, 1, 10, 1)
+
+    # a crawl with other arguments doesn't resume the interrupted one
+    crawl_ids(wikibase, tmp_path, 1, 10, 1, stop_after=12)
+    assert crawled_ids[:9] == crawl_ids(wikibase, tmp_path, 1, 10, 0)
+
+
+def test_redirected_ids_are_crawled_once(wikibase, tmp_path):
+    add_entities(wikibase, entity_ids(1, 10))
+    del wikibase.entities['Q5']
+    wikibase.redirects['Q5'] = 'Q6'
+    link(wikibase, 'Q8', 'Q5', 'Q6')
+
+    crawled_ids = ['Q1', 'Q2', 'Q3', 'Q4', 'Q6', 'Q7', 'Q8', 'Q9']
+    assert crawled_ids == crawl_ids(wikibase, tmp_path, 1, 10, 1)
+    requested_ids = sum((request_ids for request_ids, _ in wikibase.requests), [])
+    assert 1 == requested_ids.count('Q5')
+
+    del wikibase.requests[:]
+    assert crawled_ids[:6] == crawl_ids(wikibase, tmp_path, 1, 10, 1, stop_after=6)
+    assert crawled_ids[5:] == crawl_ids(wikibase, tmp_path, 1, 10, 1)
+    requested_ids = sum((request_ids for request_ids, _ in wikibase.requests), [])
+    assert 1 == requested_ids.count('Q5')
+
+
+def test_repeated_crawls_are_served_from_the_cache(wikibase, tmp_path):
+    make_graph(wikibase)
+    with EntityCache(str(tmp_path / 'entities.db'), 3600) as cache:
+        crawled_ids = crawl_ids(wikibase, tmp_path / 'crawl', 1, 10, 1, cache=cache)
+        request_count = len(wikibase.requests)
+        assert crawled_ids == crawl_ids(wikibase, tmp_path / 'crawl', 1, 10, 1, cache=cache)
+    # only P31 again, which is missing and so not cached
+    assert [(['P31'], None)] == wikibase.requests[request_count:]
+
+
+def test_stale_entities_are_fetched_when_they_changed(wikibase, tmp_path):
+    ids = entity_ids(1, 11)
+    add_entities(wikibase, ids)
+    with EntityCache(str(tmp_path / 'entities.db'), 0) as cache:
+        assert ids == fetch(wikibase, ids, cache=cache)[0]
+        add_entities(wikibase, ['Q3', 'Q7'], lastrevid=2)
+        del wikibase.requests[:]
+
+        with Fetcher(wikibase.url, rate=0, cache=cache) as fetcher:
+            entities = list(fetcher.fetch(ids))
+    assert ids == [entity['id'] for entity in entities]
+    assert {'Q3': 2, 'Q7': 2} == {
+        entity['id']: entity['lastrevid'] for entity in entities if entity['lastrevid'] != 1
+    }
+    assert [(ids, 'info'), (['Q3', 'Q7'], None)] == wikibase.requests
+    assert 8 == fetcher.cached_count
+
+
+def test_offline_fetchers_only_serve_the_cache(wikibase, tmp_path):
+    ids = entity_ids(1, 6)
+    add_entities(wikibase, ids)
+    with EntityCache(str(tmp_path / 'entities.db'), 0) as cache:
+        fetch(wikibase, ids[:3], cache=cache)
+        del wikibase.requests[:]
+        fetched_ids, fetcher = fetch(wikibase, ids, cache=cache, offline=True)
+    assert ids[:3] == fetched_ids
+    assert ids[3:] == fetcher.uncached_ids
+    assert [] == wikibase.requests
@@ -0,0 +1,88 @@
+import importlib
+import json
+
+import pytest
+
+
+@pytest.fixture
+def transform_json(tmp_path, monkeypatch):
+    # properties reads data/properties.dump when it is imported
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    (data_dir / 'properties.dump').write_text(
+        json.dumps({'id': 'P1', 'labels': {'en': {'value': 'name'}}}) + '\n'
+    )
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module('transform_json')
+
+
+def make_entity(number):
+    entity_id = 'Q{}'.format(number)
+    return {
+        'id': entity_id,
+        'type': 'item',
+        'labels': {'de': {'language': 'de', 'value': 'Zürich {}'.format(number)}},
+        'descriptions': {},
+        'claims': {
+            'P1': [{'mainsnak': {
+                'snaktype': 'value',
+                'property': 'P1',
+                'datatype': 'string',
+                'datavalue': {'type': 'string', 'value': 'ß{}'.format(number)},
+            }}],
+            'P2': [{'mainsnak': {
+                'snaktype': 'value',
+                'property': 'P2',
+                'datatype': 'wikibase-item',
+                'datavalue': {'value': {'id': 'Q{}'.format(number + 1)}},
+            }}],
+        },
+    }
+
+
+def write_dump(path, entity_count):
+    # a JSON array with an entity on every line, and lines of the same length
+    lines = [json.dumps(make_entity(number), ensure_ascii=False)
+             for number in range(100, 100 + entity_count)]
+    path.write_text('[\n' + ',\n'.join(lines) + '\n]\n', encoding='utf8')
+    return len(lines[0].encode('utf8')) + 2
+
+
+def test_line_starts_are_found_from_any_position(tmp_path, transform_json):
+    path = tmp_path / 'lines'
+    path.write_bytes(b'a\nbb\n\nccc')
+    with open(str(path), 'rb') as in_file:
+        assert [0, 2, 2, 5, 5, 5, 6, 9, 9, 9] == [
+            transform_json.seek_line_start(in_file, position) for position in range(10)
+        ]
+
+
+def test_ranges_are_transformed_like_the_whole_input(tmp_path, transform_json):
+    input_path = tmp_path / 'dump.json'
+    line_size = write_dump(input_path, 60)
+
+    serial_dir = tmp_path / 'serial'
+    serial_dir.mkdir()
+    with open(str(input_path), encoding='utf8') as in_file:
+        assert (60, 60) == transform_json.transform_lines(
+            in_file, str(serial_dir / 'dse_entities.dump'), str(serial_dir / 'dse_edges.dump'))
+    serial_output = [
+        (serial_dir / 'dse_{}.dump'.format(kind)).read_text(encoding='utf8')
+        for kind in ('entities', 'edges')
+    ]
+
+    # a line longer, ranges end at every position of a line, including
+    # exactly at its start and at its line break
+    for part_size in (line_size + 1, line_size, 7 * line_size, 10 ** 6):
+        output_dir = tmp_path / str(part_size)
+        output_dir.mkdir()
+        assert (60, 60) == transform_json.transform_file(
+            str(input_path), str(output_dir), 3, part_size)
+        range_count = len(transform_json.compute_ranges(str(input_path), part_size))
+        assert serial_output == [
+            ''.join(
+                (output_dir / 'dse_{}_{:03}.dump'.format(kind, number)).read_text(encoding='utf8')
+                for number in range(1, range_count + 1)
+            )
+            for kind in ('entities', 'edges')
+        ]
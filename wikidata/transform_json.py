@@ -2,17 +2,40 @@
 
 """transform_json.py
 
-takes as input json objects in wikidata format (one object per line), and
-outputs json vertices and edges usable as input to DSE graph loader.
+takes as input json objects in wikidata format (one object per line, as
+pull_data.py prints them or as in a wikidata JSON dump), and outputs json
+vertices and edges usable as input to DSE graph loader.
+
+Input is read from stdin, or from <input>, which is split into byte ranges
+that are transformed in parallel, each into a shard of its own
+(dse_entities_<n>.dump and dse_edges_<n>.dump).
+
+Usage:
+    transform_json.py [options] [<input>]
+
+Options:
+    -h --help                        Show this message
+    -w <n>, --workers=<n>            number of worker processes, 0 for one per
+                                     CPU. [default: 0]
+    --part-size=<bytes>              approximate size of the byte ranges.
+                                     [default: 64000000]
+    -o <dir>, --output-dir=<dir>     where the output is written. [default: data]
 """
 
 import itertools
 import json
+import multiprocessing
+import os
 import sys
+import time
+import traceback
 
 import properties
 
 COPY_PROPERTIES = {'id', 'modified', 'type', 'title', 'lastrevid'}
+WRITE_BATCH_SIZE = 1000  # records
+WRITE_BUFFER_SIZE = 2 ** 20  # bytes
+PROGRESS_INTERVAL = 100000  # entities
 
 
 def iter_claims(entity):
@@ -63,26 +86,144 @@ def transform(entity):
     return transformed, edges
 
 
-def main():
-    vertex_file = open('data/dse_entities.dump', 'w')
-    edge_file = open('data/dse_edges.dump', 'w')
-
-    for line in sys.stdin:
-        entity = json.loads(line)
-        print('transforming entity {}'.format(entity['id']))
-
-        try:
-            transformed, edges = transform(entity)
-        except Exception:
-            import pprint
-            import traceback
-            traceback.print_exc()
-            pprint.pprint(entity)
-            sys.exit(1)
-        print(json.dumps(transformed), file=vertex_file)
-        for edge in edges:
-            print(json.dumps(edge), file=edge_file)
+def iter_entities(lines):
+    for line in lines:
+        # dumps are a JSON array with an entity on every line
+        line = line.rstrip().rstrip(',')
+        if line in ('', '[', ']'):
+            continue
+        yield json.loads(line)
+
+
+def transform_lines(lines, vertex_path, edge_path, on_progress=None):
+    """transform the entities in `lines`, and write vertices and edges in
+    batches; `on_progress` is called with the counts so far every
+    PROGRESS_INTERVAL entities"""
+    entity_count = edge_count = 0
+    vertex_lines, edge_lines = [], []
+    with open(vertex_path, 'w', buffering=WRITE_BUFFER_SIZE) as vertex_file, \
+            open(edge_path, 'w', buffering=WRITE_BUFFER_SIZE) as edge_file:
+        for entity in iter_entities(lines):
+            try:
+                transformed, edges = transform(entity)
+            except Exception:
+                traceback.print_exc()
+                print('while transforming entity {}'.format(entity.get('id')), file=sys.stderr)
+                raise
+            vertex_lines.append(json.dumps(transformed) + '\n')
+            edge_lines.extend(json.dumps(edge) + '\n' for edge in edges)
+            entity_count += 1
+            edge_count += len(edges)
+
+            if len(vertex_lines) >= WRITE_BATCH_SIZE:
+                vertex_file.writelines(vertex_lines)
+                edge_file.writelines(edge_lines)
+                vertex_lines.clear()
+                edge_lines.clear()
+            if on_progress and entity_count % PROGRESS_INTERVAL == 0:
+                on_progress(entity_count, edge_count)
+        vertex_file.writelines(vertex_lines)
+        edge_file.writelines(edge_lines)
+    return entity_count, edge_count
+
+
+def compute_ranges(input_path, part_size):
+    # ranges of about `part_size` bytes, which workers align to lines
+    input_size = os.path.getsize(input_path)
+    return [
+        (left, min(left + part_size, input_size))
+        for left in range(0, input_size, part_size)
+    ]
+
+
+def seek_line_start(in_file, position):
+    # the start of the first line at or after `position`, which the
+    # neighbouring ranges of an offset agree on
+    if position == 0:
+        return 0
+    in_file.seek(position - 1)
+    in_file.readline()
+    return in_file.tell()
+
+
+def iter_range_lines(in_file, left, right):
+    in_file.seek(left)
+    position = left
+    while position < right:
+        line = in_file.readline()
+        if not line:
+            break
+        position += len(line)
+        yield line.decode('utf8')
+
+
+def transform_range(input_path, left, right, vertex_path, edge_path):
+    with open(input_path, 'rb') as in_file:
+        left = seek_line_start(in_file, left)
+        right = seek_line_start(in_file, right)
+        return transform_lines(iter_range_lines(in_file, left, right), vertex_path, edge_path)
+
+
+def transform_file(input_path, output_dir, workers, part_size):
+    ranges = compute_ranges(input_path, part_size)
+    tasks = [
+        (
+            input_path,
+            left,
+            right,
+            os.path.join(output_dir, 'dse_entities_{:03}.dump'.format(number)),
+            os.path.join(output_dir, 'dse_edges_{:03}.dump'.format(number)),
+        )
+        for number, (left, right) in enumerate(ranges, start=1)
+    ]
+    print('transforming {} ranges of {} with {} workers'.format(
+        len(tasks), input_path, workers), file=sys.stderr)
+
+    entity_count = edge_count = 0
+    start_time = time.monotonic()
+    with multiprocessing.Pool(workers) as pool:
+        results = pool.imap_unordered(star_transform_range, tasks)
+        for done_count, (range_entities, range_edges) in enumerate(results, start=1):
+            entity_count += range_entities
+            edge_count += range_edges
+            print_progress(entity_count, edge_count, start_time, done_count, len(tasks))
+    return entity_count, edge_count
+
+
+def star_transform_range(task):
+    return transform_range(*task)
+
+
+def print_progress(entity_count, edge_count, start_time, done_count=None, range_count=None):
+    elapsed = time.monotonic() - start_time
+    ranges = '{}/{} ranges, '.format(done_count, range_count) if range_count else ''
+    print('{}{} entities, {} edges ({:.0f} entities/s)'.format(
+        ranges, entity_count, edge_count, entity_count / elapsed if elapsed else 0),
+        file=sys.stderr)
+
+
+def main(args):
+    output_dir = args['--output-dir']
+    os.makedirs(output_dir, exist_ok=True)
+    start_time = time.monotonic()
+    if args['<input>']:
+        entity_count, edge_count = transform_file(
+            args['<input>'],
+            output_dir,
+            int(args['--workers']) or os.cpu_count(),
+            int(float(args['--part-size'])),
+        )
+    else:
+        entity_count, edge_count = transform_lines(
+            sys.stdin,
+            os.path.join(output_dir, 'dse_entities.dump'),
+            os.path.join(output_dir, 'dse_edges.dump'),
+            lambda entities, edges: print_progress(entities, edges, start_time),
+        )
+    sys.stderr.write('transformed {} entities into {} edges in {:.1f} s\n'.format(
+        entity_count, edge_count, time.monotonic() - start_time))
 
 
 if __name__ == "__main__":
-    main()
+    import docopt
+    main(docopt.docopt(__doc__))